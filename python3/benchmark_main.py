@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+import autorecurse_path
+from argparse import ArgumentParser
+from typing import List
+import os
+import sys
+
+
+def parse_args(args: List[str]):
+    parser = ArgumentParser(prog='benchmark_main', description='Measure parse pipeline throughput on generated `make -np` output.', allow_abbrev=False)
+    parser.add_argument('--make-executable', dest='make_executable', metavar='<make-path>', default='make', help='Path to `make` executable. Default is `make`.')
+    parser.add_argument('--targets', dest='targets', metavar='<count>', type=int, default=2000, help='Number of targets in the generated makefile. Default is 2000.')
+    parser.add_argument('--repeat', dest='repeat', metavar='<count>', type=int, default=3, help='Number of runs per pipeline. The best run is reported. Default is 3.')
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument('--record', dest='record', action='store_true', help='Measure the wall time and peak memory of the regression scenarios, and save them as the baseline.')
+    group.add_argument('--check', dest='check', action='store_true', help='Measure the regression scenarios, and exit with status 1 if any of them regressed beyond the tolerance of the baseline.')
+    parser.add_argument('--baseline', dest='baseline', metavar='<file>', default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'benchmarks', 'baseline.json'), help='Baseline file of `--record` and `--check`. Default is `benchmarks/baseline.json`, which is not versioned, since the timings only hold on the machine that recorded them.')
+    parser.add_argument('--tolerance', dest='tolerance', metavar='<fraction>', type=float, default=0.25, help='Fraction by which the wall time of a scenario may exceed the baseline. Default is 0.25.')
+    parser.add_argument('--memory-tolerance', dest='memory_tolerance', metavar='<fraction>', type=float, default=0.1, help='Fraction by which the peak memory of a scenario may exceed the baseline. Default is 0.1.')
+    return parser.parse_args(args)
+
+
+def main(args: List[str]) -> None:
+    from benchmarks.parse import DatabaseGenerator, ParsePipelineBenchmark, TargetAdapterBenchmark, parse_pipeline_factories, target_adapters
+    namespace = parse_args(args)
+    if namespace.record or namespace.check:
+        run_regression_scenarios(namespace)
+        return
+    generator = DatabaseGenerator.make(namespace.targets)
+    generator.executable_name = namespace.make_executable
+    database = generator.generate()
+    print('{0} characters of `make -np` output'.format(len(database)))
+    for name, factory in parse_pipeline_factories():
+        seconds_per_char = ParsePipelineBenchmark.make(factory, database, namespace.repeat).run()
+        print('{0:<12} {1:8.3f} us/char'.format(name, seconds_per_char * 1e6))
+    adapter_benchmark = TargetAdapterBenchmark.make(database, namespace.repeat)
+    print('{0} MakefileRuleLexer tokens'.format(adapter_benchmark.token_count))
+    for name, adapter_class in target_adapters():
+        seconds_per_token = adapter_benchmark.run(adapter_class)
+        print('{0:<12} {1:8.3f} us/token'.format(name, seconds_per_token * 1e6))
+
+def run_regression_scenarios(namespace) -> None:
+    from benchmarks.parse import DatabaseGenerator
+    from benchmarks.regression import Baseline, regression_scenarios
+    parameters = {'targets': namespace.targets, 'repeat': namespace.repeat}
+    baseline = None
+    if namespace.check:
+        if not os.path.isfile(namespace.baseline):
+            sys.exit('No baseline at {0}. Record one on this machine with `--record`.'.format(namespace.baseline))
+        baseline = Baseline.make_from_file(namespace.baseline)
+        if baseline.parameters != parameters:
+            sys.exit('Baseline was recorded with {0}, not {1}.'.format(baseline.parameters, parameters))
+        if baseline.environment != Baseline.current_environment():
+            print('Warning: baseline was recorded on {0}.'.format(baseline.environment), file=sys.stderr)
+    generator = DatabaseGenerator.make(namespace.targets)
+    generator.executable_name = namespace.make_executable
+    database = generator.generate()
+    project_directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'tests', 'data', 'gnumake', 'project')
+    measurements = []
+    for scenario in regression_scenarios(database, namespace.make_executable, project_directory):
+        measurement = scenario.measure(namespace.repeat)
+        print('{0:<28} {1:10.6f} s {2:12d} bytes'.format(measurement.name, measurement.wall_time, measurement.peak_memory))
+        measurements.append(measurement)
+    if namespace.record:
+        Baseline.make(parameters, measurements).save(namespace.baseline)
+        return
+    regressions = baseline.compare(measurements, namespace.tolerance, namespace.memory_tolerance)
+    for regression in regressions:
+        print('Regression: {0}'.format(regression), file=sys.stderr)
+    if len(regressions) != 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
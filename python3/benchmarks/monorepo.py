@@ -0,0 +1,288 @@
+from io import TextIOBase
+from subprocess import DEVNULL, PIPE, run
+from typing import cast, Dict, List, Tuple
+import os
+import random
+import shlex
+import stat
+import sys
+import tempfile
+import time
+
+
+class MonorepoGenerator:
+    """
+    Writes a synthetic tree of nested makefiles.
+
+    Every directory with a makefile has fan_out subdirectories, down to
+    depth. On each level, only the first makefiles_per_level directories
+    get a makefile, or all of them if it is None. The others stay empty,
+    so autorecurse does not look below them.
+
+    Each makefile has target_count file targets, whose recipes have
+    recipe_line_count lines. Each target depends on up to
+    prerequisite_count earlier targets of its makefile, and each
+    makefile adds cross_directory_prerequisite_count prerequisites on
+    targets of directories generated before it, so that the dependency
+    graph has no cycle. The `all` target of each makefile depends on its
+    targets. The `all` target of the root makefile also depends on the
+    `all` target of every other makefile, because only the top-level
+    make run by `autorecurse gnumake` has the nested rules.
+
+    The same seed generates the same tree.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._depth = None # type: int
+        self._fan_out = None # type: int
+        self._makefiles_per_level = None # type: int
+        self._target_count = None # type: int
+        self._prerequisite_count = None # type: int
+        self._recipe_line_count = None # type: int
+        self._cross_directory_prerequisite_count = None # type: int
+        self._seed = None # type: int
+
+    @staticmethod
+    def make(depth: int, fan_out: int) -> 'MonorepoGenerator':
+        instance = MonorepoGenerator()
+        instance._depth = depth
+        instance._fan_out = fan_out
+        instance._makefiles_per_level = None
+        instance._target_count = 10
+        instance._prerequisite_count = 2
+        instance._recipe_line_count = 2
+        instance._cross_directory_prerequisite_count = 1
+        instance._seed = 0
+        return instance
+
+    @property
+    def makefiles_per_level(self) -> int:
+        return self._makefiles_per_level
+
+    @makefiles_per_level.setter
+    def makefiles_per_level(self, value: int) -> None:
+        self._makefiles_per_level = value
+
+    @property
+    def target_count(self) -> int:
+        return self._target_count
+
+    @target_count.setter
+    def target_count(self, value: int) -> None:
+        self._target_count = value
+
+    @property
+    def prerequisite_count(self) -> int:
+        return self._prerequisite_count
+
+    @prerequisite_count.setter
+    def prerequisite_count(self, value: int) -> None:
+        self._prerequisite_count = value
+
+    @property
+    def recipe_line_count(self) -> int:
+        return self._recipe_line_count
+
+    @recipe_line_count.setter
+    def recipe_line_count(self, value: int) -> None:
+        self._recipe_line_count = value
+
+    @property
+    def cross_directory_prerequisite_count(self) -> int:
+        return self._cross_directory_prerequisite_count
+
+    @cross_directory_prerequisite_count.setter
+    def cross_directory_prerequisite_count(self, value: int) -> None:
+        self._cross_directory_prerequisite_count = value
+
+    @property
+    def seed(self) -> int:
+        return self._seed
+
+    @seed.setter
+    def seed(self, value: int) -> None:
+        self._seed = value
+
+    def generate(self, directory: str) -> List[str]:
+        """
+        Writes the tree into directory, which must exist, and returns the
+        directories that have a makefile, directory first.
+        """
+        rng = random.Random(self._seed)
+        result = []
+        level_directories = [directory]
+        for level in range(self._depth + 1):
+            next_level_directories = []
+            for index, level_directory in enumerate(level_directories):
+                if (self._makefiles_per_level is not None) and (self._makefiles_per_level <= index):
+                    continue
+                result.append(level_directory)
+                if level != self._depth:
+                    for child_index in range(self._fan_out):
+                        child = os.path.join(level_directory, 'dir-{0}'.format(child_index))
+                        os.mkdir(child)
+                        next_level_directories.append(child)
+            level_directories = next_level_directories
+        for index, makefile_directory in enumerate(result):
+            nested_directories = result[1:] if (index == 0) else []
+            with open(os.path.join(makefile_directory, 'Makefile'), mode='w', encoding='utf-8') as file:
+                self._write_makefile(cast(TextIOBase, file), rng, makefile_directory, nested_directories, result[:index])
+        return result
+
+    def _write_makefile(self, file: TextIOBase, rng: random.Random, directory: str, nested_directories: List[str], earlier_directories: List[str]) -> None:
+        prerequisites = [] # type: List[List[str]]
+        for index in range(self._target_count):
+            count = min(index, self._prerequisite_count)
+            prerequisites.append(['target-{0}'.format(item) for item in sorted(rng.sample(range(index), count))])
+        if (len(earlier_directories) != 0) and (self._target_count != 0):
+            for index in range(self._cross_directory_prerequisite_count):
+                other_directory = rng.choice(earlier_directories)
+                path = os.path.join(os.path.relpath(other_directory, directory), 'target-{0}'.format(rng.randrange(self._target_count)))
+                prerequisites[rng.randrange(self._target_count)].append(path)
+        file.write('.PHONY: all\n')
+        file.write('all:')
+        for index in range(self._target_count):
+            file.write(' target-{0}'.format(index))
+        for nested_directory in nested_directories:
+            file.write(' {0}/all'.format(os.path.relpath(nested_directory, directory)))
+        file.write('\n')
+        for index in range(self._target_count):
+            file.write('\ntarget-{0}:'.format(index))
+            for prerequisite in prerequisites[index]:
+                file.write(' ')
+                file.write(prerequisite)
+            file.write('\n')
+            for line_index in range(self._recipe_line_count - 1):
+                file.write('\t@echo step {0} of $@\n'.format(line_index + 1))
+            file.write('\t@touch $@\n')
+
+
+class MonorepoBenchmark:
+    """
+    Times `autorecurse` commands on a generated tree, each one cold, with
+    a new home directory and so no autorecurse cache, then warm, run
+    again right after. The commands are `targetlisting` on a sample of
+    the makefiles, `nestedrules` on the root of the tree, and `gnumake
+    all` from the root, which also builds the tree.
+
+    Nested commands run by make find `autorecurse` through a script put
+    first on PATH, which runs main.py with the current interpreter.
+
+    `targetlisting` and `nestedrules` regenerate their file on every
+    run, so a warm run can only be faster through the DFA cache. Their
+    warm time is only measured with `--dfa-cache` among the options.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._directory = None # type: str
+        self._makefile_directories = None # type: List[str]
+        self._make_executable = None # type: str
+        self._options = None # type: List[str]
+        self._jobs = None # type: int
+        self._sample_size = None # type: int
+
+    @staticmethod
+    def make(directory: str, makefile_directories: List[str]) -> 'MonorepoBenchmark':
+        instance = MonorepoBenchmark()
+        instance._directory = directory
+        instance._makefile_directories = list(makefile_directories)
+        instance._make_executable = 'make'
+        instance._options = []
+        instance._jobs = 1
+        instance._sample_size = 10
+        return instance
+
+    @property
+    def make_executable(self) -> str:
+        return self._make_executable
+
+    @make_executable.setter
+    def make_executable(self, value: str) -> None:
+        self._make_executable = value
+
+    @property
+    def options(self) -> List[str]:
+        """
+        Options of `autorecurse` itself, such as `--optimize time`.
+        `autorecurse gnumake` passes them on to the nested commands run
+        by make, through AUTORECURSE_OPTIONS.
+        """
+        return list(self._options)
+
+    @options.setter
+    def options(self, value: List[str]) -> None:
+        self._options = list(value)
+
+    @property
+    def jobs(self) -> int:
+        return self._jobs
+
+    @jobs.setter
+    def jobs(self, value: int) -> None:
+        self._jobs = value
+
+    @property
+    def sample_size(self) -> int:
+        """
+        Number of makefiles on which `targetlisting` is run.
+        """
+        return self._sample_size
+
+    @sample_size.setter
+    def sample_size(self, value: int) -> None:
+        self._sample_size = value
+
+    def run(self) -> List[Tuple[str, float, float]]:
+        """
+        Returns the cold and warm wall times of each command, in
+        seconds. The warm time is None if a warm run cannot hit a cache.
+        """
+        result = []
+        with tempfile.TemporaryDirectory() as bin_directory:
+            self._write_autorecurse_script(bin_directory)
+            sample = self._sample()
+            targetlisting_args = [['targetlisting', directory, 'Makefile'] for directory in sample]
+            is_dfa_cache_enabled = '--dfa-cache' in self._options
+            result.append(('targetlisting x{0}'.format(len(sample)),) + self._time_cold_and_warm(bin_directory, targetlisting_args, is_dfa_cache_enabled))
+            result.append(('nestedrules',) + self._time_cold_and_warm(bin_directory, [['nestedrules', self._directory]], is_dfa_cache_enabled))
+            result.append(('gnumake all',) + self._time_cold_and_warm(bin_directory, [['gnumake', '-j', str(self._jobs), 'all']], True))
+        return result
+
+    def _sample(self) -> List[str]:
+        count = min(self._sample_size, len(self._makefile_directories))
+        if count == 0:
+            return []
+        step = len(self._makefile_directories) / count
+        return [self._makefile_directories[int(index * step)] for index in range(count)]
+
+    def _write_autorecurse_script(self, bin_directory: str) -> None:
+        main_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+        script_path = os.path.join(bin_directory, 'autorecurse')
+        with open(script_path, mode='w', encoding='utf-8') as file:
+            file.write('#!/bin/sh\n')
+            file.write('exec {0} {1} "$@"\n'.format(shlex.quote(sys.executable), shlex.quote(main_path)))
+        os.chmod(script_path, os.stat(script_path).st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+    def _time_cold_and_warm(self, bin_directory: str, commands: List[List[str]], is_warm_timed: bool) -> Tuple[float, float]:
+        with tempfile.TemporaryDirectory() as home:
+            env = {key: value for key, value in os.environ.items() if not key.startswith('AUTORECURSE_')}
+            env['HOME'] = home
+            env['PATH'] = os.pathsep.join([bin_directory, os.environ.get('PATH', '')])
+            cold = self._time(commands, env)
+            warm = self._time(commands, env) if is_warm_timed else None
+        return cold, warm
+
+    def _time(self, commands: List[List[str]], env: Dict[str, str]) -> float:
+        start = time.perf_counter()
+        for command in commands:
+            args = ['autorecurse', '--make-executable', self._make_executable] + self._options + command
+            # `make -np` complains about prerequisites in other
+            # directories that are not built yet, so standard error is
+            # only shown if the command fails.
+            process = run(args, cwd=self._directory, stdin=DEVNULL, stdout=DEVNULL, stderr=PIPE, env=env)
+            if process.returncode != 0:
+                sys.stderr.write(process.stderr.decode('utf-8', errors='replace'))
+                raise Exception('`{0}` exited with status {1}.'.format(' '.join(args), process.returncode))
+        return time.perf_counter() - start
@@ -0,0 +1,178 @@
+from antlr4 import CommonTokenStream, InputStream, Token
+from antlr4.ListTokenSource import ListTokenSource
+from autorecurse.common.storage import DictionaryDirectoryMapping
+from autorecurse.gnumake.data import Makefile
+from autorecurse.gnumake.grammar import MakefileRuleLexer, MakefileRuleParser, TargetDefinitionLineIterator, TargetParagraphLexer
+from autorecurse.gnumake.parse import BalancedParsePipelineFactory, BufferedParsePipelineFactory, GeneratorParsePipelineFactory, MakefileRuleParserToIteratorAdapter, ParsePipelineFactory, SpooledParsePipelineFactory, StreamingParsePipelineFactory, TreelessMakefileRuleParserToIteratorAdapter
+from autorecurse.gnumake.storage import DirectoryEnum, FileStorageEngine
+from autorecurse.lib.antlr4.stream import TokenSourceToIteratorAdapter, TokenToCharStreamAdapter
+from autorecurse.lib.line import BlockFileLineIterator, LineToCharIterator
+from io import StringIO, TextIOBase
+from subprocess import check_output
+from typing import cast, List, Tuple
+import os
+import tempfile
+import time
+
+
+class DatabaseGenerator:
+    """
+    Produces `make -np` output for a generated makefile with a fixed
+    number of targets.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._target_count = None # type: int
+        self._executable_name = None # type: str
+
+    @staticmethod
+    def make(target_count: int) -> 'DatabaseGenerator':
+        instance = DatabaseGenerator()
+        instance._target_count = target_count
+        instance._executable_name = 'make'
+        return instance
+
+    @property
+    def executable_name(self) -> str:
+        return self._executable_name
+
+    @executable_name.setter
+    def executable_name(self, value: str) -> None:
+        self._executable_name = value
+
+    def generate(self) -> str:
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'Makefile'), mode='w', encoding='utf-8') as file:
+                self._write_makefile(cast(TextIOBase, file))
+            args = [self.executable_name, '-np', '-C', directory, '-f', 'Makefile']
+            return check_output(args, env={'PATH': os.environ.get('PATH', '')}).decode('utf-8')
+
+    def _write_makefile(self, file: TextIOBase) -> None:
+        file.write('.PHONY: all\n')
+        file.write('all:')
+        for index in range(self._target_count):
+            file.write(' target-{0}'.format(index))
+        file.write('\n\n')
+        for index in range(self._target_count):
+            if index != 0:
+                file.write('target-{0}: target-{1} | objdir\n'.format(index, index // 2))
+            else:
+                file.write('target-{0}: | objdir\n'.format(index))
+            file.write('\ttouch $@\n')
+            file.write('\techo $< >$@\n\n')
+        file.write('objdir:\n')
+        file.write('\tmkdir $@\n')
+
+
+class ParsePipelineBenchmark:
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._factory = None # type: ParsePipelineFactory
+        self._database = None # type: str
+        self._repeat = None # type: int
+
+    @staticmethod
+    def make(factory: ParsePipelineFactory, database: str, repeat: int) -> 'ParsePipelineBenchmark':
+        instance = ParsePipelineBenchmark()
+        instance._factory = factory
+        instance._database = database
+        instance._repeat = repeat
+        return instance
+
+    def run(self) -> float:
+        """
+        Returns the best observed parse time, in seconds per character
+        of `make -np` output.
+        """
+        makefile = Makefile.make('Makefile')
+        best = None
+        for index in range(self._repeat):
+            start = time.perf_counter()
+            for target in self._factory.build_parse_pipeline(cast(TextIOBase, StringIO(self._database)), makefile):
+                pass
+            elapsed = time.perf_counter() - start
+            if (best is None) or (elapsed < best):
+                best = elapsed
+        return best / len(self._database)
+
+
+def parse_pipeline_factories() -> List[Tuple[str, ParsePipelineFactory]]:
+    return [
+            ('buffered', BufferedParsePipelineFactory.make()),
+            ('balanced', BalancedParsePipelineFactory.make()),
+            ('streaming', StreamingParsePipelineFactory.make()),
+            ('generator', GeneratorParsePipelineFactory.make()),
+            ('mmap', SpooledParsePipelineFactory.make(FileStorageEngine.make(DictionaryDirectoryMapping.make({DirectoryEnum.TMP: tempfile.gettempdir()}))))
+            ]
+
+
+class TargetAdapterBenchmark:
+    """
+    Measures the parser stage alone. The MakefileRuleLexer tokens of a
+    database are read once, and each run parses them again into targets
+    with the given adapter class.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._tokens = None # type: List[Token]
+        self._repeat = None # type: int
+
+    @staticmethod
+    def make(database: str, repeat: int) -> 'TargetAdapterBenchmark':
+        instance = TargetAdapterBenchmark()
+        instance._tokens = TargetAdapterBenchmark._read_tokens(database)
+        instance._repeat = repeat
+        return instance
+
+    @property
+    def token_count(self) -> int:
+        return len(self._tokens)
+
+    def run(self, adapter_class) -> float:
+        """
+        Returns the best observed parse time, in seconds per token.
+        """
+        makefile = Makefile.make('Makefile')
+        best = None
+        for index in range(self._repeat):
+            parser = MakefileRuleParser(CommonTokenStream(ListTokenSource(list(self._tokens))))
+            adapter = adapter_class.make(parser)
+            adapter.makefile = makefile
+            start = time.perf_counter()
+            for target in adapter:
+                pass
+            elapsed = time.perf_counter() - start
+            if (best is None) or (elapsed < best):
+                best = elapsed
+        return best / len(self._tokens)
+
+    @staticmethod
+    def _read_tokens(database: str) -> List[Token]:
+        lines = TargetDefinitionLineIterator.make(BlockFileLineIterator.make(cast(TextIOBase, StringIO(database))))
+        chars = LineToCharIterator.make(lines)
+        with StringIO() as strbuff:
+            if chars.is_at_start:
+                chars.move_to_next()
+            while chars.has_current_item:
+                strbuff.write(chars.current_item)
+                chars.move_to_next()
+            paragraph_lexer = TargetParagraphLexer(InputStream(strbuff.getvalue()))
+        makefile_rule_lexer = MakefileRuleLexer(TokenToCharStreamAdapter.make(TokenSourceToIteratorAdapter.make(paragraph_lexer)))
+        # The EOF token is kept, so that ListTokenSource does not have to
+        # make one.
+        result = []
+        while True:
+            token = makefile_rule_lexer.nextToken()
+            result.append(token)
+            if token.type == Token.EOF:
+                return result
+
+
+def target_adapters() -> List[Tuple[str, type]]:
+    return [
+            ('parse tree', MakefileRuleParserToIteratorAdapter),
+            ('treeless', TreelessMakefileRuleParserToIteratorAdapter)
+            ]
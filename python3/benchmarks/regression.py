@@ -0,0 +1,393 @@
+from benchmarks.parse import parse_pipeline_factories
+from autorecurse.gnumake.data import DefaultTargetFormatter, Makefile, Target
+from autorecurse.gnumake.implementation import NestedMakefileLocator
+from autorecurse.gnumake.parse import BufferedParsePipelineFactory, ParsePipelineFactory
+from autorecurse.lib.fifo import ArrayedFifo, FifoBase, FifoManager, GlobalIndexFifoManager, LinkedFifo
+from abc import ABCMeta, abstractmethod
+from io import StringIO, TextIOBase
+from subprocess import check_output, DEVNULL
+from typing import Callable, cast, Dict, List, Tuple
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+class Measurement:
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.name = None # type: str
+        self.wall_time = None # type: float
+        self.peak_memory = None # type: int
+
+    @staticmethod
+    def make(name: str, wall_time: float, peak_memory: int) -> 'Measurement':
+        instance = Measurement()
+        instance.name = name
+        instance.wall_time = wall_time
+        instance.peak_memory = peak_memory
+        return instance
+
+    @staticmethod
+    def make_from_dict(name: str, value: Dict) -> 'Measurement':
+        return Measurement.make(name, value['wall_time'], value['peak_memory'])
+
+    def to_dict(self) -> Dict:
+        return {'wall_time': self.wall_time, 'peak_memory': self.peak_memory}
+
+
+class Scenario(metaclass=ABCMeta):
+    """
+    A fixed piece of work whose wall time and peak memory are tracked.
+
+    By default, the wall time is the best of several timed runs, and the
+    peak memory is the peak of Python allocations during one more run,
+    traced by tracemalloc, so that tracing does not slow the timed runs.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._name = None # type: str
+
+    @property
+    def name(self) -> str:
+        return self._name
+
+    def set_up(self) -> None:
+        pass
+
+    def tear_down(self) -> None:
+        pass
+
+    @abstractmethod
+    def run(self) -> None:
+        pass
+
+    def measure(self, repeat: int) -> Measurement:
+        self.set_up()
+        try:
+            best = None
+            for index in range(repeat):
+                start = time.perf_counter()
+                self.run()
+                elapsed = time.perf_counter() - start
+                if (best is None) or (elapsed < best):
+                    best = elapsed
+            tracemalloc.start()
+            try:
+                self.run()
+                peak_memory = tracemalloc.get_traced_memory()[1]
+            finally:
+                tracemalloc.stop()
+        finally:
+            self.tear_down()
+        return Measurement.make(self.name, best, peak_memory)
+
+
+class ParsePipelineScenario(Scenario):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._factory = None # type: ParsePipelineFactory
+        self._database = None # type: str
+
+    @staticmethod
+    def make(name: str, factory: ParsePipelineFactory, database: str) -> Scenario:
+        instance = ParsePipelineScenario()
+        instance._name = 'parse/' + name
+        instance._factory = factory
+        instance._database = database
+        return instance
+
+    def run(self) -> None:
+        makefile = Makefile.make('Makefile')
+        for target in self._factory.build_parse_pipeline(cast(TextIOBase, StringIO(self._database)), makefile):
+            pass
+
+
+class FifoScenario(Scenario):
+    """
+    Streams items through a Fifo the way the parse pipeline does: each
+    item is pushed, becomes the current item, and is then removed,
+    explicitly by shift, or by the garbage collection of a ManagedFifo.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._fifo_factory = None # type: Callable[[], FifoBase[int]]
+        self._item_count = None # type: int
+
+    @staticmethod
+    def make(name: str, fifo_factory: Callable[[], FifoBase[int]], item_count: int) -> Scenario:
+        instance = FifoScenario()
+        instance._name = 'fifo/' + name
+        instance._fifo_factory = fifo_factory
+        instance._item_count = item_count
+        return instance
+
+    def run(self) -> None:
+        fifo = self._fifo_factory()
+        is_managed = not hasattr(fifo, 'shift')
+        for item in range(self._item_count):
+            fifo.push(item)
+            fifo.move_to_next()
+            if not is_managed:
+                fifo.shift()
+
+
+class NestedMakefileLocatorScenario(Scenario):
+    """
+    Locates the makefiles of a generated directory tree, where every
+    directory has a makefile and fan_out subdirectories, down to depth.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._depth = None # type: int
+        self._fan_out = None # type: int
+        self._directory = None # type: str
+
+    @staticmethod
+    def make(depth: int, fan_out: int) -> Scenario:
+        instance = NestedMakefileLocatorScenario()
+        instance._name = 'locator/nested'
+        instance._depth = depth
+        instance._fan_out = fan_out
+        instance._directory = None
+        return instance
+
+    def set_up(self) -> None:
+        self._directory = os.path.realpath(tempfile.mkdtemp())
+        directories = [self._directory]
+        for level in range(self._depth + 1):
+            children = []
+            for directory in directories:
+                with open(os.path.join(directory, 'Makefile'), mode='w', encoding='utf-8') as file:
+                    file.write('all: ;\n')
+                if level != self._depth:
+                    for index in range(self._fan_out):
+                        child = os.path.join(directory, 'dir-{0}'.format(index))
+                        os.mkdir(child)
+                        children.append(child)
+            directories = children
+
+    def tear_down(self) -> None:
+        shutil.rmtree(self._directory)
+        self._directory = None
+
+    def run(self) -> None:
+        locator = NestedMakefileLocator.make()
+        locator.set_filename_priorities(['GNUmakefile', 'makefile', 'Makefile'])
+        with locator.makefile_iterator(self._directory) as makefiles:
+            for makefile in makefiles:
+                pass
+
+
+class TargetFormatterScenario(Scenario):
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._targets = None # type: List[Target]
+
+    @staticmethod
+    def make(database: str) -> Scenario:
+        instance = TargetFormatterScenario()
+        instance._name = 'formatter/default'
+        makefile = Makefile.make('Makefile')
+        factory = BufferedParsePipelineFactory.make()
+        instance._targets = list(factory.build_parse_pipeline(cast(TextIOBase, StringIO(database)), makefile))
+        return instance
+
+    def run(self) -> None:
+        formatter = DefaultTargetFormatter.make()
+        file = cast(TextIOBase, StringIO())
+        for target in self._targets:
+            formatter.print(target, file)
+
+
+class TargetListingScenario(Scenario):
+    """
+    Runs `autorecurse targetlisting` in a child process, with one
+    `--optimize` mode, and a home directory of its own. The peak memory
+    is the peak resident set size of the child and of the `make` process
+    it runs.
+
+    The child is started and measured by a launcher process, because a
+    child forked from the current process would count the memory of the
+    current process in its resident set until it calls exec.
+    """
+
+    _LAUNCHER = '; '.join([
+        'import resource, subprocess, sys, time',
+        'start = time.perf_counter()',
+        'subprocess.run(sys.argv[1:], check=True, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL)',
+        'elapsed = time.perf_counter() - start',
+        'print(elapsed, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)',
+    ])
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._optimization = None # type: str
+        self._make_executable = None # type: str
+        self._directory = None # type: str
+
+    @staticmethod
+    def make(optimization: str, make_executable: str, directory: str) -> Scenario:
+        instance = TargetListingScenario()
+        instance._name = 'targetlisting/' + optimization
+        instance._optimization = optimization
+        instance._make_executable = make_executable
+        instance._directory = directory
+        return instance
+
+    def run(self) -> None:
+        with tempfile.TemporaryDirectory() as home:
+            self._run(home)
+
+    def measure(self, repeat: int) -> Measurement:
+        best = None
+        peak_memory = 0
+        with tempfile.TemporaryDirectory() as home:
+            # The first run creates the directories of autorecurse.
+            self._run(home)
+            for index in range(repeat):
+                elapsed, max_rss = self._run(home)
+                if (best is None) or (elapsed < best):
+                    best = elapsed
+                peak_memory = max(peak_memory, max_rss)
+        return Measurement.make(self.name, best, peak_memory)
+
+    def _run(self, home: str) -> Tuple[float, int]:
+        """
+        Returns the wall time, in seconds, and the peak resident set
+        size, in bytes.
+        """
+        main_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+        args = [sys.executable, main_path, '--make-executable', self._make_executable, '--optimize', self._optimization, 'targetlisting', self._directory, 'Makefile']
+        env = {key: value for key, value in os.environ.items() if not key.startswith('AUTORECURSE_')}
+        env['HOME'] = home
+        output = check_output([sys.executable, '-c', TargetListingScenario._LAUNCHER] + args, stdin=DEVNULL, env=env)
+        elapsed, max_rss = output.decode('utf-8').split()
+        # ru_maxrss is in kilobytes on Linux.
+        return float(elapsed), int(max_rss) * 1024
+
+
+class Regression:
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.name = None # type: str
+        self.quantity = None # type: str
+        self.baseline = None # type: float
+        self.measured = None # type: float
+
+    @staticmethod
+    def make(name: str, quantity: str, baseline: float, measured: float) -> 'Regression':
+        instance = Regression()
+        instance.name = name
+        instance.quantity = quantity
+        instance.baseline = baseline
+        instance.measured = measured
+        return instance
+
+    def __str__(self) -> str:
+        return '{0}: {1} went from {2:.6g} to {3:.6g} (+{4:.1f}%)'.format(self.name, self.quantity, self.baseline, self.measured, (self.measured / self.baseline - 1) * 100)
+
+
+class Baseline:
+    """
+    Measurements of all scenarios, saved as JSON, with the parameters of
+    the scenarios and a description of the machine they were taken on.
+    FORMAT_VERSION changes whenever the scenarios change in a way that
+    makes older baselines meaningless.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._parameters = None # type: Dict[str, object]
+        self._environment = None # type: Dict[str, str]
+        self._measurements = None # type: Dict[str, Measurement]
+
+    @staticmethod
+    def make(parameters: Dict[str, object], measurements: List[Measurement]) -> 'Baseline':
+        instance = Baseline()
+        instance._parameters = dict(parameters)
+        instance._environment = Baseline.current_environment()
+        instance._measurements = {measurement.name: measurement for measurement in measurements}
+        return instance
+
+    @staticmethod
+    def make_from_file(file_path: str) -> 'Baseline':
+        with open(file_path, mode='r', encoding='utf-8') as file:
+            value = json.load(file)
+        if value.get('format_version') != Baseline.FORMAT_VERSION:
+            raise Exception('Baseline {0} has format version {1}, expected {2}. Record a new baseline.'.format(file_path, value.get('format_version'), Baseline.FORMAT_VERSION))
+        instance = Baseline()
+        instance._parameters = value['parameters']
+        instance._environment = value['environment']
+        instance._measurements = {name: Measurement.make_from_dict(name, item) for name, item in value['scenarios'].items()}
+        return instance
+
+    @staticmethod
+    def current_environment() -> Dict[str, str]:
+        return {'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine()}
+
+    @property
+    def parameters(self) -> Dict[str, object]:
+        return dict(self._parameters)
+
+    @property
+    def environment(self) -> Dict[str, str]:
+        return dict(self._environment)
+
+    def save(self, file_path: str) -> None:
+        scenarios = {name: self._measurements[name].to_dict() for name in sorted(self._measurements)}
+        value = {'format_version': Baseline.FORMAT_VERSION, 'parameters': self._parameters, 'environment': self._environment, 'scenarios': scenarios}
+        with open(file_path, mode='w', encoding='utf-8') as file:
+            json.dump(value, file, indent=2, sort_keys=True)
+            file.write('\n')
+
+    def compare(self, measurements: List[Measurement], tolerance: float, memory_tolerance: float) -> List[Regression]:
+        """
+        Returns the regressions of measurements, which exceed their
+        baseline by more than the given fraction. Scenarios missing from
+        the baseline are not compared.
+        """
+        result = []
+        for measurement in measurements:
+            baseline = self._measurements.get(measurement.name)
+            if baseline is None:
+                continue
+            if baseline.wall_time * (1 + tolerance) < measurement.wall_time:
+                result.append(Regression.make(measurement.name, 'wall time (s)', baseline.wall_time, measurement.wall_time))
+            if baseline.peak_memory * (1 + memory_tolerance) < measurement.peak_memory:
+                result.append(Regression.make(measurement.name, 'peak memory (bytes)', baseline.peak_memory, measurement.peak_memory))
+        return result
+
+
+def regression_scenarios(database: str, make_executable: str, project_directory: str) -> List[Scenario]:
+    """
+    database is the `make -np` output that the parse pipeline and
+    formatter scenarios work on. project_directory holds the makefile of
+    the `targetlisting` scenarios.
+    """
+    result = [] # type: List[Scenario]
+    for name, factory in parse_pipeline_factories():
+        result.append(ParsePipelineScenario.make(name, factory, database))
+    result.append(FifoScenario.make('linked', LinkedFifo.make, 100000))
+    result.append(FifoScenario.make('arrayed', ArrayedFifo.make, 100000))
+    result.append(FifoScenario.make('managed-linked', lambda: FifoManager.make(LinkedFifo.make()), 100000))
+    result.append(FifoScenario.make('managed-arrayed', lambda: FifoManager.make(ArrayedFifo.make()), 100000))
+    result.append(FifoScenario.make('global-index', GlobalIndexFifoManager.make, 100000))
+    result.append(NestedMakefileLocatorScenario.make(3, 6))
+    result.append(TargetFormatterScenario.make(database))
+    for optimization in ['balanced', 'generator', 'memory', 'mmap', 'time']:
+        result.append(TargetListingScenario.make(optimization, make_executable, project_directory))
+    return result
@@ -3,7 +3,7 @@ import autorecurse_path
 
 
 if __name__ == '__main__':
-    from autorecurse.cli import main
+    from autorecurse.client import main
     main()
 
 
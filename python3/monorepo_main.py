@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+import autorecurse_path
+from argparse import ArgumentParser
+from typing import List
+import os
+import sys
+import tempfile
+
+
+def parse_args(args: List[str]):
+    parser = ArgumentParser(prog='monorepo_main', description='Generate a tree of nested makefiles, and time `autorecurse` commands on it, cold and warm. The warm time of commands that cannot hit a cache is shown as `-`.', allow_abbrev=False)
+    parser.add_argument('--depth', dest='depth', metavar='<count>', type=int, default=3, help='Number of directory levels below the root. Default is 3.')
+    parser.add_argument('--fan-out', dest='fan_out', metavar='<count>', type=int, default=5, help='Number of subdirectories of each directory with a makefile. Default is 5.')
+    parser.add_argument('--makefiles-per-level', dest='makefiles_per_level', metavar='<count>', type=int, default=None, help='Maximum number of directories with a makefile on each level. Default is no maximum.')
+    parser.add_argument('--targets', dest='target_count', metavar='<count>', type=int, default=10, help='Number of targets per makefile. Default is 10.')
+    parser.add_argument('--prerequisites', dest='prerequisite_count', metavar='<count>', type=int, default=2, help='Number of prerequisites of each target in its own makefile. Default is 2.')
+    parser.add_argument('--recipe-lines', dest='recipe_line_count', metavar='<count>', type=int, default=2, help='Number of lines of each recipe. Default is 2.')
+    parser.add_argument('--cross-directory-prerequisites', dest='cross_directory_prerequisite_count', metavar='<count>', type=int, default=1, help='Number of prerequisites per makefile on targets of other directories. Default is 1.')
+    parser.add_argument('--seed', dest='seed', metavar='<seed>', type=int, default=0, help='Seed of the random choices of the generator. Default is 0.')
+    parser.add_argument('--output-dir', dest='output_dir', metavar='<dir>', default=None, help='Only generate the tree, into <dir>, which must not exist.')
+    parser.add_argument('--make-executable', dest='make_executable', metavar='<make-path>', default='make', help='Path to `make` executable. Default is `make`.')
+    parser.add_argument('--jobs', dest='jobs', metavar='<count>', type=int, default=1, help='Number of jobs of `autorecurse gnumake`. Default is 1.')
+    parser.add_argument('--sample', dest='sample_size', metavar='<count>', type=int, default=10, help='Number of makefiles on which `autorecurse targetlisting` is run. Default is 10.')
+    parser.add_argument('--option', dest='options', metavar='<option>', action='append', default=[], help='Option of `autorecurse` itself, such as `--option=--optimize=time`. `autorecurse gnumake` passes it on to the nested commands. May be repeated.')
+    return parser.parse_args(args)
+
+
+def main(args: List[str]) -> None:
+    from benchmarks.monorepo import MonorepoBenchmark, MonorepoGenerator
+    namespace = parse_args(args)
+    generator = MonorepoGenerator.make(namespace.depth, namespace.fan_out)
+    generator.makefiles_per_level = namespace.makefiles_per_level
+    generator.target_count = namespace.target_count
+    generator.prerequisite_count = namespace.prerequisite_count
+    generator.recipe_line_count = namespace.recipe_line_count
+    generator.cross_directory_prerequisite_count = namespace.cross_directory_prerequisite_count
+    generator.seed = namespace.seed
+    if namespace.output_dir is not None:
+        os.makedirs(namespace.output_dir)
+        makefile_directories = generator.generate(namespace.output_dir)
+        print('{0} makefiles generated in {1}'.format(len(makefile_directories), namespace.output_dir))
+        return
+    with tempfile.TemporaryDirectory() as directory:
+        directory = os.path.realpath(directory)
+        makefile_directories = generator.generate(directory)
+        print('{0} makefiles'.format(len(makefile_directories)))
+        benchmark = MonorepoBenchmark.make(directory, makefile_directories)
+        benchmark.make_executable = namespace.make_executable
+        benchmark.options = namespace.options
+        benchmark.jobs = namespace.jobs
+        benchmark.sample_size = namespace.sample_size
+        print('{0:<20} {1:>10} {2:>10}'.format('command', 'cold s', 'warm s'))
+        for command, cold, warm in benchmark.run():
+            if warm is None:
+                print('{0:<20} {1:10.3f} {2:>10}'.format(command, cold, '-'))
+            else:
+                print('{0:<20} {1:10.3f} {2:10.3f}'.format(command, cold, warm))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
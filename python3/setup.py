@@ -13,7 +13,7 @@ setup(
     zip_safe=False,
     entry_points={
         'console_scripts': [
-            'autorecurse = autorecurse.cli:main'
+            'autorecurse = autorecurse.client:main'
         ]
     }
 )
@@ -1,17 +1,29 @@
 from autorecurse.gnumake.implementation import GnuMake
 from autorecurse.gnumake.data import Makefile
-from autorecurse.gnumake.parse import BalancedParsePipelineFactory, BufferedParsePipelineFactory, DefaultParsePipelineFactory, StreamingParsePipelineFactory
+from autorecurse.gnumake.parse import BalancedParsePipelineFactory, BufferedParsePipelineFactory, DefaultParsePipelineFactory, GeneratorParsePipelineFactory, GrammarDfaCache, SpooledParsePipelineFactory, StreamingParsePipelineFactory
+from autorecurse.gnumake.stats import DefaultStatisticsRecorder, StatisticsRecorder, StatisticsReport, StatisticsReportFormatEnum
+from autorecurse.gnumake.storage import FileStorageEngine
 from autorecurse.common.storage import DefaultDirectoryMapping
-from autorecurse.config import ConfigFileLocator, DirectoryMappingBuilder
+from autorecurse.config import ConfigFileLocator, DfaCacheConfigBuilder, DirectoryMappingBuilder, DumpFlagsPolicyBuilder, ForkServerConfigBuilder, NestedMakefilePrunePolicyBuilder
+from autorecurse.lib.forkserver import ForkServer
+from autorecurse.lib.file import FileLifetimeManager
+from autorecurse.lib.trace import DefaultTracer, Tracer
 from argparse import ArgumentParser, Namespace
+from configparser import ConfigParser
 from io import TextIOBase
-from typing import cast, Dict, List
+from typing import cast, Dict, List, Tuple
 import os
+import shlex
 import sys
 
 
 class Cli:
 
+    # Holds the options of `autorecurse gnumake` that configure the
+    # application. The `autorecurse` commands called by the generated
+    # makefiles read them, so that they are configured the same way.
+    OPTIONS_ENVIRONMENT_VARIABLE = 'AUTORECURSE_OPTIONS'
+
     class ArgumentParserFactory:
 
         _PARSER = None
@@ -26,10 +38,11 @@ class Cli:
         def _create_parser() -> ArgumentParser:
             parser = ArgumentParser(**Cli.ArgumentParserFactory._init_args())
             Cli.ArgumentParserFactory._setup_parser(parser)
-            subparsers = parser.add_subparsers(dest='command', title='commands', metavar='(gnumake | targetlisting | nestedrules)')
+            subparsers = parser.add_subparsers(dest='command', title='commands', metavar='(gnumake | targetlisting | nestedrules | stats)')
             Cli.ArgumentParserFactory._init_gnumake(subparsers)
             Cli.ArgumentParserFactory._init_targetlisting(subparsers)
             Cli.ArgumentParserFactory._init_nestedrules(subparsers)
+            Cli.ArgumentParserFactory._init_stats(subparsers)
             return parser
 
         @staticmethod
@@ -44,7 +57,15 @@ class Cli:
         def _setup_parser(parser: 'ArgumentParser') -> None:
             parser.add_argument('--make-executable', dest='make_executable', metavar='<make-path>', default='make', help='Path to `make` executable. Default is `make`.')
             parser.add_argument('--config-file', dest='config_file_path', metavar='<config-file>', help='Path to custom `autorecurse` configuration file.')
-            parser.add_argument('--optimize', dest='optimization', metavar='<optimization>', choices=['balanced', 'memory', 'time'], default='balanced', help='`--optimize memory` minimizes peak memory consumption. `--optimize time` to minimizes execution time. `--optimize balanced` balances execution time with peak memory optimization. Default is `--optimize balanced`.')
+            parser.add_argument('--optimize', dest='optimization', metavar='<optimization>', choices=['balanced', 'generator', 'memory', 'mmap', 'time'], default='balanced', help='`--optimize memory` minimizes peak memory consumption. `--optimize mmap` spools `make` output to a temporary file and parses it through a memory map, for very large databases. `--optimize generator` streams like `--optimize memory`, with the stages connected by Python generators. `--optimize time` to minimizes execution time. `--optimize balanced` balances execution time with peak memory optimization. Default is `--optimize balanced`.')
+            parser.add_argument('--dump-flags', dest='dump_flags', metavar='<flags>', help='Extra flags passed to `make -np` when reading makefile targets, e.g. `--dump-flags="-r -R"`. Overrides `dump_flags` in the [gnumake] configuration section. `autorecurse gnumake` passes it on to the `autorecurse` commands called by the generated makefiles, which read the targets.')
+            parser.add_argument('--check-dump-flags', dest='check_dump_flags', action='store_true', help='Read each makefile with and without the extra dump flags, and ignore the flags for makefiles whose targets they change. `autorecurse gnumake` passes it on to the `autorecurse` commands called by the generated makefiles.')
+            parser.add_argument('--goal-directed', dest='goal_directed', action='store_true', help='For `autorecurse gnumake` with explicit goals, only generate the rules of the nested makefiles that own the goals and, level by level, their prerequisites. Assumes that each nested makefile only defines targets in its own directory. Falls back to generating all rules if a goal or prerequisite is not owned by a nested makefile.')
+            parser.add_argument('--fork-server', dest='fork_server', action='store_true', help='Have `autorecurse gnumake` fork the `autorecurse` commands called by the generated makefiles from a server process that is already started and configured, instead of starting a new interpreter for each. Same as `fork_server = yes` in the [gnumake] configuration section. Needs Unix sockets and fork.')
+            parser.add_argument('--trace', dest='trace_file_path', metavar='<trace-file>', help='Record the time spent in each phase, and for each nested makefile, to <trace-file> in the Chrome trace event format. The `autorecurse` commands called by the generated makefiles add their spans to the same file. Open it in chrome://tracing or Perfetto.')
+            parser.add_argument('--stats', dest='stats', action='store_true', help='When the command is done, report to standard error, for each makefile whose targets were read: `make -np` time, database size, lines dropped by each filter and kept, targets parsed and shared cache hits and misses. Includes the `autorecurse` commands called by the generated makefiles.')
+            parser.add_argument('--stats-format', dest='stats_format', metavar='<format>', choices=[StatisticsReportFormatEnum.TABLE, StatisticsReportFormatEnum.JSON], default=StatisticsReportFormatEnum.TABLE, help='Format of the statistics report, `table` or `json`. Default is `table`.')
+            parser.add_argument('--dfa-cache', dest='dfa_cache', action='store_true', help='Load the lexer and parser DFAs built by earlier runs from the cache directory, and save them back when they grow. Same as `dfa_cache = yes` in the [gnumake] configuration section. `autorecurse gnumake` passes it on to the `autorecurse` commands called by the generated makefiles, which do the parsing.')
 
         @staticmethod
         def _init_gnumake(subparsers) -> None:
@@ -73,25 +94,75 @@ class Cli:
             parser = subparsers.add_parser('nestedrules', **args)
             parser.add_argument('dir', metavar='<dir>', help='Directory to generate nested rules for.')
 
+        @staticmethod
+        def _init_stats(subparsers) -> None:
+            args = {} # type: Dict[str, object]
+            args['help'] = 'Report the cost of reading each nested makefile of <dir>.'
+            args['description'] = 'Run `make -np` on each nested makefile of <dir>, and report the statistics described under `--stats` to standard output.'
+            args['allow_abbrev'] = False
+            parser = subparsers.add_parser('stats', **args)
+            parser.add_argument('dir', metavar='<dir>', nargs='?', default=os.curdir, help='Directory whose nested makefiles are read. Default is the current directory.')
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._dfa_cache = None # type: GrammarDfaCache
+        self._is_fork_server_enabled = None # type: bool
+        self._configuration_key = None # type: Tuple
+        self._statistics_file = None # type: FileLifetimeManager
+        self._statistics_format = None # type: str
+
     @staticmethod
     def make() -> 'Cli':
-        return Cli()
+        instance = Cli()
+        instance._dfa_cache = None
+        instance._is_fork_server_enabled = False
+        instance._configuration_key = None
+        instance._statistics_file = None
+        instance._statistics_format = None
+        return instance
 
     def execute(self, args: List[str]) -> None:
+        try:
+            self._execute(args)
+        finally:
+            if self._dfa_cache is not None:
+                self._dfa_cache.save()
+            DefaultTracer.make().close()
+            self._close_statistics()
+
+    def _execute(self, args: List[str]) -> None:
         parser = Cli.ArgumentParserFactory.create_parser()
         while True:
             if 0 < len(args):
+                name_args = args
+                args = Cli._inherited_options() + args
                 namespace, other_args = parser.parse_known_args(args)
-                self._configure_application(namespace)
+                self._configure_tracing(namespace, name_args)
+                with DefaultTracer.make().span('configure'):
+                    self._configure_application(namespace)
+                self._configure_statistics(namespace)
                 if namespace.command == 'gnumake':
                     namespace, make_args = parser.parse_known_args(args)
                     gnu = GnuMake.make()
                     gnu.executable_name = namespace.make_executable
                     execution_directory = gnu.execution_directory(make_args)
-                    with gnu.create_nested_update_file() as file_manager:
-                        with file_manager.open_file('w') as file:
-                            gnu.update_nested_update_file(cast(TextIOBase, file), execution_directory)
-                        gnu.run_make(make_args, file_manager.file_path)
+                    goals = gnu.goals(make_args)
+                    Cli._export_options(namespace)
+                    if namespace.goal_directed and (len(goals) != 0):
+                        with gnu.create_goal_rule_file() as file_manager:
+                            with file_manager.open_file('w') as file:
+                                is_complete = gnu.update_goal_rule_file(cast(TextIOBase, file), execution_directory, goals)
+                            if is_complete:
+                                # Exits with the status of make.
+                                gnu.run_goal_directed_make(make_args, file_manager.file_path)
+                    gnu.update_persistent_nested_update_file(execution_directory)
+                    if self._is_fork_server_enabled and ForkServer.is_supported():
+                        socket_path = gnu.storage_engine.create_fork_server_socket_path()
+                        with ForkServer.make(socket_path, self.execute) as server:
+                            os.environ[ForkServer.ENVIRONMENT_VARIABLE] = server.socket_path
+                            # Exits with the status of make.
+                            gnu.run_make(make_args, gnu.nested_update_file_path(execution_directory))
+                    gnu.run_make(make_args, gnu.nested_update_file_path(execution_directory))
                     break
                 if namespace.command == 'targetlisting':
                     namespace = parser.parse_args(args)
@@ -102,6 +173,15 @@ class Cli:
                     gnu.executable_name = namespace.make_executable
                     gnu.update_target_listing_file(makefile)
                     break
+                if namespace.command == 'stats':
+                    namespace = parser.parse_args(args)
+                    directory = os.path.realpath(os.path.join(os.getcwd(), namespace.dir))
+                    gnu = GnuMake.make()
+                    gnu.executable_name = namespace.make_executable
+                    gnu.measure_nested_makefiles(directory)
+                    report = StatisticsReport.make(DefaultStatisticsRecorder.make().statistics)
+                    report.print(namespace.stats_format, cast(TextIOBase, sys.stdout))
+                    break
                 if namespace.command == 'nestedrules':
                     namespace = parser.parse_args(args)
                     directory = os.path.realpath(os.path.join(os.getcwd(), namespace.dir))
@@ -115,26 +195,138 @@ class Cli:
             break
 
 
+    @staticmethod
+    def _inherited_options() -> List[str]:
+        return shlex.split(os.environ.get(Cli.OPTIONS_ENVIRONMENT_VARIABLE, ''))
+
+    @staticmethod
+    def _export_options(namespace: Namespace) -> None:
+        options = ['--make-executable', namespace.make_executable, '--optimize', namespace.optimization]
+        if namespace.config_file_path is not None:
+            options.extend(['--config-file', os.path.realpath(namespace.config_file_path)])
+        if namespace.dump_flags is not None:
+            # Joined, since the flags themselves start with '-'.
+            options.append('='.join(['--dump-flags', namespace.dump_flags]))
+        if namespace.check_dump_flags:
+            options.append('--check-dump-flags')
+        if namespace.dfa_cache:
+            options.append('--dfa-cache')
+        os.environ[Cli.OPTIONS_ENVIRONMENT_VARIABLE] = ' '.join([shlex.quote(option) for option in options])
+
+    def _configure_tracing(self, namespace: Namespace, args: List[str]) -> None:
+        name = ' '.join(['autorecurse'] + args)
+        if namespace.trace_file_path is not None:
+            tracer = Tracer.make_root(os.path.realpath(namespace.trace_file_path), name)
+            os.environ[Tracer.ENVIRONMENT_VARIABLE] = tracer.environment_value
+        elif Tracer.ENVIRONMENT_VARIABLE in os.environ:
+            tracer = Tracer.make_from_environment(os.environ[Tracer.ENVIRONMENT_VARIABLE], name)
+        else:
+            tracer = Tracer.make_disabled()
+        DefaultTracer.set(tracer)
+
+    def _configure_statistics(self, namespace: Namespace) -> None:
+        self._statistics_file = None
+        self._statistics_format = namespace.stats_format
+        if namespace.command == 'stats':
+            recorder = StatisticsRecorder.make()
+        elif namespace.stats:
+            self._statistics_file = GnuMake.make().storage_engine.create_statistics_file()
+            self._statistics_file.__enter__()
+            recorder = StatisticsRecorder.make(self._statistics_file.file_path)
+            os.environ[StatisticsRecorder.ENVIRONMENT_VARIABLE] = self._statistics_file.file_path
+        elif StatisticsRecorder.ENVIRONMENT_VARIABLE in os.environ:
+            recorder = StatisticsRecorder.make(os.environ[StatisticsRecorder.ENVIRONMENT_VARIABLE])
+        else:
+            recorder = StatisticsRecorder.make_disabled()
+        DefaultStatisticsRecorder.set(recorder)
+
+    def _close_statistics(self) -> None:
+        """
+        Writes out the statistics of this process. If it was started with
+        `--stats`, reports the statistics of all processes.
+        """
+        DefaultStatisticsRecorder.make().close()
+        if self._statistics_file is not None:
+            try:
+                report = StatisticsReport.make(StatisticsRecorder.read_file(self._statistics_file.file_path))
+                report.print(self._statistics_format, cast(TextIOBase, sys.stderr))
+            finally:
+                self._statistics_file.__exit__(None, None, None)
+                self._statistics_file = None
+
     def _configure_application(self, namespace: Namespace) -> None:
-        self._configure_directory_mapping(namespace)
+        # Commands served by a fork server inherit the configuration of
+        # the server, which only has to be redone if their options
+        # differ. They get the options of `autorecurse gnumake` through
+        # OPTIONS_ENVIRONMENT_VARIABLE, with the config file path made
+        # canonical, so the path is made canonical here too. The fork
+        # server option is left out, since only `autorecurse gnumake`
+        # uses it.
+        config_file_path = namespace.config_file_path
+        if config_file_path is not None:
+            config_file_path = os.path.realpath(config_file_path)
+        configuration_key = (config_file_path, namespace.optimization, namespace.dump_flags, namespace.check_dump_flags, namespace.dfa_cache)
+        if configuration_key == self._configuration_key:
+            return
+        config = ConfigFileLocator.make().read_config_files(namespace.config_file_path)
+        self._configure_directory_mapping(config)
         self._configure_parse_pipeline(namespace)
+        self._configure_dump_flags(namespace, config)
+        self._configure_nested_makefile_pruning(config)
+        self._configure_dfa_cache(namespace, config)
+        self._configure_fork_server(namespace, config)
+        self._configuration_key = configuration_key
 
-    def _configure_directory_mapping(self, namespace: Namespace) -> None:
+    def _configure_directory_mapping(self, config: ConfigParser) -> None:
         builder = DirectoryMappingBuilder.make()
-        config_files = ConfigFileLocator.make()
-        config_files.include_standard_config_files(builder)
-        if namespace.config_file_path is not None:
-            builder.include_config_file_path(namespace.config_file_path)
+        builder.include_config(config)
         DefaultDirectoryMapping.set(builder.build_directory_mapping())
 
+    def _configure_dump_flags(self, namespace: Namespace, config: ConfigParser) -> None:
+        builder = DumpFlagsPolicyBuilder.make()
+        builder.include_config(config)
+        if namespace.dump_flags is not None:
+            builder.flags = shlex.split(namespace.dump_flags)
+        if namespace.check_dump_flags:
+            builder.check = True
+        GnuMake.make().dump_flags_policy = builder.build_dump_flags_policy()
+
+    def _configure_nested_makefile_pruning(self, config: ConfigParser) -> None:
+        builder = NestedMakefilePrunePolicyBuilder.make()
+        builder.include_config(config)
+        GnuMake.make().nested_makefile_prune_policy = builder.build_prune_policy()
+
+    def _configure_dfa_cache(self, namespace: Namespace, config: ConfigParser) -> None:
+        builder = DfaCacheConfigBuilder.make()
+        builder.include_config(config)
+        if namespace.dfa_cache:
+            builder.is_enabled = True
+        if builder.is_enabled and (self._dfa_cache is None):
+            self._dfa_cache = GrammarDfaCache.make(FileStorageEngine.make(DefaultDirectoryMapping.make()))
+            self._dfa_cache.load()
+
+    def _configure_fork_server(self, namespace: Namespace, config: ConfigParser) -> None:
+        builder = ForkServerConfigBuilder.make()
+        builder.include_config(config)
+        if namespace.fork_server:
+            builder.is_enabled = True
+        self._is_fork_server_enabled = builder.is_enabled
+
     def _configure_parse_pipeline(self, namespace: Namespace) -> None:
         while True:
             if namespace.optimization == 'balanced':
                 DefaultParsePipelineFactory.set(BalancedParsePipelineFactory.make())
                 break
+            if namespace.optimization == 'generator':
+                DefaultParsePipelineFactory.set(GeneratorParsePipelineFactory.make())
+                break
             if namespace.optimization == 'memory':
                 DefaultParsePipelineFactory.set(StreamingParsePipelineFactory.make())
                 break
+            if namespace.optimization == 'mmap':
+                storage_engine = FileStorageEngine.make(DefaultDirectoryMapping.make())
+                DefaultParsePipelineFactory.set(SpooledParsePipelineFactory.make(storage_engine))
+                break
             if namespace.optimization == 'time':
                 DefaultParsePipelineFactory.set(BufferedParsePipelineFactory.make())
                 break
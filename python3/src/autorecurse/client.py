@@ -0,0 +1,43 @@
+from autorecurse.lib.forkserver import ForkServer, ForkServerClient
+from typing import List
+import os
+import sys
+
+
+def run_with_fork_server(args: List[str]) -> int:
+    """
+    Returns the exit status of args as run by the fork server, or None
+    if there is no fork server to run it.
+
+    If the connection fails after the request was sent, for instance
+    because the process serving it died, the request may have run in
+    part, so it is not run again. The error is reported and the exit
+    status is 1.
+    """
+    socket_path = os.environ.get(ForkServer.ENVIRONMENT_VARIABLE)
+    if not socket_path:
+        return None
+    try:
+        client = ForkServerClient.make(socket_path)
+        return client.request(args, os.getcwd(), dict(os.environ), [0, 1, 2])
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    except OSError as error:
+        sys.stderr.write('autorecurse: fork server request failed: {0}\n'.format(error))
+        return 1
+
+
+def main() -> None:
+    """
+    Entry point of the `autorecurse` command.
+
+    Recipes of the makefiles generated by `autorecurse gnumake` call
+    `autorecurse` again. If `autorecurse gnumake` runs a fork server,
+    the command is passed to it instead of being run here. Only the
+    modules needed to reach the server are imported before that.
+    """
+    status = run_with_fork_server(sys.argv[1:])
+    if status is not None:
+        sys.exit(status)
+    from autorecurse.cli import main as cli_main
+    cli_main()
@@ -9,6 +9,13 @@ class DirectoryMapping(metaclass=ABCMeta):
     def get_directory(self, symbolic_name: str) -> str:
         pass
 
+    def has_directory(self, symbolic_name: str) -> bool:
+        try:
+            self.get_directory(symbolic_name)
+        except KeyError:
+            return False
+        return True
+
     def make_directory(self, symbolic_name: str) -> None:
         if not os.path.isdir(self.get_directory(symbolic_name)):
             os.makedirs(self.get_directory(symbolic_name))
@@ -35,6 +42,9 @@ class DictionaryDirectoryMapping(DirectoryMapping):
     def get_directory(self, symbolic_name: str) -> str:
         return self._directory_dict[symbolic_name]
 
+    def has_directory(self, symbolic_name: str) -> bool:
+        return symbolic_name in self._directory_dict
+
 
 class DefaultDirectoryMapping:
 
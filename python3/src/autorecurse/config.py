@@ -1,11 +1,13 @@
 from autorecurse.common.storage import DictionaryDirectoryMapping, DirectoryMapping
+from autorecurse.gnumake.policy import DumpFlagsPolicy, NestedMakefilePrunePolicy
 from autorecurse.gnumake.storage import DirectoryEnum as GnuMakeDirectoryEnum
 from pkg_resources import resource_stream
 from abc import ABCMeta, abstractmethod
 from configparser import ConfigParser
 from io import TextIOBase, TextIOWrapper
-from typing import Dict
+from typing import Dict, List
 import os
+import shlex
 import sys
 
 
@@ -19,13 +21,28 @@ class ConfigFileLocator:
             ConfigFileLocator._INSTANCE = ConfigFileLocator()
         return ConfigFileLocator._INSTANCE
 
-    def include_standard_config_files(self, builder: 'ConfigFileConverter') -> None:
+    def read_config_files(self, config_file_path: str = None) -> ConfigParser:
+        """
+        Reads the standard configuration files and, if config_file_path
+        is not None, the configuration file at that path, into one
+        ConfigParser. Keys of later files override those of earlier
+        ones. Every ConfigFileConverter can then include the result.
+        """
+        config = ConfigFileLocator._make_config_parser()
         with self._resource_name_to_file(self._default_config_resource_name()) as default_file:
-            builder.include_config_file(default_file)
+            config.read_file(default_file)
         resource_name = self._platform_config_resource_name()
         if resource_name is not None:
             with self._resource_name_to_file(resource_name) as platform_file:
-                builder.include_config_file(platform_file)
+                config.read_file(platform_file)
+        if config_file_path is not None:
+            with open(config_file_path, mode='r', encoding='utf-8') as config_file:
+                config.read_file(config_file, source=config_file_path)
+        return config
+
+    @staticmethod
+    def _make_config_parser() -> ConfigParser:
+        return ConfigParser(dict_type=dict, empty_lines_in_values=False, interpolation=None) # type: ignore
 
     def _default_config_resource_name(self) -> str:
         return 'config/default.txt'
@@ -52,11 +69,7 @@ class ConfigFileLocator:
 class ConfigFileConverter(metaclass=ABCMeta):
 
     @abstractmethod
-    def include_config_file_path(self, config_file_path: str) -> None:
-        pass
-
-    @abstractmethod
-    def include_config_file(self, config_file: TextIOBase) -> None:
+    def include_config(self, config: ConfigParser) -> None:
         pass
 
 
@@ -72,23 +85,15 @@ class DirectoryMappingBuilder(ConfigFileConverter):
         instance._dict = {}
         return instance
 
-    def include_config_file_path(self, path: str) -> None:
-        with open(path, mode='r', encoding='utf-8') as config_file:
-            config = ConfigParser(dict_type=dict, empty_lines_in_values=False, interpolation=None) # type: ignore
-            config.read_file(config_file, source=path)
-            self._process_config(config)
-
-    def include_config_file(self, config_file: TextIOBase) -> None:
-        config = ConfigParser(dict_type=dict, empty_lines_in_values=False, interpolation=None) # type: ignore
-        config.read_file(config_file)
-        self._process_config(config)
-
-    def _process_config(self, config: ConfigParser) -> None:
+    def include_config(self, config: ConfigParser) -> None:
         if 'gnumake' in config:
             gnumake_config = config['gnumake']
             if 'cache_dir' in gnumake_config:
                 self._dict[GnuMakeDirectoryEnum.NESTED_RULE] = self._expand_path(gnumake_config['cache_dir'])
                 self._dict[GnuMakeDirectoryEnum.TARGET_LISTING] = self._expand_path(gnumake_config['cache_dir'])
+                self._dict[GnuMakeDirectoryEnum.DFA_CACHE] = self._expand_path(gnumake_config['cache_dir'])
+            if 'shared_cache_dir' in gnumake_config:
+                self._dict[GnuMakeDirectoryEnum.SHARED_CACHE] = self._expand_path(gnumake_config['shared_cache_dir'])
             if 'temp_dir' in gnumake_config:
                 self._dict[GnuMakeDirectoryEnum.TMP] = self._expand_path(gnumake_config['temp_dir'])
 
@@ -102,3 +107,168 @@ class DirectoryMappingBuilder(ConfigFileConverter):
         return os.path.realpath(result)
 
 
+class DumpFlagsPolicyBuilder(ConfigFileConverter):
+    """
+    Builds a DumpFlagsPolicy from the following keys of the [gnumake]
+    section. Later configuration files override earlier ones.
+
+    - dump_flags: Extra flags for `make -np`, e.g. `-r -R`.
+    - dump_flags_check: Whether to confirm that the extra flags do not
+      change the targets of each makefile. The verdict is kept in
+      `cache_dir` until the makefile changes.
+    - dump_flags_exclude: Whitespace separated fnmatch patterns of
+      absolute makefile paths that are read without extra flags.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._flags = None # type: List[str]
+        self._check = None # type: bool
+        self._excluded_patterns = None # type: List[str]
+
+    @staticmethod
+    def make() -> 'DumpFlagsPolicyBuilder':
+        instance = DumpFlagsPolicyBuilder()
+        instance._flags = []
+        instance._check = False
+        instance._excluded_patterns = []
+        return instance
+
+    @property
+    def flags(self) -> List[str]:
+        return list(self._flags)
+
+    @flags.setter
+    def flags(self, value: List[str]) -> None:
+        self._flags = list(value)
+
+    @property
+    def check(self) -> bool:
+        return self._check
+
+    @check.setter
+    def check(self, value: bool) -> None:
+        self._check = value
+
+    def include_config(self, config: ConfigParser) -> None:
+        if 'gnumake' in config:
+            gnumake_config = config['gnumake']
+            if 'dump_flags' in gnumake_config:
+                self._flags = shlex.split(gnumake_config['dump_flags'])
+            if 'dump_flags_check' in gnumake_config:
+                self._check = gnumake_config.getboolean('dump_flags_check')
+            if 'dump_flags_exclude' in gnumake_config:
+                self._excluded_patterns = [os.path.expanduser(os.path.expandvars(pattern)) for pattern in shlex.split(gnumake_config['dump_flags_exclude'])]
+
+    def build_dump_flags_policy(self) -> DumpFlagsPolicy:
+        return DumpFlagsPolicy.make(self._flags, self._check, self._excluded_patterns)
+
+
+class DfaCacheConfigBuilder(ConfigFileConverter):
+    """
+    Reads the `dfa_cache` key of the [gnumake] section. If it is true,
+    the lexer and parser DFAs are persisted in `cache_dir` between runs.
+    Later configuration files override earlier ones.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._is_enabled = None # type: bool
+
+    @staticmethod
+    def make() -> 'DfaCacheConfigBuilder':
+        instance = DfaCacheConfigBuilder()
+        instance._is_enabled = False
+        return instance
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._is_enabled
+
+    @is_enabled.setter
+    def is_enabled(self, value: bool) -> None:
+        self._is_enabled = value
+
+    def include_config(self, config: ConfigParser) -> None:
+        if 'gnumake' in config:
+            gnumake_config = config['gnumake']
+            if 'dfa_cache' in gnumake_config:
+                self._is_enabled = gnumake_config.getboolean('dfa_cache')
+
+
+class ForkServerConfigBuilder(ConfigFileConverter):
+    """
+    Reads the `fork_server` key of the [gnumake] section. If it is true,
+    `autorecurse gnumake` runs the `autorecurse` commands called by the
+    generated makefiles through a fork server. Later configuration files
+    override earlier ones.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._is_enabled = None # type: bool
+
+    @staticmethod
+    def make() -> 'ForkServerConfigBuilder':
+        instance = ForkServerConfigBuilder()
+        instance._is_enabled = False
+        return instance
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._is_enabled
+
+    @is_enabled.setter
+    def is_enabled(self, value: bool) -> None:
+        self._is_enabled = value
+
+    def include_config(self, config: ConfigParser) -> None:
+        if 'gnumake' in config:
+            gnumake_config = config['gnumake']
+            if 'fork_server' in gnumake_config:
+                self._is_enabled = gnumake_config.getboolean('fork_server')
+
+
+class NestedMakefilePrunePolicyBuilder(ConfigFileConverter):
+    """
+    Builds a NestedMakefilePrunePolicy from the following keys of the
+    [gnumake] section. Later configuration files override earlier ones.
+
+    - nested_exclude: Whitespace separated glob patterns of directories
+      that are not searched for nested makefiles, e.g.
+      `node_modules third_party/*`.
+    - nested_max_depth: Deepest level of subdirectories searched for
+      nested makefiles. Empty for no limit.
+    - nested_ignore_files: Whitespace separated names of ignore files
+      to honour, e.g. `.autorecurseignore .gitignore`.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._excluded_patterns = None # type: List[str]
+        self._max_depth = None # type: int
+        self._ignore_file_names = None # type: List[str]
+
+    @staticmethod
+    def make() -> 'NestedMakefilePrunePolicyBuilder':
+        instance = NestedMakefilePrunePolicyBuilder()
+        instance._excluded_patterns = []
+        instance._max_depth = None
+        instance._ignore_file_names = []
+        return instance
+
+    def include_config(self, config: ConfigParser) -> None:
+        if 'gnumake' in config:
+            gnumake_config = config['gnumake']
+            if 'nested_exclude' in gnumake_config:
+                self._excluded_patterns = shlex.split(gnumake_config['nested_exclude'])
+            if 'nested_max_depth' in gnumake_config:
+                if len(gnumake_config['nested_max_depth'].strip()) == 0:
+                    self._max_depth = None
+                else:
+                    self._max_depth = gnumake_config.getint('nested_max_depth')
+            if 'nested_ignore_files' in gnumake_config:
+                self._ignore_file_names = shlex.split(gnumake_config['nested_ignore_files'])
+
+    def build_prune_policy(self) -> NestedMakefilePrunePolicy:
+        return NestedMakefilePrunePolicy.make(self._excluded_patterns, self._max_depth, self._ignore_file_names)
@@ -0,0 +1,306 @@
+from autorecurse.lib.file import FileReplacement
+from autorecurse.lib.iterator import Iterator, IteratorContext, ListIterator, PythonIteratorWrapper
+from autorecurse.gnumake.data import Makefile, Target
+from autorecurse.gnumake.policy import DumpFlagsPolicy
+from autorecurse.gnumake.stats import DefaultStatisticsRecorder
+from autorecurse.gnumake.storage import StorageEngine
+from typing import List
+import hashlib
+import json
+import os
+
+
+class RelocatableTargetCache:
+    """
+    Content-addressed cache of the targets that `make -np` reads from
+    nested makefiles, shared by all checkouts of a tree on a machine.
+
+    An entry is keyed by the content and name of the makefile, its
+    directory relative to the checkout root, the make executable and the
+    dump flags (with `--check` appended if they are checked). The
+    directory is part of the key because the targets may depend on it,
+    through $(CURDIR) for instance, even if the makefile content does
+    not. It records the makefiles that were
+    read along with the makefile (MAKEFILE_LIST), with a hash of their
+    content, and is only used if none of them changed.
+
+    Absolute paths inside the checkout, the nearest directory above the
+    makefile that holds a `.git` entry, are stored relative to the
+    makefile directory, and rebased onto the makefile directory of the
+    checkout that reads the entry. Relative paths are stored as they
+    are, and absolute paths outside the checkout are left untouched.
+
+    Entries only hold target paths and prerequisites, which is all that
+    the target listing and nested rule files use. Recipes are not
+    stored.
+    """
+
+    FORMAT_VERSION = 1
+
+    MAKEFILE_LIST_TARGET = 'autorecurse-makefile-list'
+
+    # Prefix of stored paths that are relative to the makefile directory
+    # but were absolute when read. Cannot occur in a file name.
+    _REBASED_PATH_PREFIX = '\0'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._storage_engine = None # type: StorageEngine
+        self._executable_name = None # type: str
+
+    @staticmethod
+    def make(storage_engine: StorageEngine, executable_name: str) -> 'RelocatableTargetCache':
+        instance = RelocatableTargetCache()
+        instance._storage_engine = storage_engine
+        instance._executable_name = executable_name
+        return instance
+
+    def makefile_list_rule(self) -> str:
+        """
+        A rule to append to the target listing file. Its prerequisites
+        are the makefiles read before it, which tells store() what the
+        entry depends on.
+        """
+        return ''.join([RelocatableTargetCache.MAKEFILE_LIST_TARGET, ': $(MAKEFILE_LIST) ;\n'])
+
+    def lookup(self, makefile: Makefile, dump_flags_policy: DumpFlagsPolicy) -> List[Target]:
+        """
+        Returns the cached targets of makefile, including the
+        autorecurse-all-targets target, or None if there is no valid
+        entry.
+        """
+        targets = self._lookup(makefile, dump_flags_policy)
+        DefaultStatisticsRecorder.make().record_cache_lookup(makefile.path, targets is not None)
+        return targets
+
+    def _lookup(self, makefile: Makefile, dump_flags_policy: DumpFlagsPolicy) -> List[Target]:
+        path = self._storage_engine.shared_cache_file_path(self._key(makefile, dump_flags_policy))
+        try:
+            with open(path, mode='r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry.get('version') != RelocatableTargetCache.FORMAT_VERSION:
+            return None
+        exec_path = makefile.exec_path
+        for stored_path, digest in entry['includes']:
+            include_path = self._decode_path(stored_path, exec_path)
+            if self._file_digest(os.path.join(exec_path, include_path)) != digest:
+                return None
+        targets = []
+        for stored_path, stored_prerequisites, stored_order_only_prerequisites in entry['targets']:
+            prerequisites = [self._decode_path(prerequisite, exec_path) for prerequisite in stored_prerequisites]
+            order_only_prerequisites = [self._decode_path(prerequisite, exec_path) for prerequisite in stored_order_only_prerequisites]
+            target = Target.make_shared(prerequisites, order_only_prerequisites, [])
+            target.path = self._decode_path(stored_path, exec_path)
+            target.file = makefile
+            targets.append(target)
+        return targets
+
+    def store(self, makefile: Makefile, dump_flags_policy: DumpFlagsPolicy, targets: List[Target]) -> None:
+        """
+        Stores the targets read from makefile together with its target
+        listing file. Does nothing if the target listing file has no
+        makefile_list_rule().
+        """
+        exec_path = makefile.exec_path
+        root = self._checkout_root(exec_path)
+        target_listing_file_path = self._storage_engine.target_listing_file_path(makefile)
+        includes = None
+        stored_targets = []
+        for target in targets:
+            if target.path == RelocatableTargetCache.MAKEFILE_LIST_TARGET:
+                includes = []
+                for include_path in target.prerequisites:
+                    abs_path = os.path.join(exec_path, include_path)
+                    if os.path.normpath(abs_path) != target_listing_file_path:
+                        digest = self._file_digest(abs_path)
+                        if digest is None:
+                            return
+                        includes.append([self._encode_path(include_path, exec_path, root), digest])
+            else:
+                prerequisites = [self._encode_path(prerequisite, exec_path, root) for prerequisite in target.prerequisites]
+                order_only_prerequisites = [self._encode_path(prerequisite, exec_path, root) for prerequisite in target.order_only_prerequisites]
+                stored_targets.append([self._encode_path(target.path, exec_path, root), prerequisites, order_only_prerequisites])
+        if includes is None:
+            return
+        entry = {'version': RelocatableTargetCache.FORMAT_VERSION, 'includes': includes, 'targets': stored_targets}
+        self._storage_engine.create_shared_cache_directory()
+        path = self._storage_engine.shared_cache_file_path(self._key(makefile, dump_flags_policy))
+        with FileReplacement.make(path) as replacement:
+            with replacement.open_file(mode='w', encoding='utf-8') as file:
+                json.dump(entry, file)
+
+    def _key(self, makefile: Makefile, dump_flags_policy: DumpFlagsPolicy) -> str:
+        dump_flags = dump_flags_policy.flags_for(makefile)
+        if (len(dump_flags) != 0) and dump_flags_policy.check:
+            dump_flags.append('--check')
+        hash = hashlib.sha1()
+        hash.update(str(RelocatableTargetCache.FORMAT_VERSION).encode())
+        hash.update(b'\0')
+        hash.update(self._executable_name.encode())
+        hash.update(b'\0')
+        hash.update(json.dumps(dump_flags).encode())
+        hash.update(b'\0')
+        hash.update(makefile.file_path.encode())
+        hash.update(b'\0')
+        exec_path = makefile.exec_path
+        hash.update(os.path.relpath(exec_path, start=self._checkout_root(exec_path)).encode())
+        hash.update(b'\0')
+        with open(makefile.path, mode='rb') as file:
+            hash.update(file.read())
+        return hash.hexdigest()
+
+    def _file_digest(self, path: str) -> str:
+        try:
+            with open(path, mode='rb') as file:
+                return hashlib.sha1(file.read()).hexdigest()
+        except OSError:
+            return None
+
+    def _checkout_root(self, exec_path: str) -> str:
+        directory = exec_path
+        while True:
+            if os.path.exists(os.path.join(directory, '.git')):
+                return directory
+            parent = os.path.dirname(directory)
+            if parent == directory:
+                return exec_path
+            directory = parent
+
+    def _encode_path(self, path: str, exec_path: str, root: str) -> str:
+        if os.path.isabs(path) and ((path == root) or path.startswith(os.path.join(root, ''))):
+            return RelocatableTargetCache._REBASED_PATH_PREFIX + os.path.relpath(path, start=exec_path)
+        else:
+            return path
+
+    def _decode_path(self, path: str, exec_path: str) -> str:
+        if path.startswith(RelocatableTargetCache._REBASED_PATH_PREFIX):
+            return os.path.normpath(os.path.join(exec_path, path[1:]))
+        else:
+            return path
+
+
+class DumpFlagsCheckCache:
+    """
+    Keeps the verdict of a dump flags check (TargetReader.CheckedContext)
+    for each makefile, so that a makefile is only read both with and
+    without the dump flags when the verdict is missing or stale.
+
+    A verdict is stored in one file per makefile path. It is keyed by the
+    make executable, the dump flags and the content of the makefile, and
+    is checked again when any of them changes. Makefiles that the
+    makefile includes are not part of the key.
+    """
+
+    FORMAT_VERSION = 1
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._storage_engine = None # type: StorageEngine
+        self._executable_name = None # type: str
+
+    @staticmethod
+    def make(storage_engine: StorageEngine, executable_name: str) -> 'DumpFlagsCheckCache':
+        instance = DumpFlagsCheckCache()
+        instance._storage_engine = storage_engine
+        instance._executable_name = executable_name
+        return instance
+
+    def lookup(self, makefile: Makefile, dump_flags: List[str]) -> bool:
+        """
+        Returns whether the dump flags keep the targets of makefile, or
+        None if there is no valid verdict.
+        """
+        key = self._key(makefile, dump_flags)
+        if key is None:
+            return None
+        path = self._storage_engine.dump_flags_check_file_path(makefile)
+        try:
+            with open(path, mode='r', encoding='utf-8') as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if (entry.get('version') != DumpFlagsCheckCache.FORMAT_VERSION) or (entry.get('key') != key):
+            return None
+        return entry['verdict']
+
+    def store(self, makefile: Makefile, dump_flags: List[str], verdict: bool) -> None:
+        key = self._key(makefile, dump_flags)
+        if key is None:
+            return
+        entry = {'version': DumpFlagsCheckCache.FORMAT_VERSION, 'key': key, 'verdict': verdict}
+        self._storage_engine.create_dump_flags_check_directory()
+        path = self._storage_engine.dump_flags_check_file_path(makefile)
+        with FileReplacement.make(path) as replacement:
+            with replacement.open_file(mode='w', encoding='utf-8') as file:
+                json.dump(entry, file)
+
+    def _key(self, makefile: Makefile, dump_flags: List[str]) -> str:
+        hash = hashlib.sha1()
+        hash.update(self._executable_name.encode())
+        hash.update(b'\0')
+        hash.update(json.dumps(dump_flags).encode())
+        hash.update(b'\0')
+        hash.update(makefile.path.encode())
+        hash.update(b'\0')
+        try:
+            with open(makefile.path, mode='rb') as file:
+                hash.update(file.read())
+        except OSError:
+            return None
+        return hash.hexdigest()
+
+
+class RelocatableTargetCacheReader:
+    """
+    Reads the targets of nested makefiles through a
+    RelocatableTargetCache, and falls back to a NestedRuleTargetReader
+    on a miss. Targets read on a miss are stored in the cache.
+    """
+
+    class Context(IteratorContext[Target]):
+
+        @staticmethod
+        def make(parent: 'RelocatableTargetCacheReader', makefile: Makefile) -> IteratorContext[Target]:
+            instance = RelocatableTargetCacheReader.Context()
+            instance._parent = parent
+            instance._makefile = makefile
+            return instance
+
+        def __init__(self) -> None:
+            super().__init__()
+            self._parent = None # type: RelocatableTargetCacheReader
+            self._makefile = None # type: Makefile
+
+        def __enter__(self) -> Iterator[Target]:
+            cache = self._parent._cache
+            dump_flags_policy = self._parent._target_reader.dump_flags_policy
+            targets = cache.lookup(self._makefile, dump_flags_policy)
+            if targets is None:
+                with self._parent._target_reader.target_iterator(self._makefile) as read_targets:
+                    targets = [target for target in PythonIteratorWrapper.make(read_targets)]
+                cache.store(self._makefile, dump_flags_policy, targets)
+                targets = [target for target in targets if target.path != RelocatableTargetCache.MAKEFILE_LIST_TARGET]
+            return ListIterator.make(targets)
+
+        def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+            return False
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._cache = None # type: RelocatableTargetCache
+        self._target_reader = None # type: object
+
+    @staticmethod
+    def make(cache: RelocatableTargetCache, target_reader) -> 'RelocatableTargetCacheReader':
+        """
+        target_reader is the NestedRuleTargetReader used on a miss.
+        """
+        instance = RelocatableTargetCacheReader()
+        instance._cache = cache
+        instance._target_reader = target_reader
+        return instance
+
+    def target_iterator(self, makefile: Makefile) -> IteratorContext[Target]:
+        return RelocatableTargetCacheReader.Context.make(self, makefile)
@@ -99,6 +99,21 @@ class Target:
         instance._recipe_lines = list(recipe_lines)
         return instance
 
+    @staticmethod
+    def make_shared(prerequisites: List[str], order_only_prerequisites: List[str], recipe_lines: List[str]) -> 'Target':
+        """
+        Like make(), but keeps references to the given lists instead of
+        copying them. Used to let every target of a rule share the same
+        lists. The caller must not modify the lists afterwards.
+        """
+        instance = Target()
+        instance._file = None
+        instance._path = None
+        instance._prerequisites = prerequisites
+        instance._order_only_prerequisites = order_only_prerequisites
+        instance._recipe_lines = recipe_lines
+        return instance
+
     @property
     def file(self) -> Makefile:
         return self._file
@@ -146,7 +161,15 @@ class DefaultTargetFormatter(TargetFormatter):
         return DefaultTargetFormatter._INSTANCE
 
     def print(self, target: Target, file: TextIOBase) -> None:
-        file.write(target.path)
+        self.print_group([target.path], target, file)
+
+    def print_group(self, paths: List[str], target: Target, file: TextIOBase) -> None:
+        """
+        Prints a single rule for all paths, with the prerequisites and
+        recipe of target. Make treats each path as a separate target
+        with its own copy of the rule.
+        """
+        file.write(' '.join(paths))
         file.write(':')
         for prerequisite in target.prerequisites:
             file.write(' ')
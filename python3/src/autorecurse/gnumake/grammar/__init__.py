@@ -1,4 +1,4 @@
-from autorecurse.gnumake.grammar.filter import DatabaseSectionFilter, FileSectionFilter, InformationalCommentFilter
+from autorecurse.gnumake.grammar.filter import DatabaseSectionFilter, FileSectionFilter, InformationalCommentFilter, TargetDefinitionFilter, TargetDefinitionLineIterator, generate_target_definition_lines
 from autorecurse.gnumake.grammar.MakefileRuleLexer import MakefileRuleLexer
 from autorecurse.gnumake.grammar.MakefileRuleParser import MakefileRuleParser
 from autorecurse.gnumake.grammar.TargetParagraphLexer import TargetParagraphLexer
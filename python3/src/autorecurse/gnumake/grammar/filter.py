@@ -1,5 +1,8 @@
-from autorecurse.lib.line import Line
+from autorecurse.lib.iterator import Iterator
+from autorecurse.lib.line import BlockFileLineIterator, Line
 from autorecurse.lib.stream import Condition
+from typing import Tuple
+import typing
 import re
 
 
@@ -242,3 +245,232 @@ class InformationalCommentFilter(Condition[Line]):
 del InformationalCommentFilter._set_current_item
 
 
+
+
+class TargetDefinitionFilter(Condition[Line]):
+    """
+    Outputs the same lines as a CompositeCondition of
+    DatabaseSectionFilter, FileSectionFilter and
+    InformationalCommentFilter (in that order), when used with a
+    ConditionFilter.
+
+    ## Transition System Definition
+
+    ### States
+
+    - D = Before make database <- INITIAL
+    - N = No printing
+    - B = Before printing
+    - Y = Printing
+    - F = Finished
+
+    ### Transition Labels
+
+    - Database = Recieve Line equal to _DATABASE_START_LINE
+    - Start = Recieve Line equal to _START_LINE
+    - End = Recieve Line equal to _END_LINE
+    - Line = Recieve any other Line
+
+    ### Transitions Grouped by Label
+
+    - Database
+      - D -> N
+      - N -> N
+      - B -> Y
+      - Y -> Y
+      - F -> F
+    - Start
+      - D -> D
+      - N -> B
+      - B -> Y
+      - Y -> Y
+      - F -> F
+    - End
+      - D -> D
+      - N -> N
+      - B -> N
+      - Y -> F
+      - F -> F
+    - Line
+      - D -> D
+      - N -> N
+      - B -> Y
+      - Y -> Y
+      - F -> F
+
+    ## Call Results
+
+    - Y
+      - condition (getter): True, unless the Line matches
+        _INFORMATIONAL_PREFIX
+    - D, N, B, F
+      - condition (getter): False
+      - skip_lines (getter): The Lines that can change the state, or
+        None in state B. Any other Line would leave the state unchanged.
+    """
+
+    _DATABASE_START_LINE = DatabaseSectionFilter._START_LINE.content
+    _START_LINE = FileSectionFilter._START_LINE.content
+    _END_LINE = FileSectionFilter._END_LINE.content
+    _INFORMATIONAL_PREFIX = '#  '
+
+    # States
+    _BEFORE_DATABASE = 0
+    _NO_PRINTING = 1
+    _BEFORE_PRINTING = 2
+    _PRINTING = 3
+    _FINISHED = 4
+
+    _SKIP_LINES = {
+            _BEFORE_DATABASE: (_DATABASE_START_LINE,),
+            _NO_PRINTING: (_START_LINE,),
+            _BEFORE_PRINTING: None,
+            _PRINTING: None,
+            _FINISHED: ()
+            }
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._state = None # type: int
+        self._printing = None # type: bool
+
+    @staticmethod
+    def make() -> 'TargetDefinitionFilter':
+        instance = TargetDefinitionFilter()
+        TargetDefinitionFilter._setup(instance)
+        return instance
+
+    @staticmethod
+    def _setup(instance: 'TargetDefinitionFilter') -> None:
+        instance._state = TargetDefinitionFilter._BEFORE_DATABASE
+        instance._printing = False
+
+    def _set_current_item(self, value: Line) -> None:
+        content = value.content
+        state = self._state
+        if state == TargetDefinitionFilter._PRINTING:
+            if content != TargetDefinitionFilter._END_LINE:
+                self._printing = not content.startswith(TargetDefinitionFilter._INFORMATIONAL_PREFIX)
+                return
+            self._state = TargetDefinitionFilter._FINISHED
+        elif state == TargetDefinitionFilter._BEFORE_PRINTING:
+            if content != TargetDefinitionFilter._END_LINE:
+                self._state = TargetDefinitionFilter._PRINTING
+                self._printing = not content.startswith(TargetDefinitionFilter._INFORMATIONAL_PREFIX)
+                return
+            self._state = TargetDefinitionFilter._NO_PRINTING
+        elif state == TargetDefinitionFilter._NO_PRINTING:
+            if content == TargetDefinitionFilter._START_LINE:
+                self._state = TargetDefinitionFilter._BEFORE_PRINTING
+        elif state == TargetDefinitionFilter._BEFORE_DATABASE:
+            if content == TargetDefinitionFilter._DATABASE_START_LINE:
+                self._state = TargetDefinitionFilter._NO_PRINTING
+        self._printing = False
+
+    current_item = property(None, _set_current_item)
+
+    @property
+    def condition(self) -> bool:
+        return self._printing
+
+    @property
+    def is_finished(self) -> bool:
+        """
+        True if no further Line can make condition True.
+        """
+        return self._state == TargetDefinitionFilter._FINISHED
+
+    @property
+    def skip_lines(self) -> Tuple[str, ...]:
+        """
+        Contents of the Lines that can change the state of this filter,
+        or None if any Line can.
+        """
+        return TargetDefinitionFilter._SKIP_LINES[self._state]
+
+del TargetDefinitionFilter._set_current_item
+
+
+class TargetDefinitionLineIterator(Iterator[Line]):
+    """
+    Equivalent to a ConditionFilter of a BlockFileLineIterator and a
+    TargetDefinitionFilter. While the filter is in a state that only a
+    few marker Lines can leave, the source is advanced straight to the
+    next marker Line, without examining the Lines in between.
+
+    Moves to end as soon as the filter is finished, without reading the
+    rest of the source.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._source = None # type: BlockFileLineIterator
+        self._filter = None # type: TargetDefinitionFilter
+        self._is_finished = None # type: bool
+
+    @staticmethod
+    def make(source: BlockFileLineIterator) -> 'TargetDefinitionLineIterator':
+        instance = TargetDefinitionLineIterator()
+        TargetDefinitionLineIterator._setup(instance, source)
+        return instance
+
+    @staticmethod
+    def _setup(instance: 'TargetDefinitionLineIterator', source: BlockFileLineIterator) -> None:
+        instance._source = source
+        instance._filter = TargetDefinitionFilter.make()
+        instance._is_finished = False
+
+    @property
+    def current_item(self) -> Line:
+        return self._source.current_item
+
+    @property
+    def has_current_item(self) -> bool:
+        return (not self._is_finished) and self._source.has_current_item
+
+    @property
+    def is_at_start(self) -> bool:
+        return self._source.is_at_start
+
+    @property
+    def is_at_end(self) -> bool:
+        return self._is_finished or self._source.is_at_end
+
+    def move_to_next(self) -> None:
+        source = self._source
+        condition = self._filter
+        while True:
+            skip_lines = condition.skip_lines
+            if skip_lines is None:
+                source.move_to_next()
+            else:
+                source.move_to_next_line_in(skip_lines)
+            if source.is_at_end:
+                return
+            condition.current_item = source.current_item
+            if condition.condition:
+                return
+            if condition.is_finished:
+                self._is_finished = True
+                return
+
+
+def generate_target_definition_lines(source: BlockFileLineIterator) -> typing.Iterator[Line]:
+    """
+    Generator equivalent of TargetDefinitionLineIterator.
+    """
+    condition = TargetDefinitionFilter.make()
+    while True:
+        skip_lines = condition.skip_lines
+        if skip_lines is None:
+            source.move_to_next()
+        else:
+            source.move_to_next_line_in(skip_lines)
+        if source.is_at_end:
+            return
+        line = source.current_item
+        condition.current_item = line
+        if condition.condition:
+            yield line
+        elif condition.is_finished:
+            return
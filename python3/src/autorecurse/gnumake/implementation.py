@@ -1,15 +1,20 @@
-from autorecurse.lib.iterator import Iterator, IteratorContext, ListIterator
-from autorecurse.lib.file import FileLifetimeManager
+from autorecurse.lib.iterator import Iterator, IteratorContext, ListIterator, PythonIteratorWrapper
+from autorecurse.lib.file import FileLifetimeManager, FileReplacement
 from autorecurse.lib.python.argparse import ThrowingArgumentParser
+from autorecurse.lib.trace import DefaultTracer, Tracer
 from autorecurse.common.storage import DefaultDirectoryMapping
 from autorecurse.gnumake.storage import FileStorageEngine, StorageEngine
+from autorecurse.gnumake.cache import DumpFlagsCheckCache, RelocatableTargetCache, RelocatableTargetCacheReader
 from autorecurse.gnumake.data import DefaultTargetFormatter, Makefile, Target
 from autorecurse.gnumake.parse import DefaultParsePipelineFactory
+from autorecurse.gnumake.policy import DumpFlagsPolicy, NestedMakefilePrunePolicy
+from autorecurse.gnumake.stats import DatabaseStatisticsReader, DefaultStatisticsRecorder, MakefileStatistics, TargetCountingIterator
 from abc import ABCMeta, abstractmethod
 from argparse import ArgumentParser
 from subprocess import Popen, PIPE, CalledProcessError
-from typing import cast, Dict, List
-from io import TextIOBase, TextIOWrapper
+from typing import cast, Dict, List, Pattern, Set, Tuple
+from io import BufferedIOBase, TextIOBase
+import hashlib
 import os
 import sys
 
@@ -34,18 +39,37 @@ class GnuMake:
 
     _INSTANCE = None
 
+    NESTED_RECIPE_VARIABLE = 'autorecurse-nested-recipe-{0}'
+
+    # Characters that would end or change the meaning of the pattern in
+    # a substitution reference.
+    _SUBSTITUTION_SPECIAL_CHARS = frozenset(' \t%:=$()')
+
+    # Changes whenever the nested update file is written differently,
+    # so that files kept from older versions are rewritten.
+    NESTED_UPDATE_FILE_FORMAT_VERSION = 1
+
+    # Options of make that take the next argument as their value.
+    _OPTIONS_WITH_ARGUMENT = frozenset(['-C', '--directory', '-E', '--eval', '-f', '--file', '--makefile', '-I', '--include-dir', '-o', '--old-file', '--assume-old', '-W', '--what-if', '--new-file', '--assume-new'])
+
+    # Options of make that take the next argument as their value only if
+    # it is a number.
+    _OPTIONS_WITH_NUMBER = frozenset(['-j', '--jobs', '-l', '--load-average', '--max-load'])
+
     def __init__(self) -> None:
         super().__init__()
         self._base_makefile_locator = None # type: DirectoryMakefileLocator
-        self._nested_makefile_locator = None # type: DirectoryMakefileLocator
+        self._nested_makefile_locator = None # type: NestedMakefileLocator
         self._storage_engine = None # type: StorageEngine
         self._executable_name = None # type: str
+        self._dump_flags_policy = None # type: DumpFlagsPolicy
 
     @staticmethod
     def make() -> 'GnuMake':
         if GnuMake._INSTANCE is None:
             GnuMake._INSTANCE = GnuMake()
             GnuMake._INSTANCE._executable_name = 'make'
+            GnuMake._INSTANCE._dump_flags_policy = DumpFlagsPolicy.make([], False, [])
             GnuMake._init_nested_makefile_locator(GnuMake._INSTANCE)
             GnuMake._init_base_makefile_locator(GnuMake._INSTANCE)
             GnuMake._INSTANCE._storage_engine = None
@@ -85,6 +109,22 @@ class GnuMake:
     def executable_name(self, value: str) -> None:
         self._executable_name = value
 
+    @property
+    def dump_flags_policy(self) -> DumpFlagsPolicy:
+        return self._dump_flags_policy
+
+    @dump_flags_policy.setter
+    def dump_flags_policy(self, value: DumpFlagsPolicy) -> None:
+        self._dump_flags_policy = value
+
+    @property
+    def nested_makefile_prune_policy(self) -> NestedMakefilePrunePolicy:
+        return self._nested_makefile_locator.prune_policy
+
+    @nested_makefile_prune_policy.setter
+    def nested_makefile_prune_policy(self, value: NestedMakefilePrunePolicy) -> None:
+        self._nested_makefile_locator.prune_policy = value
+
     def base_makefile(self, directory_path: str) -> Makefile:
         with self._base_makefile_locator.makefile_iterator(directory_path) as makefiles:
             result = None
@@ -104,24 +144,100 @@ class GnuMake:
         else:
             return os.path.realpath(os.path.join(os.getcwd(), *directory_options))
 
-    def create_nested_update_file(self) -> FileLifetimeManager:
-        return self.storage_engine.create_nested_update_file()
+    def goals(self, args: List[str]) -> List[str]:
+        """
+        The goals given in the make arguments args, that is, the
+        arguments that are neither options, option values nor variable
+        assignments.
+        """
+        goals = []
+        index = 0
+        is_option_allowed = True
+        while index < len(args):
+            arg = args[index]
+            index = index + 1
+            if is_option_allowed and arg.startswith('-'):
+                if arg == '--':
+                    is_option_allowed = False
+                elif arg in GnuMake._OPTIONS_WITH_ARGUMENT:
+                    index = index + 1
+                elif (arg in GnuMake._OPTIONS_WITH_NUMBER) and (index < len(args)) and args[index].isdigit():
+                    index = index + 1
+            elif '=' not in arg:
+                goals.append(arg)
+        return goals
+
+    def create_goal_rule_file(self) -> FileLifetimeManager:
+        return self.storage_engine.create_goal_rule_file()
+
+    def nested_update_file_path(self, execution_directory: str) -> str:
+        return self.storage_engine.nested_update_file_path(execution_directory)
+
+    def update_persistent_nested_update_file(self, execution_directory: str) -> None:
+        """
+        Brings the nested update file of execution_directory, which is
+        kept between runs, up to date.
+
+        The file starts with a header that identifies the nested
+        makefiles it was written for. The file is only rewritten if the
+        nested makefiles found now give a different header. The makefiles
+        are sorted first, so that the order in which the directory walk
+        finds them does not matter.
+        """
+        with DefaultTracer.make().span('locate nested makefiles'):
+            with self.nested_makefiles(execution_directory) as nested_makefiles:
+                makefiles = [nested_makefile for nested_makefile in nested_makefiles]
+        makefiles.sort(key=lambda makefile: (makefile.exec_path, makefile.file_path))
+        header = self._nested_update_file_header(makefiles, execution_directory)
+        path = self.nested_update_file_path(execution_directory)
+        if self._read_header(path) == header:
+            return
+        with self.storage_engine.lock_nested_update_file(execution_directory) as lock:
+            if lock.is_updated_by_other_process and (self._read_header(path) == header):
+                return
+            with DefaultTracer.make().span('write nested update file'):
+                with FileReplacement.make(path) as replacement:
+                    with replacement.open_file(mode='w') as file:
+                        file.write(header)
+                        self._print_nested_update_rules(ListIterator.make(makefiles), execution_directory, cast(TextIOBase, file))
+
+    def _nested_update_file_header(self, makefiles: List[Makefile], execution_directory: str) -> str:
+        hash = hashlib.sha1()
+        hash.update(str(GnuMake.NESTED_UPDATE_FILE_FORMAT_VERSION).encode())
+        hash.update(b'\0')
+        hash.update(execution_directory.encode())
+        hash.update(b'\0')
+        hash.update(self.nested_rule_file_path(execution_directory).encode())
+        for makefile in makefiles:
+            hash.update(b'\0')
+            hash.update(makefile.exec_path.encode())
+            hash.update(b'\0')
+            hash.update(makefile.file_path.encode())
+            hash.update(b'\0')
+            hash.update(self.target_listing_file_path(makefile).encode())
+        return '# autorecurse nested makefiles: {0}\n'.format(hash.hexdigest())
+
+    def _read_header(self, path: str) -> str:
+        try:
+            with open(path, mode='r') as file:
+                return file.readline()
+        except OSError:
+            return None
 
-    def update_nested_update_file(self, file: TextIOBase, execution_directory: str) -> None:
+    def _print_nested_update_rules(self, nested_makefiles: Iterator[Makefile], execution_directory: str, file: TextIOBase) -> None:
         target_formatter = DefaultTargetFormatter.make()
         nested_rule_file_prerequisites = []
-        with self.nested_makefiles(execution_directory) as nested_makefiles:
-            for nested_makefile in nested_makefiles:
-                makefile_exec_path = os.path.relpath(nested_makefile.exec_path, start=execution_directory)
-                makefile_file_path = nested_makefile.file_path
-                makefile_path = os.path.join(makefile_exec_path, makefile_file_path)
-                prerequisites = [makefile_path]
-                recipe_lines = [' '.join(['autorecurse targetlisting', makefile_exec_path, makefile_file_path])]
-                target = Target.make(prerequisites, [], recipe_lines)
-                target.path = self.target_listing_file_path(nested_makefile)
-                target_formatter.print(target, file)
-                file.write('\n')
-                nested_rule_file_prerequisites.append(target.path)
+        for nested_makefile in nested_makefiles:
+            makefile_exec_path = os.path.relpath(nested_makefile.exec_path, start=execution_directory)
+            makefile_file_path = nested_makefile.file_path
+            makefile_path = os.path.join(makefile_exec_path, makefile_file_path)
+            prerequisites = [makefile_path]
+            recipe_lines = [' '.join(['autorecurse targetlisting', makefile_exec_path, makefile_file_path])]
+            target = Target.make(prerequisites, [], recipe_lines)
+            target.path = self.target_listing_file_path(nested_makefile)
+            target_formatter.print(target, file)
+            file.write('\n')
+            nested_rule_file_prerequisites.append(target.path)
         recipe_lines = [' '.join(['autorecurse nestedrules', os.path.relpath(execution_directory, start=execution_directory)])]
         target = Target.make(nested_rule_file_prerequisites, [], recipe_lines)
         target.path = self.nested_rule_file_path(execution_directory)
@@ -132,18 +248,38 @@ class GnuMake:
         return self.storage_engine.target_listing_file_path(makefile)
 
     def update_target_listing_file(self, makefile: Makefile) -> None:
-        target = self._get_target_listing_target(makefile)
+        """
+        Concurrent updates of the same target listing file run one at a
+        time. An update that waited for another one to finish reuses its
+        result.
+        """
         self.storage_engine.create_target_listing_file(makefile)
-        with open(self.target_listing_file_path(makefile), mode='w') as file:
-            target_formatter = DefaultTargetFormatter.make()
-            file.write('.PHONY: ')
-            file.write(target.path)
-            file.write('\n')
-            target_formatter.print(target, cast(TextIOBase, file))
-            file.write('\n')
+        with self.storage_engine.lock_target_listing_file(makefile) as lock:
+            if lock.is_updated_by_other_process:
+                return
+            with DefaultTracer.make().span('read target listing', {'makefile': makefile.path}):
+                target = self._get_target_listing_target(makefile)
+            with FileReplacement.make(self.target_listing_file_path(makefile)) as replacement:
+                with replacement.open_file(mode='w') as file:
+                    target_formatter = DefaultTargetFormatter.make()
+                    file.write('.PHONY: ')
+                    file.write(target.path)
+                    file.write('\n')
+                    target_formatter.print(target, cast(TextIOBase, file))
+                    file.write('\n')
+                    if self.storage_engine.is_shared_cache_enabled:
+                        file.write(self._relocatable_target_cache().makefile_list_rule())
 
     def _get_target_listing_target(self, makefile: Makefile) -> Target:
+        if self.storage_engine.is_shared_cache_enabled:
+            cached_targets = self._relocatable_target_cache().lookup(makefile, self.dump_flags_policy)
+            if cached_targets is not None:
+                for cached_target in cached_targets:
+                    if cached_target.path == 'autorecurse-all-targets':
+                        return cached_target
         target_reader = TargetListingTargetReader.make(self.executable_name)
+        target_reader.dump_flags_policy = self.dump_flags_policy
+        target_reader.dump_flags_check_cache = self._dump_flags_check_cache()
         makefile_targets = []
         with target_reader.target_iterator(makefile) as targets:
             for target in targets:
@@ -152,6 +288,25 @@ class GnuMake:
         target.path = 'autorecurse-all-targets'
         return target
 
+    def _relocatable_target_cache(self) -> RelocatableTargetCache:
+        return RelocatableTargetCache.make(self.storage_engine, self.executable_name)
+
+    def _dump_flags_check_cache(self) -> DumpFlagsCheckCache:
+        return DumpFlagsCheckCache.make(self.storage_engine, self.executable_name)
+
+    def _nested_rule_target_reader(self) -> 'TargetReader':
+        """
+        Reads the targets of nested makefiles for their nested rules,
+        through the shared cache if it is enabled.
+        """
+        target_reader = NestedRuleTargetReader.make(self.executable_name, self.storage_engine)
+        target_reader.dump_flags_policy = self.dump_flags_policy
+        target_reader.dump_flags_check_cache = self._dump_flags_check_cache()
+        if self.storage_engine.is_shared_cache_enabled:
+            return RelocatableTargetCacheReader.make(self._relocatable_target_cache(), target_reader)
+        else:
+            return target_reader
+
     def target_to_literal_target(self, target: Target, execution_directory: str) -> Target:
         """
         ## Specification Domain
@@ -159,16 +314,8 @@ class GnuMake:
         - target.file is not None
         """
         exec_path = target.file.exec_path
-        prerequisites = []
-        for prerequisite in target.prerequisites:
-            abs_path = os.path.join(exec_path, prerequisite)
-            rel_path = os.path.relpath(abs_path, start=execution_directory)
-            prerequisites.append(rel_path)
-        order_only_prerequisites = []
-        for order_only_prerequisite in target.order_only_prerequisites:
-            abs_path = os.path.join(exec_path, order_only_prerequisite)
-            rel_path = os.path.relpath(abs_path, start=execution_directory)
-            order_only_prerequisites.append(rel_path)
+        prerequisites = self._literal_paths(target.prerequisites, exec_path, execution_directory)
+        order_only_prerequisites = self._literal_paths(target.order_only_prerequisites, exec_path, execution_directory)
         recipe_args = []
         recipe_args.append('@$(MAKE) --no-print-directory -C')
         abs_path = exec_path
@@ -178,30 +325,212 @@ class GnuMake:
         recipe_args.append(target.file.file_path)
         recipe_args.append(target.path)
         recipe_lines = [' '.join(recipe_args)]
-        abs_path = os.path.join(exec_path, target.path)
-        rel_path = os.path.relpath(abs_path, start=execution_directory)
         literal_target = Target.make(prerequisites, order_only_prerequisites, recipe_lines)
-        literal_target.path = rel_path
+        literal_target.path = self._literal_path(target.path, exec_path, execution_directory)
         return literal_target
 
+    def print_nested_rules(self, nested_makefile: Makefile, nested_targets: Iterator[Target], execution_directory: str, recipe_variable: str, file: TextIOBase) -> None:
+        """
+        Prints the literal targets of the targets of nested_makefile.
+
+        The recipe is the same for every target of nested_makefile, up
+        to the target name, so it is stored once in recipe_variable and
+        gets the target name from `$@`. Targets with the same
+        prerequisites are printed as a single rule. Targets whose name
+        cannot be recovered from their literal path are printed as by
+        target_to_literal_target.
+        """
+        target_formatter = DefaultTargetFormatter.make()
+        exec_path = nested_makefile.exec_path
+        path_prefix = self._nested_recipe_path_prefix(nested_makefile, execution_directory)
+        recipe_lines = ['@$(MAKE) $({0})'.format(recipe_variable)]
+        groups = {} # type: Dict[Tuple, Tuple[Target, List[str]]]
+        for nested_target in nested_targets:
+            if nested_target.path == 'autorecurse-all-targets':
+                continue
+            path = self._literal_path(nested_target.path, exec_path, execution_directory)
+            if (path_prefix is None) or (path != path_prefix + nested_target.path):
+                target_formatter.print(self.target_to_literal_target(nested_target, execution_directory), file)
+                file.write('\n')
+                continue
+            prerequisites = self._literal_paths(nested_target.prerequisites, exec_path, execution_directory)
+            order_only_prerequisites = self._literal_paths(nested_target.order_only_prerequisites, exec_path, execution_directory)
+            key = (tuple(prerequisites), tuple(order_only_prerequisites))
+            group = groups.get(key)
+            if group is None:
+                groups[key] = (Target.make_shared(prerequisites, order_only_prerequisites, recipe_lines), [path])
+            else:
+                group[1].append(path)
+        if len(groups) == 0:
+            return
+        recipe_args = []
+        recipe_args.append(recipe_variable)
+        recipe_args.append('= --no-print-directory -C')
+        recipe_args.append(os.path.relpath(exec_path, start=execution_directory))
+        recipe_args.append('-f')
+        recipe_args.append(nested_makefile.file_path)
+        if len(path_prefix) == 0:
+            recipe_args.append('$@')
+        else:
+            recipe_args.append('$(@:{0}%=%)'.format(path_prefix))
+        file.write(' '.join(recipe_args))
+        file.write('\n\n')
+        for target, paths in groups.values():
+            target_formatter.print_group(paths, target, file)
+            file.write('\n')
+
+    def _nested_recipe_path_prefix(self, nested_makefile: Makefile, execution_directory: str) -> str:
+        """
+        Returns the prefix that the literal paths of the targets of
+        nested_makefile have over their own paths, or None if the prefix
+        cannot be stripped with a substitution reference.
+        """
+        rel_path = os.path.relpath(nested_makefile.exec_path, start=execution_directory)
+        if rel_path == os.curdir:
+            return ''
+        for char in rel_path:
+            if char in GnuMake._SUBSTITUTION_SPECIAL_CHARS:
+                return None
+        return rel_path + '/'
+
+    def _literal_path(self, path: str, exec_path: str, execution_directory: str) -> str:
+        return os.path.relpath(os.path.join(exec_path, path), start=execution_directory)
+
+    def _literal_paths(self, paths: Iterator[str], exec_path: str, execution_directory: str) -> List[str]:
+        return [self._literal_path(path, exec_path, execution_directory) for path in paths]
+
+    def update_goal_rule_file(self, file: TextIOBase, execution_directory: str, goals: List[str]) -> bool:
+        """
+        Writes the nested rules that goals depend on to file.
+
+        Starting with the goals, the nested makefile that owns each path
+        is read, and the prerequisites of the path, if it is one of the
+        targets of that makefile, are added to the next level. A path is
+        owned by the nested makefile of the deepest directory that
+        contains it. The rules of every nested makefile read are written
+        to file, and the target listing files of these makefiles are
+        brought up to date first.
+
+        Paths outside execution_directory, such as system headers, are
+        leaves: no nested makefile can own them.
+
+        Returns False if a path inside execution_directory is not owned
+        by any nested makefile, since the rules for it then come from the
+        base makefile, which may depend on any nested makefile. File then
+        only holds part of the rules.
+        """
+        owners = {} # type: Dict[str, Makefile]
+        with self.nested_makefiles(execution_directory) as nested_makefiles:
+            for nested_makefile in nested_makefiles:
+                owners[nested_makefile.exec_path] = nested_makefile
+        target_reader = self._nested_rule_target_reader()
+        makefile_targets = {} # type: Dict[str, Dict[str, Target]]
+        visited_paths = set() # type: Set[str]
+        prefix = os.path.join(execution_directory, '')
+        level = [os.path.normpath(os.path.join(execution_directory, goal)) for goal in goals]
+        while len(level) != 0:
+            next_level = []
+            for path in level:
+                if (path in visited_paths) or (not path.startswith(prefix)):
+                    continue
+                visited_paths.add(path)
+                owner = self._owner(owners, path, prefix)
+                if owner is None:
+                    return False
+                targets = makefile_targets.get(owner.exec_path)
+                if targets is None:
+                    with DefaultTracer.make().span('nested targets', {'makefile': owner.path}):
+                        targets = self._read_nested_targets(target_reader, owner)
+                    makefile_targets[owner.exec_path] = targets
+                    recipe_variable = GnuMake.NESTED_RECIPE_VARIABLE.format(len(makefile_targets) - 1)
+                    self.print_nested_rules(owner, ListIterator.make(list(targets.values())), execution_directory, recipe_variable, file)
+                target = targets.get(path)
+                if target is not None:
+                    for prerequisite in target.prerequisites:
+                        next_level.append(os.path.normpath(os.path.join(owner.exec_path, prerequisite)))
+                    for prerequisite in target.order_only_prerequisites:
+                        next_level.append(os.path.normpath(os.path.join(owner.exec_path, prerequisite)))
+            level = next_level
+        return True
+
+    def _owner(self, owners: Dict[str, Makefile], path: str, prefix: str) -> Makefile:
+        directory = os.path.dirname(path)
+        while directory.startswith(prefix):
+            if directory in owners:
+                return owners[directory]
+            directory = os.path.dirname(directory)
+        return None
+
+    def _read_nested_targets(self, target_reader: 'TargetReader', makefile: Makefile) -> Dict[str, Target]:
+        """
+        Reads the targets of makefile, keyed by their normalized absolute
+        path, after updating its target listing file if it is older than
+        makefile.
+        """
+        target_listing_file_path = self.target_listing_file_path(makefile)
+        if (not os.path.isfile(target_listing_file_path)) or (os.path.getmtime(target_listing_file_path) < os.path.getmtime(makefile.path)):
+            self.update_target_listing_file(makefile)
+        result = {} # type: Dict[str, Target]
+        with target_reader.target_iterator(makefile) as targets:
+            for target in targets:
+                if target.path != 'autorecurse-all-targets':
+                    result[os.path.normpath(os.path.join(makefile.exec_path, target.path))] = target
+        return result
+
     def nested_rule_file_path(self, execution_directory: str) -> str:
         return self.storage_engine.nested_rule_file_path(execution_directory)
 
+    def measure_nested_makefiles(self, execution_directory: str) -> None:
+        """
+        Reads the targets of every nested makefile of execution_directory
+        as the target listing phase does, so that the statistics of each
+        are recorded. Each makefile is looked up in the shared cache
+        first, if it is enabled, but is read either way.
+        """
+        target_reader = TargetListingTargetReader.make(self.executable_name)
+        target_reader.dump_flags_policy = self.dump_flags_policy
+        target_reader.dump_flags_check_cache = self._dump_flags_check_cache()
+        with self.nested_makefiles(execution_directory) as nested_makefiles:
+            for nested_makefile in nested_makefiles:
+                if self.storage_engine.is_shared_cache_enabled:
+                    self._relocatable_target_cache().lookup(nested_makefile, self.dump_flags_policy)
+                with target_reader.target_iterator(nested_makefile) as targets:
+                    for target in targets:
+                        pass
+
     def update_nested_rule_file(self, execution_directory: str) -> None:
-        target_reader = NestedRuleTargetReader.make(self.executable_name, self.storage_engine)
-        target_formatter = DefaultTargetFormatter.make()
+        """
+        Concurrent updates of the same nested rule file run one at a
+        time. An update that waited for another one to finish reuses its
+        result.
+        """
+        target_reader = self._nested_rule_target_reader()
+        with self.nested_makefiles(execution_directory) as nested_makefile_iterator:
+            nested_makefiles = list(nested_makefile_iterator)
+        source_paths = []
+        for nested_makefile in nested_makefiles:
+            source_paths.append(nested_makefile.path)
+            source_paths.append(self.target_listing_file_path(nested_makefile))
         self.storage_engine.create_nested_rule_file(execution_directory)
-        with open(self.nested_rule_file_path(execution_directory), mode='w') as file:
-            with self.nested_makefiles(execution_directory) as nested_makefiles:
-                for nested_makefile in nested_makefiles:
-                    with target_reader.target_iterator(nested_makefile) as nested_targets:
-                        for nested_target in nested_targets:
-                            if nested_target.path != 'autorecurse-all-targets':
-                                literal_target = self.target_to_literal_target(nested_target, execution_directory)
-                                target_formatter.print(literal_target, cast(TextIOBase, file))
-                                file.write('\n')
+        with self.storage_engine.lock_nested_rule_file(execution_directory, source_paths) as lock:
+            if lock.is_updated_by_other_process:
+                return
+            with FileReplacement.make(self.nested_rule_file_path(execution_directory)) as replacement:
+                with replacement.open_file(mode='w') as file:
+                    for index, nested_makefile in enumerate(nested_makefiles):
+                        recipe_variable = GnuMake.NESTED_RECIPE_VARIABLE.format(index)
+                        with DefaultTracer.make().span('nested rules', {'makefile': nested_makefile.path}):
+                            with target_reader.target_iterator(nested_makefile) as nested_targets:
+                                self.print_nested_rules(nested_makefile, nested_targets, execution_directory, recipe_variable, cast(TextIOBase, file))
 
     def run_make(self, args: List[str], nested_update_file_path: str) -> None:
+        execution_directory = self.execution_directory(args)
+        self._run_make(args, [self.nested_rule_file_path(execution_directory), nested_update_file_path])
+
+    def run_goal_directed_make(self, args: List[str], goal_rule_file_path: str) -> None:
+        self._run_make(args, [goal_rule_file_path])
+
+    def _run_make(self, args: List[str], nested_file_paths: List[str]) -> None:
         execution_directory = self.execution_directory(args)
         prefix_args = []
         prefix_args.append(self.executable_name)
@@ -210,18 +539,18 @@ class GnuMake:
         if base_makefile is not None:
             suffix_args.append('-f')
             suffix_args.append(base_makefile.file_path)
-        suffix_args.append('-f')
-        suffix_args.append(self.nested_rule_file_path(execution_directory))
-        suffix_args.append('-f')
-        suffix_args.append(nested_update_file_path)
+        for nested_file_path in nested_file_paths:
+            suffix_args.append('-f')
+            suffix_args.append(nested_file_path)
         prefix_args.extend(args)
         prefix_args.extend(suffix_args)
-        proc = Popen(prefix_args)
-        try:
-            proc.wait()
-        except KeyboardInterrupt:
-            proc.terminate()
-            proc.wait()
+        with DefaultTracer.make().span('make', {'args': prefix_args}):
+            proc = Popen(prefix_args)
+            try:
+                proc.wait()
+            except KeyboardInterrupt:
+                proc.terminate()
+                proc.wait()
         sys.exit(proc.returncode)
 
 
@@ -229,26 +558,69 @@ class TargetReader(metaclass=ABCMeta):
 
     class Context(IteratorContext[Target], metaclass=ABCMeta):
 
+        # Phase that MakefileStatistics are recorded under.
+        STATISTICS_PHASE = None # type: str
+
         @staticmethod
-        def _setup(instance: 'TargetReader.Context', makefile: Makefile) -> None:
+        def _setup(instance: 'TargetReader.Context', makefile: Makefile, dump_flags: List[str]) -> None:
             instance._makefile = makefile
+            instance._dump_flags = dump_flags
             instance._process = None
+            instance._start = None
+            instance._statistics = None
+            instance._statistics_reader = None
+            instance._targets = None
 
         def __init__(self) -> None:
             super().__init__()
             self._makefile = None # type: Makefile
+            self._dump_flags = None # type: List[str]
             self._process = None # type: Popen
-            self._stdout = None # type: TextIOBase
+            self._stdout = None # type: BufferedIOBase
+            self._start = None # type: int
+            self._statistics = None # type: MakefileStatistics
+            self._statistics_reader = None # type: DatabaseStatisticsReader
+            self._targets = None # type: Iterator[Target]
 
         def __enter__(self) -> Iterator[Target]:
+            if DefaultStatisticsRecorder.make().is_enabled:
+                self._statistics = MakefileStatistics.make(self._makefile.path, self.STATISTICS_PHASE)
+            if DefaultTracer.make().is_enabled or (self._statistics is not None):
+                self._start = Tracer.timestamp()
             self._process = self._spawn_subprocess()
-            self._stdout = TextIOWrapper(self._process.stdout, encoding='utf-8')
-            return DefaultParsePipelineFactory.make().build_parse_pipeline(self._stdout, self._makefile)
+            self._stdout = self._process.stdout
+            if self._statistics is None:
+                self._targets = DefaultParsePipelineFactory.make().build_binary_parse_pipeline(self._stdout, self._makefile, 'utf-8')
+                return self._targets
+            self._statistics_reader = DatabaseStatisticsReader.make(self._stdout, self._statistics)
+            self._targets = DefaultParsePipelineFactory.make().build_binary_parse_pipeline(cast(BufferedIOBase, self._statistics_reader), self._makefile, 'utf-8')
+            return TargetCountingIterator.make(self._targets, self._statistics)
 
         def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+            if self._targets is not None:
+                DefaultParsePipelineFactory.make().close_parse_pipeline(self._targets)
             if self._process is not None:
+                if self._statistics is not None:
+                    # Leaves out the drain below, and the filter passes
+                    # that only run for statistics.
+                    parse_time = (Tracer.timestamp() - self._start) / 1000000
+                    self._statistics.make_time = parse_time - self._statistics_reader.counting_time
+                # The parse pipeline stops reading once it is past the
+                # target definitions. Closing stdout without draining
+                # it makes `make` exit with SIGPIPE on its next write
+                # instead of printing the rest of its database. The
+                # rest is only read when it is counted for statistics.
+                if self._statistics_reader is not None:
+                    self._statistics_reader.drain()
                 self._stdout.close()
                 self._process.wait()
+                if self._statistics is not None:
+                    DefaultStatisticsRecorder.make().record(self._statistics)
+                if DefaultTracer.make().is_enabled:
+                    # Covers the parse of the output too, which runs
+                    # while `make` writes it.
+                    args = {'makefile': self._makefile.path, 'args': self._process.args, 'returncode': self._process.returncode}
+                    DefaultTracer.make().add_complete_event('make -np', self._start, Tracer.timestamp() - self._start, args)
                 self._check_returncode()
             return False
 
@@ -260,20 +632,113 @@ class TargetReader(metaclass=ABCMeta):
         def _spawn_subprocess(self) -> Popen:
             pass
 
+    class CheckedContext(IteratorContext[Target]):
+        """
+        Reads the targets of a makefile with and without extra dump
+        flags. Yields the targets read with the flags if both reads
+        agree, and the targets read without them otherwise.
+
+        If the parent has a DumpFlagsCheckCache, the verdict is stored
+        in it, and a makefile with a valid verdict is only read once,
+        with or without the flags as the verdict says.
+        """
+
+        @staticmethod
+        def make(parent: 'TargetReader', makefile: Makefile, dump_flags: List[str]) -> IteratorContext[Target]:
+            instance = TargetReader.CheckedContext()
+            instance._parent = parent
+            instance._makefile = makefile
+            instance._dump_flags = dump_flags
+            instance._context = None
+            return instance
+
+        def __init__(self) -> None:
+            super().__init__()
+            self._parent = None # type: TargetReader
+            self._makefile = None # type: Makefile
+            self._dump_flags = None # type: List[str]
+            self._context = None # type: IteratorContext[Target]
+
+        def __enter__(self) -> Iterator[Target]:
+            cache = self._parent.dump_flags_check_cache
+            verdict = None
+            if cache is not None:
+                verdict = cache.lookup(self._makefile, self._dump_flags)
+            if verdict is not None:
+                self._context = self._parent._target_iterator(self._makefile, self._dump_flags if verdict else [])
+                return self._context.__enter__()
+            reduced_targets = self._read_targets(self._dump_flags)
+            full_targets = self._read_targets([])
+            verdict = self._target_keys(reduced_targets) == self._target_keys(full_targets)
+            if cache is not None:
+                cache.store(self._makefile, self._dump_flags, verdict)
+            if verdict:
+                return ListIterator.make(reduced_targets)
+            else:
+                message = 'autorecurse: warning: dump flags `{0}` change the targets of {1}; reading it without them. Add it to dump_flags_exclude to skip this check.\n'
+                sys.stderr.write(message.format(' '.join(self._dump_flags), self._makefile.path))
+                return ListIterator.make(full_targets)
+
+        def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+            if self._context is not None:
+                return self._context.__exit__(exc_type, exc_val, exc_tb)
+            return False
+
+        def _read_targets(self, dump_flags: List[str]) -> List[Target]:
+            with self._parent._target_iterator(self._makefile, dump_flags) as targets:
+                return [target for target in PythonIteratorWrapper.make(targets)]
+
+        def _target_keys(self, targets: List[Target]) -> Set[Tuple]:
+            result = set()
+            for target in targets:
+                result.add((target.path, tuple(PythonIteratorWrapper.make(target.prerequisites)), tuple(PythonIteratorWrapper.make(target.order_only_prerequisites)), tuple(PythonIteratorWrapper.make(target.recipe_lines))))
+            return result
+
     @staticmethod
     def _setup(instance: 'TargetReader', executable_name: str) -> None:
         instance._executable_name = executable_name
+        instance._dump_flags_policy = DumpFlagsPolicy.make([], False, [])
+        instance._dump_flags_check_cache = None
 
     def __init__(self) -> None:
         super().__init__()
         self._executable_name = None # type: str
+        self._dump_flags_policy = None # type: DumpFlagsPolicy
+        self._dump_flags_check_cache = None # type: DumpFlagsCheckCache
 
     @property
     def executable_name(self) -> str:
         return self._executable_name
 
-    @abstractmethod
+    @property
+    def dump_flags_policy(self) -> DumpFlagsPolicy:
+        return self._dump_flags_policy
+
+    @dump_flags_policy.setter
+    def dump_flags_policy(self, value: DumpFlagsPolicy) -> None:
+        self._dump_flags_policy = value
+
+    @property
+    def dump_flags_check_cache(self) -> DumpFlagsCheckCache:
+        """
+        Where the verdicts of dump flags checks are kept, or None to
+        check every makefile on every read.
+        """
+        return self._dump_flags_check_cache
+
+    @dump_flags_check_cache.setter
+    def dump_flags_check_cache(self, value: DumpFlagsCheckCache) -> None:
+        self._dump_flags_check_cache = value
+
     def target_iterator(self, makefile: Makefile) -> IteratorContext[Target]:
+        dump_flags = self.dump_flags_policy.flags_for(makefile)
+        if (len(dump_flags) != 0) and self.dump_flags_policy.check:
+            return TargetReader.CheckedContext.make(self, makefile, dump_flags)
+        else:
+            return self._target_iterator(makefile, dump_flags)
+
+    @abstractmethod
+    def _target_iterator(self, makefile: Makefile, dump_flags: List[str]) -> IteratorContext[Target]:
         pass
 
 
@@ -281,10 +746,12 @@ class TargetListingTargetReader(TargetReader):
 
     class Context(TargetReader.Context):
 
+        STATISTICS_PHASE = 'target listing'
+
         @staticmethod
-        def make(parent: 'TargetListingTargetReader', makefile: Makefile) -> IteratorContext[Target]:
+        def make(parent: 'TargetListingTargetReader', makefile: Makefile, dump_flags: List[str]) -> IteratorContext[Target]:
             instance = TargetListingTargetReader.Context()
-            TargetReader.Context._setup(instance, makefile)
+            TargetReader.Context._setup(instance, makefile, dump_flags)
             instance._parent = parent
             return instance
 
@@ -299,6 +766,7 @@ class TargetListingTargetReader(TargetReader):
             args = []
             args.append(self._parent.executable_name)
             args.append('-np')
+            args.extend(self._dump_flags)
             args.append('-C')
             args.append(self._makefile.exec_path)
             args.append('-f')
@@ -311,18 +779,20 @@ class TargetListingTargetReader(TargetReader):
         TargetReader._setup(instance, executable_name)
         return instance
 
-    def target_iterator(self, makefile: Makefile) -> IteratorContext[Target]:
-        return TargetListingTargetReader.Context.make(self, makefile)
+    def _target_iterator(self, makefile: Makefile, dump_flags: List[str]) -> IteratorContext[Target]:
+        return TargetListingTargetReader.Context.make(self, makefile, dump_flags)
 
 
 class NestedRuleTargetReader(TargetReader):
 
     class Context(TargetReader.Context):
 
+        STATISTICS_PHASE = 'nested rules'
+
         @staticmethod
-        def make(parent: 'NestedRuleTargetReader', makefile: Makefile) -> IteratorContext[Target]:
+        def make(parent: 'NestedRuleTargetReader', makefile: Makefile, dump_flags: List[str]) -> IteratorContext[Target]:
             instance = NestedRuleTargetReader.Context()
-            TargetReader.Context._setup(instance, makefile)
+            TargetReader.Context._setup(instance, makefile, dump_flags)
             instance._parent = parent
             return instance
 
@@ -338,6 +808,7 @@ class NestedRuleTargetReader(TargetReader):
             args = []
             args.append(self._parent.executable_name)
             args.append('-np')
+            args.extend(self._dump_flags)
             args.append('-C')
             args.append(self._makefile.exec_path)
             args.append('-f')
@@ -358,8 +829,8 @@ class NestedRuleTargetReader(TargetReader):
         super().__init__()
         self._storage_engine = None # type: StorageEngine
 
-    def target_iterator(self, makefile: Makefile) -> IteratorContext[Target]:
-        return NestedRuleTargetReader.Context.make(self, makefile)
+    def _target_iterator(self, makefile: Makefile, dump_flags: List[str]) -> IteratorContext[Target]:
+        return NestedRuleTargetReader.Context.make(self, makefile, dump_flags)
 
 
 class DirectoryMakefileLocator(metaclass=ABCMeta):
@@ -417,6 +888,10 @@ class NestedMakefileLocator(PriorityMakefileLocator):
         def __enter__(self) -> Iterator[Makefile]:
             list_ = []
             first_directory = True
+            prune_policy = self._parent.prune_policy
+            is_pruning = not prune_policy.is_empty
+            relative_paths = {self._directory_path: ''} # type: Dict[str, str]
+            inherited_rules = {} # type: Dict[str, List[Tuple[Pattern, bool, str]]]
             for dirpath, dirnames, filenames in os.walk(self._directory_path):
                 name = self._parent._get_best_name(filenames)
                 if name is not None:
@@ -427,8 +902,36 @@ class NestedMakefileLocator(PriorityMakefileLocator):
                     dirnames.clear()
                 if first_directory:
                     first_directory = False
+                if is_pruning:
+                    self._prune(prune_policy, dirpath, dirnames, filenames, relative_paths, inherited_rules)
             return ListIterator.make(list_)
 
+        def _prune(self, prune_policy: NestedMakefilePrunePolicy, dirpath: str, dirnames: List[str], filenames: List[str], relative_paths: Dict[str, str], inherited_rules: Dict[str, List[Tuple[Pattern, bool, str]]]) -> None:
+            relative_path = relative_paths.pop(dirpath)
+            rules = inherited_rules.pop(dirpath, [])
+            if len(dirnames) == 0:
+                return
+            depth = 0 if (len(relative_path) == 0) else (relative_path.count('/') + 1)
+            if (prune_policy.max_depth is not None) and (prune_policy.max_depth <= depth):
+                dirnames.clear()
+                return
+            for ignore_file_name in prune_policy.ignore_file_names:
+                if ignore_file_name in filenames:
+                    rules = rules + prune_policy.read_ignore_file(os.path.join(dirpath, ignore_file_name), relative_path)
+            kept_dirnames = []
+            for dirname in dirnames:
+                child_relative_path = dirname if (len(relative_path) == 0) else '/'.join([relative_path, dirname])
+                if prune_policy.is_excluded(dirname, child_relative_path):
+                    continue
+                if (len(rules) != 0) and NestedMakefilePrunePolicy.is_ignored(rules, dirname, child_relative_path):
+                    continue
+                kept_dirnames.append(dirname)
+                child_path = os.path.join(dirpath, dirname)
+                relative_paths[child_path] = child_relative_path
+                if len(rules) != 0:
+                    inherited_rules[child_path] = rules
+            dirnames[:] = kept_dirnames
+
         def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
             return False
 
@@ -436,8 +939,21 @@ class NestedMakefileLocator(PriorityMakefileLocator):
     def make() -> 'NestedMakefileLocator':
         instance = NestedMakefileLocator()
         PriorityMakefileLocator._setup(instance)
+        instance._prune_policy = NestedMakefilePrunePolicy.make([], None, [])
         return instance
 
+    def __init__(self) -> None:
+        super().__init__()
+        self._prune_policy = None # type: NestedMakefilePrunePolicy
+
+    @property
+    def prune_policy(self) -> NestedMakefilePrunePolicy:
+        return self._prune_policy
+
+    @prune_policy.setter
+    def prune_policy(self, value: NestedMakefilePrunePolicy) -> None:
+        self._prune_policy = value
+
     def makefile_iterator(self, directory_path: str) -> IteratorContext[Makefile]:
         return NestedMakefileLocator.Context.make(self, directory_path)
 
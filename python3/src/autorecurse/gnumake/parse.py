@@ -1,15 +1,23 @@
 from antlr4 import CommonTokenStream
 from antlr4.InputStream import InputStream
 from antlr4.error.Errors import ParseCancellationException
-from autorecurse.lib.iterator import Iterator
-from autorecurse.lib.line import FileLineIterator, LineToCharIterator
-from autorecurse.lib.stream import CompositeCondition, ConditionFilter
-from autorecurse.gnumake.grammar import DatabaseSectionFilter, FileSectionFilter, InformationalCommentFilter, MakefileRuleLexer, MakefileRuleParser, TargetParagraphLexer
+from antlr4.Token import Token
+from autorecurse.lib.file import FileLifetimeManager, FileReplacement
+from autorecurse.lib.iterator import GeneratorIterator, Iterator
+from autorecurse.lib.line import BinaryBlockFileLineIterator, BlockFileLineIterator, LineToCharIterator, generate_line_texts
+from autorecurse.lib.trace import DefaultTracer
+from autorecurse.gnumake.grammar import MakefileRuleLexer, MakefileRuleParser, TargetDefinitionLineIterator, TargetParagraphLexer, generate_target_definition_lines
 from autorecurse.gnumake.data import Makefile, Target
-from autorecurse.lib.antlr4.stream import IteratorToCharStreamAdapter, IteratorToTokenStreamAdapter, TokenSourceToIteratorAdapter, TokenToCharIterator
+from autorecurse.gnumake.storage import StorageEngine
+from autorecurse.lib.antlr4.cache import DfaSnapshot
+from autorecurse.lib.antlr4.custom import TokenListener
+from autorecurse.lib.antlr4.stream import GeneratorCharStream, IteratorToCharStreamAdapter, IteratorToTokenStreamAdapter, LineToCharStreamAdapter, TokenSourceToIteratorAdapter, TokenToCharStreamAdapter, generate_token_texts, generate_tokens
 from abc import ABCMeta, abstractmethod
-from io import StringIO, TextIOBase
-from typing import cast
+from io import BufferedIOBase, BytesIO, IOBase, StringIO, TextIOBase
+from typing import cast, Dict, List
+import mmap
+import os
+import typing
 
 
 class ParseContextTargetBuilder:
@@ -31,13 +39,17 @@ class ParseContextTargetBuilder:
             order_only_prerequisites.append(item.IDENTIFIER().symbol.text)
         recipe_lines = []
         for item in context.recipe().RECIPE_LINE():
-            line = self._trim_recipe_line(item.symbol.text)
+            line = ParseContextTargetBuilder.trim_recipe_line(item.symbol.text)
             recipe_lines.append(line)
         target = Target.make(prerequisites, order_only_prerequisites, recipe_lines)
         target.path = context.target(target_index).IDENTIFIER().symbol.text
         return target
 
-    def _trim_recipe_line(self, recipe_line: str) -> str:
+    @staticmethod
+    def trim_recipe_line(recipe_line: str) -> str:
+        """
+        Removes the line break and tab that end a RECIPE_LINE token.
+        """
         remove_count = 0
         if (recipe_line.rfind('\t') + 1 + remove_count == len(recipe_line)):
             remove_count = remove_count + 1
@@ -47,12 +59,86 @@ class ParseContextTargetBuilder:
         return recipe_line[0:end_index]
 
 
+class TokenListenerTargetBuilder(TokenListener):
+    """
+    Collects the tokens of one makefile rule while the parser consumes
+    them, so that the parser does not need to build a parse tree. The
+    builder is registered as the token listener of the parser and reused
+    for every rule.
+
+    Call reset() before parsing each declaration. The collected lists are
+    replaced, not cleared, on reset, so the targets built from one rule
+    can keep sharing them.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._targets = None # type: List[str]
+        self._prerequisites = None # type: List[str]
+        self._order_only_prerequisites = None # type: List[str]
+        self._recipe_lines = None # type: List[str]
+
+    @staticmethod
+    def make() -> 'TokenListenerTargetBuilder':
+        instance = TokenListenerTargetBuilder()
+        instance.reset()
+        return instance
+
+    def reset(self) -> None:
+        self._targets = []
+        self._prerequisites = []
+        self._order_only_prerequisites = []
+        self._recipe_lines = []
+
+    @property
+    def target_count(self) -> int:
+        return len(self._targets)
+
+    def build_target(self, target_index: int) -> Target:
+        target = Target.make_shared(self._prerequisites, self._order_only_prerequisites, self._recipe_lines)
+        target.path = self._targets[target_index]
+        return target
+
+    def visit_token(self, rule_index: int, token: Token) -> None:
+        if rule_index == MakefileRuleParser.RULE_recipe:
+            if token.type == MakefileRuleParser.RECIPE_LINE:
+                self._recipe_lines.append(ParseContextTargetBuilder.trim_recipe_line(token.text))
+        elif rule_index == MakefileRuleParser.RULE_prerequisite:
+            self._prerequisites.append(token.text)
+        elif rule_index == MakefileRuleParser.RULE_target:
+            self._targets.append(token.text)
+        elif rule_index == MakefileRuleParser.RULE_orderOnlyPrerequisite:
+            self._order_only_prerequisites.append(token.text)
+
+
 class ParsePipelineFactory(metaclass=ABCMeta):
 
-    @abstractmethod
     def build_parse_pipeline(self, file: TextIOBase, makefile: Makefile) -> Iterator[Target]:
+        return self.build_line_parse_pipeline(BlockFileLineIterator.make(file), makefile)
+
+    def build_binary_parse_pipeline(self, file: BufferedIOBase, makefile: Makefile, encoding: str = 'utf-8') -> Iterator[Target]:
+        """
+        Reads `make -np` output as raw bytes. Only the lines of the
+        target definition section are decoded.
+        """
+        return self.build_line_parse_pipeline(BinaryBlockFileLineIterator.make(file, encoding), makefile)
+
+    @abstractmethod
+    def build_line_parse_pipeline(self, file_lines: BlockFileLineIterator, makefile: Makefile) -> Iterator[Target]:
         pass
 
+    def close_parse_pipeline(self, targets: Iterator[Target]) -> None:
+        """
+        Releases what a pipeline built by this factory holds, if targets
+        are not read to the end. Does nothing by default.
+        """
+        pass
+
+    def _build_target_iterator(self, parser: MakefileRuleParser, makefile: Makefile) -> Iterator[Target]:
+        makefile_target_iterator = TreelessMakefileRuleParserToIteratorAdapter.make(parser)
+        makefile_target_iterator.makefile = makefile
+        return makefile_target_iterator
+
 
 class BufferedParsePipelineFactory(ParsePipelineFactory):
 
@@ -64,36 +150,25 @@ class BufferedParsePipelineFactory(ParsePipelineFactory):
             BufferedParsePipelineFactory._INSTANCE = BufferedParsePipelineFactory()
         return BufferedParsePipelineFactory._INSTANCE
 
-    def build_parse_pipeline(self, file: TextIOBase, makefile: Makefile) -> Iterator[Target]:
-        file_lines = FileLineIterator.make(file)
-        sub_conditions = [DatabaseSectionFilter.make(), FileSectionFilter.make(), InformationalCommentFilter.make()]
-        filtered_lines = ConditionFilter.make(file_lines, CompositeCondition.make(sub_conditions))
+    def build_line_parse_pipeline(self, file_lines: BlockFileLineIterator, makefile: Makefile) -> Iterator[Target]:
+        filtered_lines = TargetDefinitionLineIterator.make(file_lines)
         file_section_chars = LineToCharIterator.make(filtered_lines)
         char_stream_1 = None
-        with StringIO() as strbuff:
-            if file_section_chars.is_at_start:
-                file_section_chars.move_to_next()
-            while file_section_chars.has_current_item:
-                strbuff.write(file_section_chars.current_item)
-                file_section_chars.move_to_next()
-            char_stream_1 = InputStream(cast(StringIO, strbuff).getvalue())
+        with DefaultTracer.make().span('read and filter database', {'makefile': makefile.path}):
+            with StringIO() as strbuff:
+                if file_section_chars.is_at_start:
+                    file_section_chars.move_to_next()
+                while file_section_chars.has_current_item:
+                    strbuff.write(file_section_chars.current_item)
+                    file_section_chars.move_to_next()
+                char_stream_1 = InputStream(cast(StringIO, strbuff).getvalue())
         paragraph_lexer = TargetParagraphLexer(char_stream_1)
         paragraph_tokens = TokenSourceToIteratorAdapter.make(paragraph_lexer)
-        paragraph_chars = TokenToCharIterator.make(paragraph_tokens)
-        char_stream_2 = None
-        with StringIO() as strbuff:
-            if paragraph_chars.is_at_start:
-                paragraph_chars.move_to_next()
-            while paragraph_chars.has_current_item:
-                strbuff.write(paragraph_chars.current_item)
-                paragraph_chars.move_to_next()
-            char_stream_2 = InputStream(cast(StringIO, strbuff).getvalue())
+        char_stream_2 = TokenToCharStreamAdapter.make(paragraph_tokens)
         makefile_rule_lexer = MakefileRuleLexer(char_stream_2)
         token_stream_1 = CommonTokenStream(makefile_rule_lexer)
         makefile_rule_parser = MakefileRuleParser(token_stream_1)
-        makefile_target_iterator = MakefileRuleParserToIteratorAdapter.make(makefile_rule_parser)
-        makefile_target_iterator.makefile = makefile
-        return makefile_target_iterator
+        return self._build_target_iterator(makefile_rule_parser, makefile)
 
 
 class StreamingParsePipelineFactory(ParsePipelineFactory):
@@ -106,23 +181,18 @@ class StreamingParsePipelineFactory(ParsePipelineFactory):
             StreamingParsePipelineFactory._INSTANCE = StreamingParsePipelineFactory()
         return StreamingParsePipelineFactory._INSTANCE
 
-    def build_parse_pipeline(self, file: TextIOBase, makefile: Makefile) -> Iterator[Target]:
-        file_lines = FileLineIterator.make(file)
-        sub_conditions = [DatabaseSectionFilter.make(), FileSectionFilter.make(), InformationalCommentFilter.make()]
-        filtered_lines = ConditionFilter.make(file_lines, CompositeCondition.make(sub_conditions))
+    def build_line_parse_pipeline(self, file_lines: BlockFileLineIterator, makefile: Makefile) -> Iterator[Target]:
+        filtered_lines = TargetDefinitionLineIterator.make(file_lines)
         file_section_chars = LineToCharIterator.make(filtered_lines)
         char_stream_1 = IteratorToCharStreamAdapter.make(file_section_chars)
         paragraph_lexer = TargetParagraphLexer(char_stream_1)
         paragraph_tokens = TokenSourceToIteratorAdapter.make(paragraph_lexer)
-        paragraph_chars = TokenToCharIterator.make(paragraph_tokens)
-        char_stream_2 = IteratorToCharStreamAdapter.make(paragraph_chars)
+        char_stream_2 = TokenToCharStreamAdapter.make(paragraph_tokens)
         makefile_rule_lexer = MakefileRuleLexer(char_stream_2)
         makefile_rule_tokens = TokenSourceToIteratorAdapter.make(makefile_rule_lexer)
         token_stream_1 = IteratorToTokenStreamAdapter.make(makefile_rule_tokens)
         makefile_rule_parser = MakefileRuleParser(token_stream_1) # type: ignore
-        makefile_target_iterator = MakefileRuleParserToIteratorAdapter.make(makefile_rule_parser)
-        makefile_target_iterator.makefile = makefile
-        return makefile_target_iterator
+        return self._build_target_iterator(makefile_rule_parser, makefile)
 
 
 class BalancedParsePipelineFactory(ParsePipelineFactory):
@@ -135,37 +205,305 @@ class BalancedParsePipelineFactory(ParsePipelineFactory):
             BalancedParsePipelineFactory._INSTANCE = BalancedParsePipelineFactory()
         return BalancedParsePipelineFactory._INSTANCE
 
-    def build_parse_pipeline(self, file: TextIOBase, makefile: Makefile) -> Iterator[Target]:
-        file_lines = FileLineIterator.make(file)
-        sub_conditions = [DatabaseSectionFilter.make(), FileSectionFilter.make(), InformationalCommentFilter.make()]
-        filtered_lines = ConditionFilter.make(file_lines, CompositeCondition.make(sub_conditions))
+    def build_line_parse_pipeline(self, file_lines: BlockFileLineIterator, makefile: Makefile) -> Iterator[Target]:
+        filtered_lines = TargetDefinitionLineIterator.make(file_lines)
         file_section_chars = LineToCharIterator.make(filtered_lines)
         char_stream_1 = None
-        with StringIO() as strbuff:
-            if file_section_chars.is_at_start:
-                file_section_chars.move_to_next()
-            while file_section_chars.has_current_item:
-                strbuff.write(file_section_chars.current_item)
-                file_section_chars.move_to_next()
-            char_stream_1 = InputStream(cast(StringIO, strbuff).getvalue())
+        with DefaultTracer.make().span('read and filter database', {'makefile': makefile.path}):
+            with StringIO() as strbuff:
+                if file_section_chars.is_at_start:
+                    file_section_chars.move_to_next()
+                while file_section_chars.has_current_item:
+                    strbuff.write(file_section_chars.current_item)
+                    file_section_chars.move_to_next()
+                char_stream_1 = InputStream(cast(StringIO, strbuff).getvalue())
         paragraph_lexer = TargetParagraphLexer(char_stream_1)
         paragraph_tokens = TokenSourceToIteratorAdapter.make(paragraph_lexer)
-        paragraph_chars = TokenToCharIterator.make(paragraph_tokens)
-        char_stream_2 = None
-        with StringIO() as strbuff:
-            if paragraph_chars.is_at_start:
-                paragraph_chars.move_to_next()
-            while paragraph_chars.has_current_item:
-                strbuff.write(paragraph_chars.current_item)
-                paragraph_chars.move_to_next()
-            char_stream_2 = InputStream(cast(StringIO, strbuff).getvalue())
+        char_stream_2 = TokenToCharStreamAdapter.make(paragraph_tokens)
         makefile_rule_lexer = MakefileRuleLexer(char_stream_2)
         makefile_rule_tokens = TokenSourceToIteratorAdapter.make(makefile_rule_lexer)
         token_stream_1 = IteratorToTokenStreamAdapter.make(makefile_rule_tokens)
         makefile_rule_parser = MakefileRuleParser(token_stream_1) # type: ignore
-        makefile_target_iterator = MakefileRuleParserToIteratorAdapter.make(makefile_rule_parser)
-        makefile_target_iterator.makefile = makefile
-        return makefile_target_iterator
+        return self._build_target_iterator(makefile_rule_parser, makefile)
+
+
+class GeneratorParsePipelineFactory(ParsePipelineFactory):
+    """
+    Connects the stages with Python generators instead of Iterator
+    adapters. Each stage is a plain for loop over the previous one, and
+    only the parser and the returned Iterator[Target] go through the
+    Iterator protocol.
+    """
+
+    _INSTANCE = None
+
+    @staticmethod
+    def make() -> ParsePipelineFactory:
+        if GeneratorParsePipelineFactory._INSTANCE is None:
+            GeneratorParsePipelineFactory._INSTANCE = GeneratorParsePipelineFactory()
+        return GeneratorParsePipelineFactory._INSTANCE
+
+    def build_line_parse_pipeline(self, file_lines: BlockFileLineIterator, makefile: Makefile) -> Iterator[Target]:
+        filtered_lines = generate_target_definition_lines(file_lines)
+        char_stream_1 = GeneratorCharStream.make(generate_line_texts(filtered_lines))
+        paragraph_lexer = TargetParagraphLexer(char_stream_1)
+        char_stream_2 = GeneratorCharStream.make(generate_token_texts(generate_tokens(paragraph_lexer)))
+        makefile_rule_lexer = MakefileRuleLexer(char_stream_2)
+        makefile_rule_tokens = GeneratorIterator.make(generate_tokens(makefile_rule_lexer))
+        token_stream_1 = IteratorToTokenStreamAdapter.make(makefile_rule_tokens)
+        makefile_rule_parser = MakefileRuleParser(token_stream_1) # type: ignore
+        return GeneratorIterator.make(generate_targets(makefile_rule_parser, makefile))
+
+
+class DatabaseSpool:
+    """
+    Holds a copy of the target definitions of `make -np` output in a
+    temporary file, and a read-only memory map of that file.
+
+    close() unmaps the file before it removes it, since a file cannot be
+    removed on Windows while it is mapped.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._spool = None # type: FileLifetimeManager
+        self._file = None # type: BufferedIOBase
+        self._mapping = None # type: BufferedIOBase
+
+    @staticmethod
+    def make(spool: FileLifetimeManager) -> 'DatabaseSpool':
+        instance = DatabaseSpool()
+        instance._spool = spool
+        instance._file = None
+        instance._mapping = None
+        return instance
+
+    @property
+    def mapping(self) -> BufferedIOBase:
+        return self._mapping
+
+    def fill(self, source: IOBase, open_args: Dict, markers: List[typing.AnyStr]) -> None:
+        """
+        Copies source to the temporary file, up to and including the
+        last of markers, and maps the copy. Each marker is only looked
+        for after the one before it. The rest of source is left unread.
+        Call close() afterwards, even if this raises.
+        """
+        self._spool.__enter__()
+        with self._spool.open_file(**open_args) as spool_file:
+            DatabaseSpool._copy_until(source, spool_file, markers)
+        self._file = cast(BufferedIOBase, self._spool.open_file(mode='rb'))
+        if os.fstat(self._file.fileno()).st_size == 0:
+            # An empty file cannot be memory mapped.
+            self._mapping = cast(BufferedIOBase, BytesIO())
+        else:
+            self._mapping = cast(BufferedIOBase, mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def close(self) -> None:
+        if self._spool is None:
+            return
+        if self._mapping is not None:
+            self._mapping.close()
+            self._mapping = None
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._spool.file_path is not None:
+            self._spool.__exit__(None, None, None)
+        self._spool = None
+
+    @staticmethod
+    def _copy_until(source: IOBase, destination: IOBase, markers: List[typing.AnyStr]) -> None:
+        # Keeps the last len(marker) - 1 characters of the previous block,
+        # so that a marker split between two blocks is found.
+        marker_index = 0
+        tail = markers[0][:0]
+        while True:
+            block = source.read(SpooledParsePipelineFactory.SPOOL_BLOCK_SIZE)
+            if len(block) == 0:
+                return
+            window = tail + block
+            start = 0
+            while True:
+                marker = markers[marker_index]
+                index = window.find(marker, start)
+                if index == -1:
+                    break
+                start = index + len(marker)
+                marker_index = marker_index + 1
+                if marker_index == len(markers):
+                    destination.write(block[:start - len(tail)])
+                    return
+            destination.write(block)
+            tail = window[max(start, len(window) - len(markers[marker_index]) + 1):]
+
+
+class SpooledTargetIterator(Iterator[Target]):
+    """
+    Closes its DatabaseSpool when the targets are at end, or when
+    close() is called.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._source = None # type: Iterator[Target]
+        self._spool = None # type: DatabaseSpool
+
+    @staticmethod
+    def make(source: Iterator[Target], spool: DatabaseSpool) -> 'SpooledTargetIterator':
+        instance = SpooledTargetIterator()
+        instance._source = source
+        instance._spool = spool
+        return instance
+
+    @property
+    def current_item(self) -> Target:
+        return self._source.current_item
+
+    @property
+    def has_current_item(self) -> bool:
+        return self._source.has_current_item
+
+    @property
+    def is_at_start(self) -> bool:
+        return self._source.is_at_start
+
+    @property
+    def is_at_end(self) -> bool:
+        return self._source.is_at_end
+
+    def move_to_next(self) -> None:
+        self._source.move_to_next()
+        if self._source.is_at_end:
+            self.close()
+
+    def close(self) -> None:
+        self._spool.close()
+
+
+class SpooledParsePipelineFactory(ParsePipelineFactory):
+    """
+    Copies the target definitions of `make -np` output to a temporary
+    file, then parses them through a read-only memory map of that file.
+    The database is paged in by the kernel instead of being held in
+    Python strings, and only one block of it is copied into the Python
+    heap at a time.
+
+    The copy stops at the end of the target definitions, like the other
+    pipelines stop reading there. The memory map is closed, and the
+    temporary file removed, once the returned Iterator[Target] is at
+    end, or when it is passed to close_parse_pipeline.
+    """
+
+    SPOOL_BLOCK_SIZE = 1048576
+
+    # The lines that TargetDefinitionFilter waits for, in order, each
+    # with the line break before it, so that only a whole line matches.
+    # The last one ends the target definitions. Looking for it only
+    # after the ones before it skips copies of it in variable values,
+    # which `make -p` prints before the target definitions.
+    MARKERS = ['\n# Pattern-specific Variable Values', '\n# Files', '\n# files hash-table stats:']
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._storage_engine = None # type: StorageEngine
+
+    @staticmethod
+    def make(storage_engine: StorageEngine) -> 'SpooledParsePipelineFactory':
+        instance = SpooledParsePipelineFactory()
+        instance._storage_engine = storage_engine
+        return instance
+
+    def build_parse_pipeline(self, file: TextIOBase, makefile: Makefile) -> Iterator[Target]:
+        spool = self._spool(file, {'mode': 'w', 'encoding': 'utf-8'}, SpooledParsePipelineFactory.MARKERS)
+        return self._build_spooled_pipeline(spool, 'utf-8', makefile)
+
+    def build_binary_parse_pipeline(self, file: BufferedIOBase, makefile: Makefile, encoding: str = 'utf-8') -> Iterator[Target]:
+        spool = self._spool(file, {'mode': 'wb'}, [marker.encode(encoding) for marker in SpooledParsePipelineFactory.MARKERS])
+        return self._build_spooled_pipeline(spool, encoding, makefile)
+
+    def build_line_parse_pipeline(self, file_lines: BlockFileLineIterator, makefile: Makefile) -> Iterator[Target]:
+        filtered_lines = TargetDefinitionLineIterator.make(file_lines)
+        char_stream_1 = LineToCharStreamAdapter.make(filtered_lines)
+        paragraph_lexer = TargetParagraphLexer(char_stream_1)
+        paragraph_tokens = TokenSourceToIteratorAdapter.make(paragraph_lexer)
+        char_stream_2 = TokenToCharStreamAdapter.make(paragraph_tokens)
+        makefile_rule_lexer = MakefileRuleLexer(char_stream_2)
+        makefile_rule_tokens = TokenSourceToIteratorAdapter.make(makefile_rule_lexer)
+        token_stream_1 = IteratorToTokenStreamAdapter.make(makefile_rule_tokens)
+        makefile_rule_parser = MakefileRuleParser(token_stream_1) # type: ignore
+        return self._build_target_iterator(makefile_rule_parser, makefile)
+
+    def close_parse_pipeline(self, targets: Iterator[Target]) -> None:
+        if isinstance(targets, SpooledTargetIterator):
+            targets.close()
+
+    def _build_spooled_pipeline(self, spool: DatabaseSpool, encoding: str, makefile: Makefile) -> Iterator[Target]:
+        try:
+            targets = self.build_line_parse_pipeline(BinaryBlockFileLineIterator.make(spool.mapping, encoding), makefile)
+        except BaseException:
+            spool.close()
+            raise
+        return SpooledTargetIterator.make(targets, spool)
+
+    def _spool(self, file: IOBase, open_args: Dict, markers: List[typing.AnyStr]) -> DatabaseSpool:
+        spool = DatabaseSpool.make(self._storage_engine.create_database_spool_file())
+        try:
+            spool.fill(file, open_args, markers)
+        except BaseException:
+            spool.close()
+            raise
+        return spool
+
+class GrammarDfaCache:
+    """
+    Persists the DFAs of the gnumake lexers and parser between
+    processes, so that each `autorecurse` process starts with the DFAs
+    that earlier processes have built, instead of building them again
+    from the ATNs.
+
+    The cache file is keyed by DfaSnapshot.cache_key. A missing,
+    stale or unreadable cache file is ignored. Writes go through a
+    FileReplacement, so concurrent processes never see a partially
+    written cache file.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._storage_engine = None # type: StorageEngine
+        self._snapshot = None # type: DfaSnapshot
+        self._loaded_state_count = None # type: int
+
+    @staticmethod
+    def make(storage_engine: StorageEngine) -> 'GrammarDfaCache':
+        instance = GrammarDfaCache()
+        instance._storage_engine = storage_engine
+        instance._snapshot = DfaSnapshot.make([TargetParagraphLexer, MakefileRuleLexer, MakefileRuleParser])
+        instance._loaded_state_count = instance._snapshot.state_count
+        return instance
+
+    def load(self) -> None:
+        path = self._storage_engine.dfa_cache_file_path(self._snapshot.cache_key)
+        try:
+            with open(path, mode='rb') as file:
+                self._snapshot.load(cast(BufferedIOBase, file))
+        except Exception:
+            # The cache is only an optimization.
+            pass
+        self._loaded_state_count = self._snapshot.state_count
+
+    def save(self) -> None:
+        """
+        Writes the cache file, if the DFAs have grown since load().
+        """
+        if self._snapshot.state_count <= self._loaded_state_count:
+            return
+        path = self._storage_engine.dfa_cache_file_path(self._snapshot.cache_key)
+        self._storage_engine.create_dfa_cache_directory()
+        with FileReplacement.make(path) as replacement:
+            with replacement.open_file(mode='wb') as file:
+                self._snapshot.save(cast(BufferedIOBase, file))
+        self._loaded_state_count = self._snapshot.state_count
 
 
 class DefaultParsePipelineFactory:
@@ -310,3 +648,101 @@ class MakefileRuleParserToIteratorAdapter(Iterator[Target]):
         self._makefile = value
 
 
+class DeclarationParser:
+    """
+    Parses the declarations of a MakefileRuleParser one at a time, with
+    parse tree construction disabled. The tokens of each rule go
+    straight into a TokenListenerTargetBuilder, which holds the targets
+    of the last declaration parsed.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._parser = None # type: MakefileRuleParser
+        self._builder = None # type: TokenListenerTargetBuilder
+
+    @staticmethod
+    def make(parser: MakefileRuleParser) -> 'DeclarationParser':
+        instance = DeclarationParser()
+        instance._parser = parser
+        instance._builder = TokenListenerTargetBuilder.make()
+        parser.buildParseTrees = False
+        parser.token_listener = instance._builder
+        return instance
+
+    @property
+    def builder(self) -> TokenListenerTargetBuilder:
+        return self._builder
+
+    def parse_next(self) -> bool:
+        """
+        Returns False, and leaves the builder empty, if the parser is at
+        the end of its input or at an invalid declaration.
+        """
+        # The builder is also given the tokens consumed before a parse
+        # is cancelled, so it is only read after a declaration completes.
+        self._builder.reset()
+        try:
+            self._parser.declaration()
+        except ParseCancellationException:
+            self._builder.reset()
+            return False
+        return True
+
+
+class TreelessMakefileRuleParserToIteratorAdapter(MakefileRuleParserToIteratorAdapter):
+    """
+    Generates the same targets as MakefileRuleParserToIteratorAdapter,
+    but with parse tree construction disabled. The tokens of each rule
+    go straight into a TokenListenerTargetBuilder, and all targets of a
+    rule share its prerequisite and recipe lists.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._declaration_parser = None # type: DeclarationParser
+
+    @staticmethod
+    def make(parser: MakefileRuleParser) -> 'TreelessMakefileRuleParserToIteratorAdapter':
+        instance = TreelessMakefileRuleParserToIteratorAdapter()
+        TreelessMakefileRuleParserToIteratorAdapter._setup(instance, parser)
+        return instance
+
+    @staticmethod
+    def _setup(instance: 'TreelessMakefileRuleParserToIteratorAdapter', parser: MakefileRuleParser) -> None:
+        MakefileRuleParserToIteratorAdapter._setup(instance, parser)
+        instance._declaration_parser = DeclarationParser.make(parser)
+
+    @property
+    def _current_length(self) -> int:
+        if self.has_current_item: # State I
+            return self._declaration_parser.builder.target_count
+        else: # State S or E
+            return 0
+
+    def _generate_target(self) -> None:
+        self._target = self._declaration_parser.builder.build_target(self._index)
+        self._target.file = self.makefile
+
+    def _get_next_non_empty_context(self) -> None:
+        # State S or I
+        self._get_next_context()
+        while not ((self._declaration_parser.builder.target_count != 0) or self.is_at_end):
+            self._get_next_context()
+
+    def _get_next_context(self) -> None:
+        # State S or I
+        if not self._declaration_parser.parse_next():
+            self._to_E()
+
+def generate_targets(parser: MakefileRuleParser, makefile: Makefile) -> typing.Iterator[Target]:
+    """
+    Generator equivalent of TreelessMakefileRuleParserToIteratorAdapter.
+    """
+    declaration_parser = DeclarationParser.make(parser)
+    builder = declaration_parser.builder
+    while declaration_parser.parse_next():
+        for index in range(builder.target_count):
+            target = builder.build_target(index)
+            target.file = makefile
+            yield target
@@ -0,0 +1,208 @@
+from autorecurse.gnumake.data import Makefile
+from typing import List, Pattern, Tuple
+import fnmatch
+import re
+
+
+class DumpFlagsPolicy:
+    """
+    Extra flags passed to `make -np` when reading the targets of a
+    makefile, such as `-r` and `-R`, which leave the built-in rules and
+    variables out of the database dump.
+
+    Makefiles whose path matches one of the excluded patterns (as
+    matched by fnmatch) are always read without extra flags. If check
+    is True, each makefile is read both with and without the extra
+    flags, and the flags are only used if they do not change its
+    targets.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._flags = None # type: List[str]
+        self._check = None # type: bool
+        self._excluded_patterns = None # type: List[str]
+
+    @staticmethod
+    def make(flags: List[str], check: bool, excluded_patterns: List[str]) -> 'DumpFlagsPolicy':
+        instance = DumpFlagsPolicy()
+        instance._flags = list(flags)
+        instance._check = check
+        instance._excluded_patterns = list(excluded_patterns)
+        return instance
+
+    @property
+    def flags(self) -> List[str]:
+        return list(self._flags)
+
+    @property
+    def check(self) -> bool:
+        return self._check
+
+    @property
+    def excluded_patterns(self) -> List[str]:
+        return list(self._excluded_patterns)
+
+    def flags_for(self, makefile: Makefile) -> List[str]:
+        for pattern in self._excluded_patterns:
+            if fnmatch.fnmatchcase(makefile.path, pattern):
+                return []
+        return list(self._flags)
+
+
+class NestedMakefilePrunePolicy:
+    """
+    Directories that NestedMakefileLocator does not descend into.
+
+    - excluded_patterns: Glob patterns of directories. A pattern without
+      '/' is matched against the directory name, and a pattern with '/'
+      against the directory path relative to the searched directory.
+    - max_depth: Deepest level of subdirectories searched, where the
+      subdirectories of the searched directory are level 1. None for no
+      limit.
+    - ignore_file_names: Names of ignore files, such as `.gitignore`,
+      that are honoured below the searched directory.
+
+    Ignore files follow the .gitignore syntax, applied to directories
+    only. Blank lines and lines starting with '#' are skipped, '!'
+    re-includes a directory, a leading or inner '/' anchors the pattern
+    to the directory of the ignore file, and a trailing '/' is dropped.
+    In all patterns, '*' and '?' do not match '/', and '**' does.
+
+    Patterns are compiled to regular expressions once, when the policy
+    is made or the ignore file is read.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._excluded_patterns = None # type: List[str]
+        self._max_depth = None # type: int
+        self._ignore_file_names = None # type: List[str]
+        self._excluded_name_regex = None # type: Pattern
+        self._excluded_path_regex = None # type: Pattern
+
+    @staticmethod
+    def make(excluded_patterns: List[str], max_depth: int, ignore_file_names: List[str]) -> 'NestedMakefilePrunePolicy':
+        instance = NestedMakefilePrunePolicy()
+        instance._excluded_patterns = list(excluded_patterns)
+        instance._max_depth = max_depth
+        instance._ignore_file_names = list(ignore_file_names)
+        name_patterns = [pattern.rstrip('/') for pattern in excluded_patterns if '/' not in pattern.rstrip('/')]
+        path_patterns = [pattern.strip('/') for pattern in excluded_patterns if '/' in pattern.rstrip('/')]
+        instance._excluded_name_regex = NestedMakefilePrunePolicy._compile(name_patterns)
+        instance._excluded_path_regex = NestedMakefilePrunePolicy._compile(path_patterns)
+        return instance
+
+    @property
+    def excluded_patterns(self) -> List[str]:
+        return list(self._excluded_patterns)
+
+    @property
+    def max_depth(self) -> int:
+        return self._max_depth
+
+    @property
+    def ignore_file_names(self) -> List[str]:
+        return list(self._ignore_file_names)
+
+    @property
+    def is_empty(self) -> bool:
+        return (len(self._excluded_patterns) == 0) and (self._max_depth is None) and (len(self._ignore_file_names) == 0)
+
+    def is_excluded(self, name: str, relative_path: str) -> bool:
+        """
+        Whether the directory with the given name, at relative_path ('/'
+        separated) below the searched directory, matches an excluded
+        pattern.
+        """
+        if (self._excluded_name_regex is not None) and (self._excluded_name_regex.match(name) is not None):
+            return True
+        if (self._excluded_path_regex is not None) and (self._excluded_path_regex.match(relative_path) is not None):
+            return True
+        return False
+
+    def read_ignore_file(self, file_path: str, base_path: str) -> List[Tuple[Pattern, bool, str]]:
+        """
+        Reads the rules of an ignore file in the directory at base_path
+        ('/' separated, relative to the searched directory). Each rule is
+        a tuple of the compiled pattern, whether it re-includes, and the
+        base path of an anchored pattern, or None.
+        """
+        rules = []
+        with open(file_path, mode='r', encoding='utf-8', errors='replace') as file:
+            for line in file:
+                pattern = line.rstrip()
+                if (len(pattern) == 0) or pattern.startswith('#'):
+                    continue
+                is_negated = pattern.startswith('!')
+                if is_negated:
+                    pattern = pattern[1:]
+                pattern = pattern.rstrip('/')
+                while pattern.startswith('**/'):
+                    pattern = pattern[3:]
+                if len(pattern) == 0:
+                    continue
+                if '/' in pattern:
+                    rules.append((NestedMakefilePrunePolicy._compile([pattern.lstrip('/')]), is_negated, base_path))
+                else:
+                    rules.append((NestedMakefilePrunePolicy._compile([pattern]), is_negated, None))
+        return rules
+
+    @staticmethod
+    def is_ignored(rules: List[Tuple[Pattern, bool, str]], name: str, relative_path: str) -> bool:
+        result = False
+        for regex, is_negated, base_path in rules:
+            if base_path is None:
+                subject = name
+            elif len(base_path) == 0:
+                subject = relative_path
+            else:
+                subject = relative_path[len(base_path) + 1:]
+            if regex.match(subject) is not None:
+                result = not is_negated
+        return result
+
+    @staticmethod
+    def _compile(patterns: List[str]) -> Pattern:
+        if len(patterns) == 0:
+            return None
+        expressions = [NestedMakefilePrunePolicy._translate(pattern) for pattern in patterns]
+        return re.compile('(?:' + '|'.join(expressions) + r')\Z', re.DOTALL)
+
+    @staticmethod
+    def _translate(pattern: str) -> str:
+        result = []
+        index = 0
+        while index < len(pattern):
+            char = pattern[index]
+            index = index + 1
+            if char == '*':
+                if pattern.startswith('*/', index):
+                    # '**/' also matches no directory at all.
+                    result.append('(?:.*/)?')
+                    index = index + 2
+                elif pattern.startswith('*', index):
+                    result.append('.*')
+                    index = index + 1
+                else:
+                    result.append('[^/]*')
+            elif char == '?':
+                result.append('[^/]')
+            elif char == '[':
+                end = pattern.find(']', index + 1)
+                if end == -1:
+                    result.append(re.escape(char))
+                else:
+                    content = pattern[index:end].replace('\\', '\\\\')
+                    if content.startswith('!'):
+                        content = '^' + content[1:]
+                    elif content.startswith('^'):
+                        content = '\\' + content
+                    result.append('[' + content + ']')
+                    index = end + 1
+            elif (char == '\\') and (index < len(pattern)):
+                result.append(re.escape(pattern[index]))
+                index = index + 1
+            else:
+                result.append(re.escape(char))
+        return ''.join(result)
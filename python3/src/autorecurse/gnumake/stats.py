@@ -0,0 +1,477 @@
+from autorecurse.lib.iterator import Iterator
+from autorecurse.lib.line import Line
+from autorecurse.lib.stream import Condition
+from autorecurse.gnumake.data import Target
+from autorecurse.gnumake.grammar import DatabaseSectionFilter, FileSectionFilter, InformationalCommentFilter
+from io import BufferedIOBase, TextIOBase
+from typing import Dict, List, Tuple
+import json
+import os
+import time
+
+
+class MakefileStatistics:
+    """
+    What reading the targets of a makefile cost: one `make -np` run, or
+    one lookup in the shared cache.
+    """
+
+    # Names of the filters of autorecurse.gnumake.grammar.filter, in the
+    # order in which they see the lines of the database.
+    FILTER_NAMES = ['DatabaseSectionFilter', 'FileSectionFilter', 'InformationalCommentFilter']
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._makefile = None # type: str
+        self._phase = None # type: str
+        self._make_time = None # type: float
+        self._output_bytes = None # type: int
+        self._output_lines = None # type: int
+        self._dropped_lines = None # type: Dict[str, int]
+        self._kept_lines = None # type: int
+        self._targets = None # type: int
+        self._cache_hits = None # type: int
+        self._cache_misses = None # type: int
+
+    @staticmethod
+    def make(makefile: str, phase: str) -> 'MakefileStatistics':
+        instance = MakefileStatistics()
+        instance._makefile = makefile
+        instance._phase = phase
+        instance._make_time = 0.0
+        instance._output_bytes = 0
+        instance._output_lines = 0
+        instance._dropped_lines = {name: 0 for name in MakefileStatistics.FILTER_NAMES}
+        instance._kept_lines = 0
+        instance._targets = 0
+        instance._cache_hits = 0
+        instance._cache_misses = 0
+        return instance
+
+    @staticmethod
+    def make_from_dict(value: Dict) -> 'MakefileStatistics':
+        instance = MakefileStatistics.make(value['makefile'], value['phase'])
+        instance._make_time = value['make_time']
+        instance._output_bytes = value['output_bytes']
+        instance._output_lines = value['output_lines']
+        for name in MakefileStatistics.FILTER_NAMES:
+            instance._dropped_lines[name] = value['dropped_lines'].get(name, 0)
+        instance._kept_lines = value['kept_lines']
+        instance._targets = value['targets']
+        instance._cache_hits = value['cache_hits']
+        instance._cache_misses = value['cache_misses']
+        return instance
+
+    def to_dict(self) -> Dict:
+        result = {} # type: Dict[str, object]
+        result['makefile'] = self._makefile
+        result['phase'] = self._phase
+        result['make_time'] = self._make_time
+        result['output_bytes'] = self._output_bytes
+        result['output_lines'] = self._output_lines
+        result['dropped_lines'] = dict(self._dropped_lines)
+        result['kept_lines'] = self._kept_lines
+        result['targets'] = self._targets
+        result['cache_hits'] = self._cache_hits
+        result['cache_misses'] = self._cache_misses
+        return result
+
+    @property
+    def makefile(self) -> str:
+        return self._makefile
+
+    @property
+    def phase(self) -> str:
+        return self._phase
+
+    @property
+    def make_time(self) -> float:
+        """
+        Seconds from the start of `make -np` until the parse of its
+        output is done, less the time spent counting lines.
+        """
+        return self._make_time
+
+    @make_time.setter
+    def make_time(self, value: float) -> None:
+        self._make_time = value
+
+    @property
+    def output_bytes(self) -> int:
+        return self._output_bytes
+
+    @output_bytes.setter
+    def output_bytes(self, value: int) -> None:
+        self._output_bytes = value
+
+    @property
+    def output_lines(self) -> int:
+        return self._output_lines
+
+    @output_lines.setter
+    def output_lines(self, value: int) -> None:
+        self._output_lines = value
+
+    @property
+    def dropped_lines(self) -> Dict[str, int]:
+        return dict(self._dropped_lines)
+
+    def add_dropped_lines(self, filter_name: str, count: int) -> None:
+        self._dropped_lines[filter_name] = self._dropped_lines[filter_name] + count
+
+    @property
+    def kept_lines(self) -> int:
+        return self._kept_lines
+
+    @kept_lines.setter
+    def kept_lines(self, value: int) -> None:
+        self._kept_lines = value
+
+    @property
+    def targets(self) -> int:
+        return self._targets
+
+    @targets.setter
+    def targets(self, value: int) -> None:
+        self._targets = value
+
+    @property
+    def cache_hits(self) -> int:
+        return self._cache_hits
+
+    @cache_hits.setter
+    def cache_hits(self, value: int) -> None:
+        self._cache_hits = value
+
+    @property
+    def cache_misses(self) -> int:
+        return self._cache_misses
+
+    @cache_misses.setter
+    def cache_misses(self, value: int) -> None:
+        self._cache_misses = value
+
+    def add(self, other: 'MakefileStatistics') -> None:
+        self._make_time = self._make_time + other._make_time
+        self._output_bytes = self._output_bytes + other._output_bytes
+        self._output_lines = self._output_lines + other._output_lines
+        for name in MakefileStatistics.FILTER_NAMES:
+            self._dropped_lines[name] = self._dropped_lines[name] + other._dropped_lines.get(name, 0)
+        self._kept_lines = self._kept_lines + other._kept_lines
+        self._targets = self._targets + other._targets
+        self._cache_hits = self._cache_hits + other._cache_hits
+        self._cache_misses = self._cache_misses + other._cache_misses
+
+
+class DatabaseStatisticsReader:
+    """
+    Passes the `make -np` output read from a file through, and counts
+    its bytes and lines, and the lines that each filter of
+    autorecurse.gnumake.grammar.filter keeps and drops.
+
+    The parse pipeline skips most lines without looking at them, and
+    stops reading at the end of the target definitions. Here every line
+    is run through the separate filters, and drain() reads the rest of
+    the output, so the counts cover the whole database. The time spent
+    counting is kept in counting_time, so that it can be left out of
+    MakefileStatistics.make_time.
+    """
+
+    _NEWLINE = b'\n'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._file = None # type: BufferedIOBase
+        self._statistics = None # type: MakefileStatistics
+        self._encoding = None # type: str
+        self._filters = None # type: List[Tuple[str, Condition[Line]]]
+        self._remainder = None # type: bytes
+        self._counting_time = None # type: float
+
+    @staticmethod
+    def make(file: BufferedIOBase, statistics: MakefileStatistics, encoding: str = 'utf-8') -> 'DatabaseStatisticsReader':
+        instance = DatabaseStatisticsReader()
+        instance._file = file
+        instance._statistics = statistics
+        instance._encoding = encoding
+        instance._filters = list(zip(MakefileStatistics.FILTER_NAMES, [DatabaseSectionFilter.make(), FileSectionFilter.make(), InformationalCommentFilter.make()]))
+        instance._remainder = b''
+        instance._counting_time = 0.0
+        return instance
+
+    @property
+    def counting_time(self) -> float:
+        """
+        Seconds spent counting the lines read so far.
+        """
+        return self._counting_time
+
+    def read(self, size: int = -1) -> bytes:
+        block = self._file.read(size)
+        start = time.perf_counter()
+        if len(block) == 0:
+            self._count_remainder()
+        else:
+            self._count(block)
+        self._counting_time = self._counting_time + (time.perf_counter() - start)
+        return block
+
+    def drain(self) -> None:
+        while len(self.read(65536)) != 0:
+            pass
+
+    def close(self) -> None:
+        self._file.close()
+
+    def _count(self, block: bytes) -> None:
+        self._statistics.output_bytes = self._statistics.output_bytes + len(block)
+        lines = (self._remainder + block).split(DatabaseStatisticsReader._NEWLINE)
+        self._remainder = lines.pop()
+        for line in lines:
+            self._count_line(line)
+
+    def _count_remainder(self) -> None:
+        if len(self._remainder) != 0:
+            self._count_line(self._remainder)
+            self._remainder = b''
+
+    def _count_line(self, content: bytes) -> None:
+        statistics = self._statistics
+        statistics.output_lines = statistics.output_lines + 1
+        line = Line.make_stripped_with_line_number(content.decode(self._encoding, errors='replace').rstrip('\r'), statistics.output_lines)
+        for name, condition in self._filters:
+            condition.current_item = line
+            if not condition.condition:
+                statistics.add_dropped_lines(name, 1)
+                return
+        statistics.kept_lines = statistics.kept_lines + 1
+
+
+class TargetCountingIterator(Iterator[Target]):
+    """
+    Passes the targets of a parse pipeline through, and counts them.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._source = None # type: Iterator[Target]
+        self._statistics = None # type: MakefileStatistics
+
+    @staticmethod
+    def make(source: Iterator[Target], statistics: MakefileStatistics) -> Iterator[Target]:
+        instance = TargetCountingIterator()
+        instance._source = source
+        instance._statistics = statistics
+        return instance
+
+    @property
+    def current_item(self) -> Target:
+        return self._source.current_item
+
+    @property
+    def has_current_item(self) -> bool:
+        return self._source.has_current_item
+
+    @property
+    def is_at_start(self) -> bool:
+        return self._source.is_at_start
+
+    @property
+    def is_at_end(self) -> bool:
+        return self._source.is_at_end
+
+    def move_to_next(self) -> None:
+        self._source.move_to_next()
+        if self._source.has_current_item:
+            self._statistics.targets = self._statistics.targets + 1
+
+
+class StatisticsRecorder:
+    """
+    Collects MakefileStatistics.
+
+    The process started with `--stats` passes a file to the
+    `autorecurse` commands run by make through the AUTORECURSE_STATS
+    environment variable. Each process appends its statistics to that
+    file, one JSON object per line, when it closes its recorder. A
+    recorder made without a file keeps its statistics in memory.
+
+    A disabled recorder records nothing.
+    """
+
+    ENVIRONMENT_VARIABLE = 'AUTORECURSE_STATS'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._is_enabled = None # type: bool
+        self._file_path = None # type: str
+        self._statistics = None # type: List[MakefileStatistics]
+
+    @staticmethod
+    def make_disabled() -> 'StatisticsRecorder':
+        instance = StatisticsRecorder()
+        instance._is_enabled = False
+        instance._file_path = None
+        instance._statistics = []
+        return instance
+
+    @staticmethod
+    def make(file_path: str = None) -> 'StatisticsRecorder':
+        instance = StatisticsRecorder()
+        instance._is_enabled = True
+        instance._file_path = file_path
+        instance._statistics = []
+        return instance
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._is_enabled
+
+    @property
+    def statistics(self) -> List[MakefileStatistics]:
+        return list(self._statistics)
+
+    def record(self, statistics: MakefileStatistics) -> None:
+        if self._is_enabled:
+            self._statistics.append(statistics)
+
+    def record_cache_lookup(self, makefile: str, is_hit: bool) -> None:
+        if self._is_enabled:
+            statistics = MakefileStatistics.make(makefile, 'shared cache')
+            if is_hit:
+                statistics.cache_hits = 1
+            else:
+                statistics.cache_misses = 1
+            self._statistics.append(statistics)
+
+    def close(self) -> None:
+        """
+        Appends the recorded statistics to the file of the recorder, if
+        it has one.
+        """
+        if (self._file_path is None) or (len(self._statistics) == 0):
+            return
+        text = ''.join([json.dumps(statistics.to_dict()) + '\n' for statistics in self._statistics])
+        self._statistics = []
+        fd = os.open(self._file_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o666)
+        try:
+            os.write(fd, text.encode('utf-8'))
+        finally:
+            os.close(fd)
+
+    @staticmethod
+    def read_file(file_path: str) -> List[MakefileStatistics]:
+        result = []
+        with open(file_path, mode='r', encoding='utf-8') as file:
+            for line in file:
+                if len(line.strip()) != 0:
+                    result.append(MakefileStatistics.make_from_dict(json.loads(line)))
+        return result
+
+
+class DefaultStatisticsRecorder:
+
+    _INSTANCE = None
+
+    @staticmethod
+    def make() -> StatisticsRecorder:
+        if DefaultStatisticsRecorder._INSTANCE is None:
+            DefaultStatisticsRecorder._INSTANCE = StatisticsRecorder.make_disabled()
+        return DefaultStatisticsRecorder._INSTANCE
+
+    @staticmethod
+    def set(recorder: StatisticsRecorder) -> None:
+        DefaultStatisticsRecorder._INSTANCE = recorder
+
+
+class StatisticsReportFormatEnum:
+
+    JSON = 'json'
+    TABLE = 'table'
+
+
+class StatisticsReport:
+    """
+    Sums MakefileStatistics per makefile, over all phases, and in
+    total. Makefiles are listed by decreasing `make -np` time.
+    """
+
+    _TABLE_COLUMNS = [
+        ('make -np s', 'make_time'),
+        ('bytes', 'output_bytes'),
+        ('lines', 'output_lines'),
+        ('db drop', 'DatabaseSectionFilter'),
+        ('file drop', 'FileSectionFilter'),
+        ('info drop', 'InformationalCommentFilter'),
+        ('kept', 'kept_lines'),
+        ('targets', 'targets'),
+        ('hits', 'cache_hits'),
+        ('misses', 'cache_misses'),
+    ]
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._makefiles = None # type: List[MakefileStatistics]
+        self._total = None # type: MakefileStatistics
+
+    @staticmethod
+    def make(statistics: List[MakefileStatistics]) -> 'StatisticsReport':
+        instance = StatisticsReport()
+        makefiles = {} # type: Dict[str, MakefileStatistics]
+        instance._total = MakefileStatistics.make(None, None)
+        for item in statistics:
+            if item.makefile not in makefiles:
+                makefiles[item.makefile] = MakefileStatistics.make(item.makefile, None)
+            makefiles[item.makefile].add(item)
+            instance._total.add(item)
+        instance._makefiles = sorted(makefiles.values(), key=lambda item: (-item.make_time, item.makefile))
+        return instance
+
+    @property
+    def makefiles(self) -> List[MakefileStatistics]:
+        return list(self._makefiles)
+
+    @property
+    def total(self) -> MakefileStatistics:
+        return self._total
+
+    def print(self, format: str, file: TextIOBase) -> None:
+        if format == StatisticsReportFormatEnum.JSON:
+            self.print_json(file)
+        else:
+            self.print_table(file)
+
+    def print_json(self, file: TextIOBase) -> None:
+        makefiles = []
+        for item in self._makefiles:
+            value = item.to_dict()
+            del value['phase']
+            makefiles.append(value)
+        total = self._total.to_dict()
+        del total['makefile']
+        del total['phase']
+        json.dump({'makefiles': makefiles, 'total': total}, file, indent=2)
+        file.write('\n')
+
+    def print_table(self, file: TextIOBase) -> None:
+        rows = [[heading for heading, key in StatisticsReport._TABLE_COLUMNS] + ['makefile']]
+        for item in self._makefiles:
+            rows.append(self._table_row(item) + [item.makefile])
+        rows.append(self._table_row(self._total) + ['(total)'])
+        widths = [max(len(row[index]) for row in rows) for index in range(len(StatisticsReport._TABLE_COLUMNS))]
+        for row in rows:
+            cells = [cell.rjust(width) for cell, width in zip(row, widths)]
+            cells.append(row[-1])
+            file.write('  '.join(cells))
+            file.write('\n')
+
+    def _table_row(self, item: MakefileStatistics) -> List[str]:
+        row = []
+        for heading, key in StatisticsReport._TABLE_COLUMNS:
+            if key == 'make_time':
+                row.append('{0:.3f}'.format(item.make_time))
+            elif key in item.dropped_lines:
+                row.append(str(item.dropped_lines[key]))
+            else:
+                row.append(str(getattr(item, key)))
+        return row
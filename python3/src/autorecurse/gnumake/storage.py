@@ -1,7 +1,8 @@
 from autorecurse.common.storage import DirectoryMapping
-from autorecurse.lib.file import FileLifetimeManager, UniqueFileCreator
+from autorecurse.lib.file import FileLifetimeManager, SingleFlightLock, UniqueFileCreator
 from autorecurse.gnumake.data import Makefile
 from abc import ABCMeta, abstractmethod
+from typing import List
 import hashlib
 import os
 
@@ -9,7 +10,27 @@ import os
 class StorageEngine(metaclass=ABCMeta):
 
     @abstractmethod
-    def create_nested_update_file(self) -> FileLifetimeManager:
+    def create_goal_rule_file(self) -> FileLifetimeManager:
+        pass
+
+    @abstractmethod
+    def create_database_spool_file(self) -> FileLifetimeManager:
+        pass
+
+    @abstractmethod
+    def nested_update_file_path(self, execution_directory: str) -> str:
+        pass
+
+    @abstractmethod
+    def lock_nested_update_file(self, execution_directory: str) -> SingleFlightLock:
+        pass
+
+    @abstractmethod
+    def create_fork_server_socket_path(self) -> str:
+        pass
+
+    @abstractmethod
+    def create_statistics_file(self) -> FileLifetimeManager:
         pass
 
     @abstractmethod
@@ -20,6 +41,10 @@ class StorageEngine(metaclass=ABCMeta):
     def create_target_listing_file(self, makefile: Makefile) -> None:
         pass
 
+    @abstractmethod
+    def lock_target_listing_file(self, makefile: Makefile) -> SingleFlightLock:
+        pass
+
     @abstractmethod
     def nested_rule_file_path(self, execution_directory: str) -> str:
         pass
@@ -28,6 +53,39 @@ class StorageEngine(metaclass=ABCMeta):
     def create_nested_rule_file(self, execution_directory: str) -> None:
         pass
 
+    @abstractmethod
+    def lock_nested_rule_file(self, execution_directory: str, source_paths: List[str]) -> SingleFlightLock:
+        pass
+
+    @abstractmethod
+    def dump_flags_check_file_path(self, makefile: Makefile) -> str:
+        pass
+
+    @abstractmethod
+    def create_dump_flags_check_directory(self) -> None:
+        pass
+
+    @abstractmethod
+    def dfa_cache_file_path(self, cache_key: str) -> str:
+        pass
+
+    @abstractmethod
+    def create_dfa_cache_directory(self) -> None:
+        pass
+
+    @property
+    @abstractmethod
+    def is_shared_cache_enabled(self) -> bool:
+        pass
+
+    @abstractmethod
+    def shared_cache_file_path(self, cache_key: str) -> str:
+        pass
+
+    @abstractmethod
+    def create_shared_cache_directory(self) -> None:
+        pass
+
 class FileStorageEngine(StorageEngine):
 
     def __init__(self) -> None:
@@ -40,14 +98,52 @@ class FileStorageEngine(StorageEngine):
         instance._directory_mapping = directory_mapping
         return instance
 
-    def create_nested_update_file(self) -> FileLifetimeManager:
+    def create_goal_rule_file(self) -> FileLifetimeManager:
         file_creator = UniqueFileCreator.make()
-        file_creator.file_name_prefix = 'nested-update.'
+        file_creator.file_name_prefix = 'goal-rules.'
         file_creator.file_name_suffix = '.makefile'
         file_creator.directory = self._directory_mapping.get_directory(DirectoryEnum.TMP)
         self._directory_mapping.make_directory(DirectoryEnum.TMP)
         return FileLifetimeManager.make(file_creator)
 
+    def create_database_spool_file(self) -> FileLifetimeManager:
+        file_creator = UniqueFileCreator.make()
+        file_creator.file_name_prefix = 'database.'
+        file_creator.file_name_suffix = '.txt'
+        file_creator.directory = self._directory_mapping.get_directory(DirectoryEnum.TMP)
+        self._directory_mapping.make_directory(DirectoryEnum.TMP)
+        return FileLifetimeManager.make(file_creator)
+
+    def create_statistics_file(self) -> FileLifetimeManager:
+        file_creator = UniqueFileCreator.make()
+        file_creator.file_name_prefix = 'stats.'
+        file_creator.file_name_suffix = '.jsonl'
+        file_creator.directory = self._directory_mapping.get_directory(DirectoryEnum.TMP)
+        self._directory_mapping.make_directory(DirectoryEnum.TMP)
+        return FileLifetimeManager.make(file_creator)
+
+    def create_fork_server_socket_path(self) -> str:
+        filename = ''.join(['fork-server.', str(os.getpid()), '.socket'])
+        directory = self._directory_mapping.get_directory(DirectoryEnum.TMP)
+        self._directory_mapping.make_directory(DirectoryEnum.TMP)
+        return os.path.join(directory, filename)
+
+    def nested_update_file_path(self, execution_directory: str) -> str:
+        """
+        ## Notes
+
+        - For application-wide consistency, the passed execution
+          directory must be a canonical absolute path (as returned by
+          os.path.realpath).
+        """
+        filename = ''.join(['nested-update.', self._make_hash(execution_directory), '.makefile'])
+        directory = self._directory_mapping.get_directory(DirectoryEnum.NESTED_RULE)
+        return os.path.join(directory, filename)
+
+    def lock_nested_update_file(self, execution_directory: str) -> SingleFlightLock:
+        self._directory_mapping.make_directory(DirectoryEnum.NESTED_RULE)
+        return SingleFlightLock.make(self.nested_update_file_path(execution_directory))
+
     def target_listing_file_path(self, makefile: Makefile) -> str:
         """
         ## Notes
@@ -66,6 +162,10 @@ class FileStorageEngine(StorageEngine):
             with open(path, mode='a') as file:
                 pass
 
+    def lock_target_listing_file(self, makefile: Makefile) -> SingleFlightLock:
+        self._directory_mapping.make_directory(DirectoryEnum.TARGET_LISTING)
+        return SingleFlightLock.make(self.target_listing_file_path(makefile), [makefile.path])
+
     def nested_rule_file_path(self, execution_directory: str) -> str:
         """
         ## Notes
@@ -90,10 +190,55 @@ class FileStorageEngine(StorageEngine):
             with open(path, mode='a') as file:
                 pass
 
+    def lock_nested_rule_file(self, execution_directory: str, source_paths: List[str]) -> SingleFlightLock:
+        """
+        The nested rule file is reused from a concurrent update only if
+        that update read the same versions of source_paths, the nested
+        makefiles and their target listing files.
+        """
+        self._directory_mapping.make_directory(DirectoryEnum.NESTED_RULE)
+        return SingleFlightLock.make(self.nested_rule_file_path(execution_directory), source_paths)
+
+    def dump_flags_check_file_path(self, makefile: Makefile) -> str:
+        """
+        ## Notes
+
+        - For application-wide consistency, makefile.exec_path must use
+          canonical absolute paths (as returned by os.path.realpath).
+        """
+        filename = ''.join(['dump-flags-check.', self._make_hash(makefile.path), '.json'])
+        directory = self._directory_mapping.get_directory(DirectoryEnum.TARGET_LISTING)
+        return os.path.join(directory, filename)
+
+    def create_dump_flags_check_directory(self) -> None:
+        self._directory_mapping.make_directory(DirectoryEnum.TARGET_LISTING)
+
+    def dfa_cache_file_path(self, cache_key: str) -> str:
+        filename = ''.join(['dfa-cache.', cache_key, '.pickle'])
+        directory = self._directory_mapping.get_directory(DirectoryEnum.DFA_CACHE)
+        return os.path.join(directory, filename)
+
+    def create_dfa_cache_directory(self) -> None:
+        self._directory_mapping.make_directory(DirectoryEnum.DFA_CACHE)
+
+    @property
+    def is_shared_cache_enabled(self) -> bool:
+        return self._directory_mapping.has_directory(DirectoryEnum.SHARED_CACHE)
+
+    def shared_cache_file_path(self, cache_key: str) -> str:
+        filename = ''.join(['targets.', cache_key, '.json'])
+        directory = self._directory_mapping.get_directory(DirectoryEnum.SHARED_CACHE)
+        return os.path.join(directory, filename)
+
+    def create_shared_cache_directory(self) -> None:
+        self._directory_mapping.make_directory(DirectoryEnum.SHARED_CACHE)
+
 
 class DirectoryEnum:
 
+    DFA_CACHE = 'dfa cache'
     NESTED_RULE = 'nested rule'
+    SHARED_CACHE = 'shared cache'
     TARGET_LISTING = 'target listing'
     TMP = 'tmp'
 
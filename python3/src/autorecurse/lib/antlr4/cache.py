@@ -0,0 +1,139 @@
+from antlr4.PredictionContext import PredictionContext
+from antlr4.atn.ATNState import ATNState
+from antlr4.atn.LexerAction import LexerMoreAction, LexerPopModeAction, LexerSkipAction
+from antlr4.atn.SemanticContext import SemanticContext
+from io import BufferedIOBase
+from typing import List, Tuple
+import hashlib
+import pickle
+import pkg_resources
+import sys
+
+
+class DfaSnapshot:
+    """
+    Saves and restores the DFA states that the generated recognizer
+    classes build up while they run.
+
+    Each generated recognizer class keeps its ATN in the `atn` class
+    attribute, and the DFA of each ATN decision in the `decisionsToDFA`
+    class attribute. The DFAs start empty in each process, and are
+    filled in as the recognizers see input. A snapshot stores the DFAs
+    without the ATNs: references to ATN states are stored as state
+    numbers, and resolved against the ATNs of the running process when
+    the snapshot is loaded.
+
+    A snapshot is only valid for the same grammars, ANTLR runtime and
+    Python version. The cache_key property identifies this combination.
+
+    Loading a snapshot only creates instances of the ANTLR runtime
+    classes in ALLOWED_CLASSES, so a crafted snapshot file cannot run
+    code the way an arbitrary pickle can.
+    """
+
+    FORMAT_VERSION = 1
+
+    # Classes of the objects that a DFA refers to, other than ATN states
+    # and the singletons of _singletons(), which are stored by reference.
+    ALLOWED_CLASSES = {
+            'antlr4.dfa.DFA': {'DFA'},
+            'antlr4.dfa.DFAState': {'DFAState', 'PredPrediction'},
+            'antlr4.atn.ATNConfig': {'ATNConfig', 'LexerATNConfig'},
+            'antlr4.atn.ATNConfigSet': {'ATNConfigSet', 'OrderedATNConfigSet'},
+            'antlr4.PredictionContext': {'ArrayPredictionContext', 'SingletonPredictionContext'},
+            'antlr4.atn.SemanticContext': {'AND', 'OR', 'PrecedencePredicate', 'Predicate'},
+            'antlr4.atn.LexerAction': {'LexerActionType', 'LexerChannelAction', 'LexerCustomAction', 'LexerIndexedCustomAction', 'LexerModeAction', 'LexerPushModeAction', 'LexerTypeAction'},
+            'antlr4.atn.LexerActionExecutor': {'LexerActionExecutor'}
+            }
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._recognizer_classes = None # type: List[type]
+
+    @staticmethod
+    def make(recognizer_classes: List[type]) -> 'DfaSnapshot':
+        instance = DfaSnapshot()
+        instance._recognizer_classes = list(recognizer_classes)
+        return instance
+
+    @property
+    def cache_key(self) -> str:
+        hash = hashlib.sha1()
+        hash.update(str(DfaSnapshot.FORMAT_VERSION).encode())
+        hash.update(pkg_resources.get_distribution('antlr4-python3-runtime').version.encode())
+        hash.update('{0}.{1}'.format(*sys.version_info).encode())
+        for recognizer_class in self._recognizer_classes:
+            hash.update(recognizer_class.__name__.encode())
+            hash.update(sys.modules[recognizer_class.__module__].serializedATN().encode())
+        return hash.hexdigest()
+
+    @property
+    def state_count(self) -> int:
+        result = 0
+        for recognizer_class in self._recognizer_classes:
+            for dfa in recognizer_class.decisionsToDFA:
+                result = result + len(dfa._states)
+        return result
+
+    def save(self, file: BufferedIOBase) -> None:
+        pickler = DfaSnapshot.Pickler(file, self._recognizer_classes)
+        pickler.dump([recognizer_class.decisionsToDFA for recognizer_class in self._recognizer_classes])
+
+    def load(self, file: BufferedIOBase) -> None:
+        """
+        Replaces the DFAs of the recognizer classes with the ones stored
+        in file. Raises an exception, and leaves the DFAs untouched, if
+        file does not hold a matching snapshot.
+
+        Recognizers created before the call also see the loaded DFAs,
+        since the `decisionsToDFA` lists are updated in place.
+        """
+        unpickler = DfaSnapshot.Unpickler(file, self._recognizer_classes)
+        dfa_lists = unpickler.load()
+        if len(dfa_lists) != len(self._recognizer_classes):
+            raise Exception('DFA snapshot does not match the recognizer classes.')
+        for recognizer_class, dfa_list in zip(self._recognizer_classes, dfa_lists):
+            if len(dfa_list) != len(recognizer_class.decisionsToDFA):
+                raise Exception('DFA snapshot does not match the decisions of {0}.'.format(recognizer_class.__name__))
+        for recognizer_class, dfa_list in zip(self._recognizer_classes, dfa_lists):
+            recognizer_class.decisionsToDFA[:] = dfa_list
+
+    @staticmethod
+    def _singletons() -> List[object]:
+        # Identity comparisons against these objects are made throughout
+        # the runtime, so they must not be duplicated by unpickling.
+        return [PredictionContext.EMPTY, SemanticContext.NONE, LexerMoreAction.INSTANCE, LexerPopModeAction.INSTANCE, LexerSkipAction.INSTANCE]
+
+    class Pickler(pickle.Pickler):
+
+        def __init__(self, file: BufferedIOBase, recognizer_classes: List[type]) -> None:
+            super().__init__(file, pickle.HIGHEST_PROTOCOL)
+            self._atn_indexes = {id(recognizer_class.atn): index for index, recognizer_class in enumerate(recognizer_classes)}
+            self._singletons = DfaSnapshot._singletons()
+
+        def persistent_id(self, obj: object) -> Tuple:
+            if isinstance(obj, ATNState):
+                return ('state', self._atn_indexes[id(obj.atn)], obj.stateNumber)
+            for index, singleton in enumerate(self._singletons):
+                if obj is singleton:
+                    return ('singleton', index)
+            return None
+
+    class Unpickler(pickle.Unpickler):
+
+        def __init__(self, file: BufferedIOBase, recognizer_classes: List[type]) -> None:
+            super().__init__(file)
+            self._atns = [recognizer_class.atn for recognizer_class in recognizer_classes]
+            self._singletons = DfaSnapshot._singletons()
+
+        def persistent_load(self, pid: Tuple) -> object:
+            if pid[0] == 'state':
+                return self._atns[pid[1]].states[pid[2]]
+            if pid[0] == 'singleton':
+                return self._singletons[pid[1]]
+            raise pickle.UnpicklingError('Unknown persistent ID in DFA snapshot.')
+
+        def find_class(self, module: str, name: str) -> type:
+            if name not in DfaSnapshot.ALLOWED_CLASSES.get(module, ()):
+                raise pickle.UnpicklingError('Class {0}.{1} is not allowed in a DFA snapshot.'.format(module, name))
+            return super().find_class(module, name)
@@ -2,11 +2,49 @@ from antlr4 import BailErrorStrategy, DiagnosticErrorListener, InputStream, Lexe
 from antlr4.BufferedTokenStream import TokenStream
 from antlr4.CommonTokenFactory import CommonTokenFactory
 from antlr4.Token import CommonToken
-from typing import cast
+from abc import ABCMeta, abstractmethod
+from typing import cast, Tuple
 import autorecurse.lib.antlr4.abstract as abstract
 
 
+class SlottedToken:
+    """
+    A token with the same attributes as CommonToken, kept in slots
+    instead of an instance dictionary.
+    """
+
+    __slots__ = ('source', 'type', 'channel', 'start', 'stop', 'tokenIndex', 'line', 'column', 'text')
+
+    def __init__(self, source: Tuple, type: int, channel: int, start: int, stop: int, line: int, column: int, text: str) -> None:
+        self.source = source
+        self.type = type
+        self.channel = channel
+        self.start = start
+        self.stop = stop
+        self.tokenIndex = -1
+        self.line = line
+        self.column = column
+        self.text = text
+
+    def getTokenSource(self):
+        return self.source[0]
+
+    def getInputStream(self):
+        return self.source[1]
+
+    def clone(self) -> 'SlottedToken':
+        token = SlottedToken(self.source, self.type, self.channel, self.start, self.stop, self.line, self.column, self.text)
+        token.tokenIndex = self.tokenIndex
+        return token
+
+    __str__ = CommonToken.__str__
+
+
 class CustomTokenFactory(CommonTokenFactory):
+    """
+    Creates SlottedToken instances whose text is copied out of the input
+    stream when they are created.
+    """
 
     _INSTANCE = None
 
@@ -19,11 +57,13 @@ class CustomTokenFactory(CommonTokenFactory):
     def __init__(self):
         super().__init__(True)
 
-    def create(self, source, type: int, text: str, channel: int, start: int, stop: int, line: int, column: int) -> CommonToken:
-        token = super().create(source, type, text, channel, start, stop, line, column)
-        if (token.type == Token.EOF) and (token._text == ''):
-            token.text = '<EOF>'
-        return token
+    def create(self, source, type: int, text: str, channel: int, start: int, stop: int, line: int, column: int) -> SlottedToken:
+        if (text is None) and (source[1] is not None):
+            text = source[1].getText(start, stop)
+        return SlottedToken(source, type, channel, start, stop, line, column, text)
+
+    def createThin(self, type: int, text: str) -> SlottedToken:
+        return SlottedToken(CommonToken.EMPTY_SOURCE, type, Token.DEFAULT_CHANNEL, -1, -1, None, -1, text)
 
 
 class CustomLexer(Lexer, abstract.TokenSource):
@@ -33,15 +73,52 @@ class CustomLexer(Lexer, abstract.TokenSource):
         self.addErrorListener(DiagnosticErrorListener())
         self._factory = CustomTokenFactory.make()
 
+    def emitEOF(self) -> Token:
+        eof = super().emitEOF()
+        eof.text = '<EOF>'
+        return eof
+
     def recover(self, ex: RecognitionException) -> None:
         raise ex
 
 
+class TokenListener(metaclass=ABCMeta):
+    """
+    Receives each token that a CustomParser consumes, together with the
+    index of the rule that consumes it.
+    """
+
+    @abstractmethod
+    def visit_token(self, rule_index: int, token: Token) -> None:
+        pass
+
+
 class CustomParser(Parser):
 
     def __init__(self, input: abstract.TokenStream) -> None:
         super().__init__(cast(TokenStream, input))
         self.addErrorListener(DiagnosticErrorListener())
         self._errHandler = BailErrorStrategy()
+        self._token_listener = None # type: TokenListener
 
+    @property
+    def token_listener(self) -> TokenListener:
+        """
+        Unlike a parse listener, a token listener does not make the
+        parser add a terminal node to the parse tree for each token, so
+        it also works with buildParseTrees set to False.
+        """
+        return self._token_listener
 
+    @token_listener.setter
+    def token_listener(self, value: TokenListener) -> None:
+        self._token_listener = value
+
+    def consume(self) -> Token:
+        if self._token_listener is None:
+            return super().consume()
+        token = self.getCurrentToken()
+        if token.type != Token.EOF:
+            self.getInputStream().consume()
+        self._token_listener.visit_token(self._ctx.getRuleIndex(), token)
+        return token
@@ -1,10 +1,12 @@
 from abc import abstractmethod
-from io import StringIO, TextIOBase
+from bisect import bisect_right
 from antlr4.Token import Token
 from autorecurse.lib.iterator import Iterator
-from autorecurse.lib.fifo import ArrayedFifo, Fifo, FifoGlobalIndexWrapper, FifoManager, ManagedFifo
+from autorecurse.lib.line import Line
+from autorecurse.lib.fifo import GlobalIndexFifoManager
 from autorecurse.lib.antlr4.abstract import IntStream, CharStream, TokenStream, TokenSource
-from typing import cast, TypeVar
+from typing import Dict, Iterable, List, TypeVar
+import typing
 
 
 T = TypeVar('T')
@@ -115,17 +117,13 @@ class IteratorToIntStreamAdapter(Iterator[T], IntStream):
 
     def __init__(self) -> None:
         super().__init__()
-        self._inner_buffer = None # type: Fifo
-        self._buffer_global = None # type: FifoGlobalIndexWrapper
-        self._buffer = None # type: ManagedFifo
+        self._buffer = None # type: GlobalIndexFifoManager
         self._iterator = None # type: Iterator[T]
         self._source_name = None # type: str
 
     @staticmethod
     def _setup(instance: 'IteratorToIntStreamAdapter', iterator: Iterator[T]):
-        instance._inner_buffer = ArrayedFifo.make()
-        instance._buffer_global = FifoGlobalIndexWrapper.make(instance._inner_buffer)
-        instance._buffer = FifoManager.make(instance._buffer_global)
+        instance._buffer = GlobalIndexFifoManager.make()
         instance._iterator = iterator
         IteratorToIntStreamAdapter._initialize_buffer(instance)
 
@@ -142,11 +140,11 @@ class IteratorToIntStreamAdapter(Iterator[T], IntStream):
 
     @property
     def current_item(self) -> T:
-        return self._inner_buffer.current_item # (optimized)
+        return self._buffer.current_item
 
     @property
     def has_current_item(self) -> bool:
-        return self._inner_buffer.has_current_item # (optimized)
+        return self._buffer.has_current_item
 
     @property
     def is_at_start(self) -> bool:
@@ -198,14 +196,14 @@ class IteratorToIntStreamAdapter(Iterator[T], IntStream):
     @property
     def index(self) -> int:
         if self._is_I: # State I
-            return self._buffer_global.current_global_index
+            return self._buffer.current_global_index
         else: # State E or EE
             return self.size
 
     @property
     def size(self) -> int:
         # State I, E, or EE
-        return self._buffer_global.global_count
+        return self._buffer.global_count
 
     def getSourceName(self) -> str:
         if self._source_name is not None:
@@ -244,23 +242,12 @@ class IteratorToIntStreamAdapter(Iterator[T], IntStream):
         self._buffer.collect_garbage()
 
     def LA(self, offset: int) -> int:
+        # State I, E, or EE
         index = self._offset_to_index(offset)
-        result = None
-        if self._is_I: # State I
-            ref_token = self._buffer.new_strong_reference()
-            try:
-                original_index = self.index
-                self.seek(index)
-                result = self._LA_result
-                self.seek(original_index)
-            finally:
-                self._buffer.release_strong_reference(ref_token)
-        else: # State E or EE
-            original_index = self.index
-            self.seek(index)
-            result = self._LA_result
-            self.seek(original_index)
-        return result
+        if self._load_to_index(index):
+            return self._item_to_int(self._buffer.item_at_global_index(index))
+        else:
+            return IntStream.EOF
 
     def _offset_to_index(self, offset: int) -> int:
         result = self.index + offset
@@ -268,12 +255,30 @@ class IteratorToIntStreamAdapter(Iterator[T], IntStream):
             result = result - 1
         return result
 
-    @property
-    def _LA_result(self) -> int:
-        if self._is_I: # State I
-            return self._item_to_int(self.current_item)
-        else: # State E or EE
-            return IntStream.EOF
+    def _load_to_index(self, index: int) -> bool:
+        """
+        Loads items from the source iterator until index is in
+        self._buffer, without moving the cursor. Returns False if index
+        is beyond end of stream.
+
+        ## Specification Domain
+
+        - 0 <= index (otherwise throws)
+        - index is in self._buffer \/ index is beyond end of stream
+          (otherwise throws)
+        """
+        # State I, E, or EE
+        if index < 0:
+            raise Exception('Cannot seek to negative index.')
+        if index < self._buffer.lowest_global_index:
+            raise Exception('Cannot seek to released index.')
+        global_count = self._buffer.global_count
+        while global_count <= index:
+            self._load_one_item_from_iterator()
+            if global_count == self._buffer.global_count:
+                return False
+            global_count = self._buffer.global_count
+        return True
 
     @abstractmethod
     def _item_to_int(self, item: T) -> int:
@@ -300,7 +305,7 @@ class IteratorToIntStreamAdapter(Iterator[T], IntStream):
             else:
                 if self._index_is_in_buffer(index):
                     # I -> I
-                    self._buffer_global.move_to_global_index(index)
+                    self._buffer.move_to_global_index(index)
                 else:
                     raise Exception('Cannot seek to released index.')
         elif self._is_E: # State E
@@ -311,7 +316,7 @@ class IteratorToIntStreamAdapter(Iterator[T], IntStream):
             else:
                 if self._index_is_in_buffer(index):
                     # E -> I
-                    self._buffer_global.move_to_global_index(index)
+                    self._buffer.move_to_global_index(index)
                 else:
                     raise Exception('Cannot seek to released index.')
         else: # State EE
@@ -329,7 +334,7 @@ class IteratorToIntStreamAdapter(Iterator[T], IntStream):
     @property
     def _lowest_index_in_buffer(self) -> int:
         # State I, E, or EE
-        return self._buffer_global.global_count - self._buffer.count
+        return self._buffer.lowest_global_index
 
     @property
     def _is_I(self) -> bool:
@@ -377,7 +382,10 @@ class IteratorToCharStreamAdapter(IteratorToIntStreamAdapter[str], CharStream):
     def LA(self, offset: int) -> int:
         # Optimization section
         if offset == 1:
-            return self._LA_result
+            if self._buffer.has_current_item: # State I
+                return ord(self._buffer.current_item)
+            else: # State E or EE
+                return IntStream.EOF
         # End optimization section
         return super().LA(offset)
 
@@ -387,34 +395,12 @@ class IteratorToCharStreamAdapter(IteratorToIntStreamAdapter[str], CharStream):
     def getText(self, start: int, stop: int) -> str:
         if (start > stop + 1):
             raise Exception('Cannot get text with start greater than stop plus 1.')
-        with StringIO() as strbuffer:
-            if self._is_I: # State I
-                length = stop - start + 1 # 0 <= length
-                ref_token = self._buffer.new_strong_reference()
-                try:
-                    original_index = self.index
-                    self.seek(start) # throws if start < 0 \/ start not in self._buffer
-                    self._write_text(cast(TextIOBase, strbuffer), length) # throws if stream size <= stop
-                    self.seek(original_index)
-                finally:
-                    self._buffer.release_strong_reference(ref_token)
-            else: # State E or EE
-                length = stop - start + 1 # 0 <= length
-                original_index = self.index
-                self.seek(start) # throws if start < 0 \/ start not in self._buffer
-                self._write_text(cast(TextIOBase, strbuffer), length) # throws if stream size <= stop
-                self.seek(original_index)
-            return cast(StringIO, strbuffer).getvalue()
-
-    def _write_text(self, buffer_: TextIOBase, length: int) -> None:
-        # State I or E
-        count = length
-        while self._is_I and (count != 0):
-            buffer_.write(self.current_item)
-            self.move_to_next()
-            count = count - 1
-        if count != 0:
+        self._load_to_index(start) # throws if start < 0 \/ start not in self._buffer
+        if start == stop + 1:
+            return ''
+        if not self._load_to_index(stop):
             raise Exception('Cannot get text past end of stream.')
+        return ''.join(self._buffer.items_at_global_range(start, stop + 1))
 
 
 class IteratorToTokenStreamAdapter(IteratorToIntStreamAdapter[Token], TokenStream):
@@ -516,9 +502,7 @@ class IteratorToTokenStreamAdapter(IteratorToIntStreamAdapter[Token], TokenStrea
           iterator.has_current_item True.
         - iterator.has_current_item is True.
         """
-        instance._inner_buffer = ArrayedFifo.make()
-        instance._buffer_global = FifoGlobalIndexWrapper.make(instance._inner_buffer)
-        instance._buffer = FifoManager.make(instance._buffer_global)
+        instance._buffer = GlobalIndexFifoManager.make()
         instance._iterator = iterator
         IteratorToTokenStreamAdapter._initialize_buffer(instance)
 
@@ -555,28 +539,10 @@ class IteratorToTokenStreamAdapter(IteratorToIntStreamAdapter[Token], TokenStrea
         return item.type
 
     def get(self, index: int) -> Token:
-        result = None
-        if self._is_I: # State I
-            ref_token = self._buffer.new_strong_reference()
-            try:
-                original_index = self.index
-                self.seek(index)
-                result = self._get_result
-                self.seek(original_index)
-            finally:
-                self._buffer.release_strong_reference(ref_token)
-        else: # State E or EE
-            original_index = self.index
-            self.seek(index)
-            result = self._get_result
-            self.seek(original_index)
-        return result
-
-    @property
-    def _get_result(self) -> Token:
-        if self._is_I: # State I
-            return self.current_item
-        else: # State E or EE
+        # State I, E, or EE
+        if self._load_to_index(index):
+            return self._buffer.item_at_global_index(index)
+        else:
             return self._eof_token
 
     def LT(self, offset: int) -> Token:
@@ -617,7 +583,8 @@ class IteratorToTokenStreamAdapter(IteratorToIntStreamAdapter[Token], TokenStrea
 
     @property
     def _eof_token(self) -> Token:
-        # State E or EE
+        # State I (self._iterator)
+        # self._iterator_is_at_eof_token == True
         return self._iterator.current_item
 
 
@@ -788,6 +755,355 @@ class TokenToCharIterator(Iterator[str]):
         self._text = None
 
 
-del T
+class SegmentCharStream(CharStream):
+    """
+    A CharStream over the concatenation of string segments produced by
+    _next_segment.
+
+    Segments are kept as a list of strings rather than being copied one
+    character at a time. Each segment is paired with the
+    global index of its first character, so the current character is
+    found by offset into the current segment, and any other retained
+    index is found by bisecting the segment start indexes.
+
+    Segments are loaded from the source on demand. A segment is
+    discarded once the previous index and every outstanding marker lie
+    beyond it.
+
+    ## Call Argument Validity
+
+    For each method listed, client is allowed to call the method with
+    the given parameters.
+
+    - LA(self, offset: int)
+      - offset != 0
+      - index for offset is not negative (otherwise throws)
+      - index for offset is retained (otherwise throws)
+    - seek(self, index: int)
+      - 0 <= index (otherwise throws)
+      - index is retained \/ index is beyond retained segments
+        (otherwise throws)
+    - getText(self, start: int, stop: int)
+      - start <= stop + 1 (otherwise throws)
+      - start is retained (otherwise throws)
+      - stop < size of stream (otherwise throws)
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._is_source_exhausted = None # type: bool
+        self._segments = None # type: List[str]
+        self._segment_starts = None # type: List[int]
+        self._segment_index = None # type: int
+        self._current_segment = None # type: str
+        self._offset = None # type: int
+        self._index = None # type: int
+        self._size = None # type: int
+        self._markers = None # type: Dict[int, int]
+        self._next_marker = None # type: int
+
+    @staticmethod
+    def _setup(instance: 'SegmentCharStream') -> None:
+        instance._is_source_exhausted = False
+        instance._segments = []
+        instance._segment_starts = []
+        instance._segment_index = 0
+        instance._current_segment = ''
+        instance._offset = 0
+        instance._index = 0
+        instance._size = 0
+        instance._markers = {}
+        instance._next_marker = 0
+
+    @abstractmethod
+    def _next_segment(self) -> str:
+        """
+        Returns the next segment, or None when there are no more
+        segments. Not called again after returning None.
+        """
+        pass
+
+    @property
+    def index(self) -> int:
+        return self._index
+
+    @property
+    def size(self) -> int:
+        return self._size
 
+    def LA(self, offset: int) -> int:
+        # Optimization section
+        if offset == 1:
+            if self._offset < len(self._current_segment):
+                return ord(self._current_segment[self._offset])
+            elif self._load_to_index(self._index):
+                self._current_segment = self._segments[self._segment_index]
+                return ord(self._current_segment[self._offset])
+            else:
+                return IntStream.EOF
+        # End optimization section
+        if offset > 0:
+            index = self._index + offset - 1
+        else:
+            index = self._index + offset
+        if index < 0:
+            raise Exception('Cannot look behind start of stream.')
+        if index < self._lowest_retained_index:
+            raise Exception('Cannot look at an index that has been released.')
+        if not self._load_to_index(index):
+            return IntStream.EOF
+        segment_index = self._segment_index_of(index)
+        return ord(self._segments[segment_index][index - self._segment_starts[segment_index]])
+
+    def consume(self) -> None:
+        if not (self._offset < len(self._current_segment)):
+            if self._load_to_index(self._index):
+                self._current_segment = self._segments[self._segment_index]
+            else:
+                raise Exception('Cannot consume EOF.')
+        self._index = self._index + 1
+        self._offset = self._offset + 1
+        if self._offset == len(self._current_segment):
+            self._segment_index = self._segment_index + 1
+            self._offset = 0
+            self._current_segment = ''
+            self._collect_segments()
 
+    def mark(self) -> int:
+        marker = self._next_marker
+        self._next_marker = self._next_marker + 1
+        self._markers[marker] = self._index
+        return marker
+
+    def release(self, marker: int) -> None:
+        self._markers.pop(marker, None)
+        self._collect_segments()
+
+    def seek(self, index: int) -> None:
+        if index < 0:
+            raise Exception('Cannot seek to negative index.')
+        if index < self._lowest_retained_index:
+            raise Exception('Cannot seek to an index that has been released.')
+        if self._load_to_index(index):
+            self._segment_index = self._segment_index_of(index)
+            self._offset = index - self._segment_starts[self._segment_index]
+            self._current_segment = self._segments[self._segment_index]
+            self._index = index
+        else:
+            self._segment_index = len(self._segments)
+            self._offset = 0
+            self._current_segment = ''
+            self._index = self._size
+        self._collect_segments()
+
+    def getText(self, start: int, stop: int) -> str:
+        if start > stop + 1:
+            raise Exception('Cannot get text with start greater than stop plus 1.')
+        if start < self._lowest_retained_index:
+            raise Exception('Cannot get text starting at an index that has been released.')
+        if start == stop + 1:
+            return ''
+        if not self._load_to_index(stop):
+            raise Exception('Cannot get text past end of stream.')
+        first = self._segment_index_of(start)
+        last = self._segment_index_of(stop)
+        start_offset = start - self._segment_starts[first]
+        stop_offset = stop - self._segment_starts[last] + 1
+        if first == last:
+            return self._segments[first][start_offset:stop_offset]
+        parts = [self._segments[first][start_offset:]]
+        parts.extend(self._segments[first + 1:last])
+        parts.append(self._segments[last][:stop_offset])
+        return ''.join(parts)
+
+    @property
+    def _lowest_retained_index(self) -> int:
+        if len(self._segment_starts) != 0:
+            return self._segment_starts[0]
+        else:
+            return self._size
+
+    def _segment_index_of(self, index: int) -> int:
+        # index is retained and loaded
+        return bisect_right(self._segment_starts, index) - 1
+
+    def _load_to_index(self, index: int) -> bool:
+        """
+        Loads segments until the character at index is loaded. Returns
+        False if the source ends first.
+        """
+        while not (index < self._size):
+            if not self._load_segment():
+                return False
+        return True
+
+    def _load_segment(self) -> bool:
+        while not self._is_source_exhausted:
+            text = self._next_segment()
+            if text is None:
+                self._is_source_exhausted = True
+            elif len(text) != 0:
+                self._push_segment(text)
+                return True
+        return False
+
+    def _push_segment(self, text: str) -> None:
+        self._segments.append(text)
+        self._segment_starts.append(self._size)
+        self._size = self._size + len(text)
+
+    def _collect_segments(self) -> None:
+        # The character before the current index stays retained for
+        # LA(-1).
+        lowest = self._index - 1
+        for index in self._markers.values():
+            if index < lowest:
+                lowest = index
+        count = 0
+        while (count < len(self._segments)) and (self._segment_starts[count] + len(self._segments[count]) <= lowest):
+            count = count + 1
+        if count != 0:
+            del self._segments[:count]
+            del self._segment_starts[:count]
+            self._segment_index = self._segment_index - count
+
+
+
+class TokenToCharStreamAdapter(SegmentCharStream):
+    """
+    Exposes the concatenated texts of a token source as a CharStream.
+
+    ## Notes
+
+    - Stops at first EOF token encountered.
+    - Does not include EOF token text.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._source = None # type: Iterator[Token]
+
+    @staticmethod
+    def make(source: Iterator[Token]) -> 'TokenToCharStreamAdapter':
+        instance = TokenToCharStreamAdapter()
+        TokenToCharStreamAdapter._setup(instance, source)
+        return instance
+
+    @staticmethod
+    def _setup(instance: 'TokenToCharStreamAdapter', source: Iterator[Token]) -> None:
+        SegmentCharStream._setup(instance)
+        instance._source = source
+        TokenToCharStreamAdapter._initialize(instance)
+
+    @staticmethod
+    def _initialize(instance: 'TokenToCharStreamAdapter') -> None:
+        if instance._source.is_at_start: # State S (self._source)
+            pass
+        elif instance._source.has_current_item: # State I (self._source)
+            text = instance._current_token_text
+            if text is None:
+                instance._is_source_exhausted = True
+            elif len(text) != 0:
+                instance._push_segment(text)
+        else: # State E (self._source)
+            instance._is_source_exhausted = True
+
+    def _next_segment(self) -> str:
+        self._source.move_to_next()
+        if self._source.has_current_item: # State I (self._source)
+            return self._current_token_text
+        else: # State E (self._source)
+            return None
+
+    @property
+    def _current_token_text(self) -> str:
+        # State I (self._source)
+        token = self._source.current_item
+        if token.type != Token.EOF:
+            return token.text
+        else:
+            return None
+
+
+class LineToCharStreamAdapter(SegmentCharStream):
+    """
+    Exposes the contents of a line source as a CharStream, with each
+    line terminated by '\\n'. Produces the same characters as a
+    LineToCharIterator.
+    """
+
+    EOL_LF = '\n'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._source = None # type: Iterator[Line]
+
+    @staticmethod
+    def make(source: Iterator[Line]) -> 'LineToCharStreamAdapter':
+        instance = LineToCharStreamAdapter()
+        LineToCharStreamAdapter._setup(instance, source)
+        return instance
+
+    @staticmethod
+    def _setup(instance: 'LineToCharStreamAdapter', source: Iterator[Line]) -> None:
+        SegmentCharStream._setup(instance)
+        instance._source = source
+        if instance._source.has_current_item: # State I (self._source)
+            instance._push_segment(instance._source.current_item.content + LineToCharStreamAdapter.EOL_LF)
+        elif instance._source.is_at_end: # State E (self._source)
+            instance._is_source_exhausted = True
+
+    def _next_segment(self) -> str:
+        self._source.move_to_next()
+        if self._source.has_current_item: # State I (self._source)
+            return self._source.current_item.content + LineToCharStreamAdapter.EOL_LF
+        else: # State E (self._source)
+            return None
+
+
+class GeneratorCharStream(SegmentCharStream):
+    """
+    Exposes the concatenated strings of a Python iterator, such as a
+    generator, as a CharStream.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._source = None # type: typing.Iterator[str]
+
+    @staticmethod
+    def make(segments: Iterable[str]) -> 'GeneratorCharStream':
+        instance = GeneratorCharStream()
+        SegmentCharStream._setup(instance)
+        instance._source = iter(segments)
+        return instance
+
+    def _next_segment(self) -> str:
+        return next(self._source, None)
+
+
+def generate_tokens(token_source: TokenSource) -> typing.Iterator[Token]:
+    """
+    Generator equivalent of TokenSourceToIteratorAdapter. The EOF token
+    is the last token yielded.
+    """
+    while True:
+        token = token_source.nextToken()
+        yield token
+        if token.type == Token.EOF:
+            return
+
+
+def generate_token_texts(tokens: Iterable[Token]) -> typing.Iterator[str]:
+    """
+    Yields the non-empty texts of tokens, up to the first EOF token.
+    """
+    for token in tokens:
+        if token.type == Token.EOF:
+            return
+        text = token.text
+        if len(text) != 0:
+            yield text
+
+
+del T
@@ -1210,6 +1210,279 @@ class FifoGlobalIndexWrapper(FifoWrapper[T]):
         self.inner_object.move_to_index(local_index)
 
 
+class GlobalIndexFifoManager(ManagedFifo[T]):
+    """
+    A ManagedFifo with global indexes, implemented as a single object.
+
+    Behaves like FifoManager(FifoGlobalIndexWrapper(ArrayedFifo)), but
+    stores items, reference counts, and the cursor directly, so no call
+    is delegated to an inner Fifo.
+
+    ## Call State Validity
+
+    For each method listed, client is allowed to call the method in the
+    given states.
+
+    - global_count (getter): S I E SE EE
+    - current_global_index (getter): I
+    - lowest_global_index (getter): S I E SE EE
+    - move_to_global_index: S I E
+    - item_at_global_index: S I E
+    - items_at_global_range: S I E SE EE
+
+    ## Call Argument Validity
+
+    For each method listed, client is allowed to call the method with
+    the given parameters.
+
+    - move_to_global_index(self, index: int)
+      - self.lowest_global_index <= index /\ index < self.global_count
+    - item_at_global_index(self, index: int)
+      - self.lowest_global_index <= index /\ index < self.global_count
+
+    ## Notes
+
+    - item_at_global_index and items_at_global_range do not change
+      state. They never move the cursor, and never create strong
+      references.
+    - Global indexes are never reused. The global index of an item is
+      the number of items pushed before it.
+    """
+
+    COMPACTION_THRESHOLD = 1024
+
+    MAX_ACTIVE_REFERENCES = sys.maxsize
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._list = None # type: List[T]
+        self._refcounts = None # type: List[int]
+        self._head = None # type: int
+        self._start_index = None # type: int
+        self._index = None # type: int
+        self._is_at_end = None # type: bool
+        self._ref_token_dict = None # type: Dict[int, int]
+        self._current_reference_token = None # type: int
+
+    @staticmethod
+    def make() -> 'GlobalIndexFifoManager[T]':
+        instance = GlobalIndexFifoManager() # type: GlobalIndexFifoManager[T]
+        GlobalIndexFifoManager._setup(instance)
+        return instance
+
+    @staticmethod
+    def _setup(instance: 'GlobalIndexFifoManager[T]') -> None:
+        instance._list = []
+        instance._refcounts = []
+        instance._head = 0
+        instance._start_index = 0
+        instance._ref_token_dict = {}
+        instance._current_reference_token = 0
+        instance._to_S()
+
+    @property
+    def current_item(self) -> T:
+        # State I
+        return self._list[self._index]
+
+    @property
+    def has_current_item(self) -> bool:
+        # State S, I, E, SE, or EE
+        return self._index is not None
+
+    @property
+    def is_at_start(self) -> bool:
+        # State S, I, E, SE, or EE
+        return not ((self._index is not None) or self._is_at_end)
+
+    @property
+    def is_at_end(self) -> bool:
+        # State S, I, E, SE, or EE
+        return self._is_at_end
+
+    def move_to_next(self) -> None:
+        if self._index is not None: # State I
+            if self._index + 1 != len(self._list):
+                # I -> I
+                self._index = self._index + 1
+            else:
+                # I -> E
+                self._to_E()
+        elif self._head != len(self._list): # State S
+            # S -> I
+            self._index = self._head
+            self._to_I()
+        else: # State SE
+            # SE -> EE
+            self._to_E()
+
+    def move_to_end(self) -> None:
+        # State S, I, E, SE, or EE
+        # S -> E
+        # I -> E
+        # E -> E
+        # SE -> EE
+        # EE -> EE
+        self._to_E()
+
+    @property
+    def count(self) -> int:
+        # State S, I, E, SE, or EE
+        return len(self._list) - self._head
+
+    @property
+    def current_index(self) -> int:
+        # State I
+        return self._index - self._head
+
+    @property
+    def is_empty(self) -> bool:
+        # State S, I, E, SE, or EE
+        return self._head == len(self._list)
+
+    def move_to_start(self) -> None:
+        # State S, I, E, SE, or EE
+        # S -> S
+        # I -> S
+        # E -> S
+        # SE -> SE
+        # EE -> SE
+        self._to_S()
+
+    def move_to_index(self, index: int) -> None:
+        # State S, I, or E
+        # S -> I
+        # I -> I
+        # E -> I
+        self._index = self._head + index
+        self._to_I()
+
+    @property
+    def global_count(self) -> int:
+        # State S, I, E, SE, or EE
+        return self._start_index + len(self._list) - self._head
+
+    @property
+    def current_global_index(self) -> int:
+        # State I
+        return self._start_index + self._index - self._head
+
+    @property
+    def lowest_global_index(self) -> int:
+        # State S, I, E, SE, or EE
+        return self._start_index
+
+    def move_to_global_index(self, index: int) -> None:
+        # State S, I, or E
+        # S -> I
+        # I -> I
+        # E -> I
+        self._index = self._head + index - self._start_index
+        self._to_I()
+
+    def item_at_global_index(self, index: int) -> T:
+        # State S, I, or E
+        return self._list[self._head + index - self._start_index]
+
+    def items_at_global_range(self, start: int, stop: int) -> List[T]:
+        """
+        Returns the items from global index start up to, but not
+        including, global index stop.
+
+        ## Specification Domain
+
+        - self.lowest_global_index <= start
+        - start <= stop
+        - stop <= self.global_count
+        """
+        # State S, I, E, SE, or EE
+        offset = self._head - self._start_index
+        return self._list[(start + offset):(stop + offset)]
+
+    def push(self, item: T) -> None:
+        # State S, I, E, SE, or EE
+        # S -> S
+        # I -> I
+        # E -> E
+        # E -> EE
+        # SE -> S
+        # EE -> E
+        # EE -> EE
+        self._list.append(item)
+        self._refcounts.append(0)
+        self.collect_garbage()
+
+    def collect_garbage(self) -> None:
+        if self._index is not None: # State I
+            # I -> I
+            while (self._head != self._index) and (self._refcounts[self._head] == 0):
+                self._shift()
+        elif self._is_at_end: # State E or EE
+            # E -> E
+            # E -> EE
+            # EE -> EE
+            while (self._head != len(self._list)) and (self._refcounts[self._head] == 0):
+                self._shift()
+        else: # State S or SE
+            # S -> S
+            # SE -> SE
+            pass
+
+    def _shift(self) -> None:
+        # State I, E
+        self._list[self._head] = None
+        self._head = self._head + 1
+        self._start_index = self._start_index + 1
+        if (GlobalIndexFifoManager.COMPACTION_THRESHOLD <= self._head) and (len(self._list) <= self._head + self._head):
+            self._compact()
+
+    def _compact(self) -> None:
+        # State I, E
+        del self._list[0:self._head]
+        del self._refcounts[0:self._head]
+        if self._index is not None:
+            self._index = self._index - self._head
+        self._head = 0
+
+    def new_strong_reference(self) -> int:
+        # State I
+        ref_token = self._next_available_reference_token()
+        self._ref_token_dict[ref_token] = self.current_global_index
+        self._refcounts[self._index] = self._refcounts[self._index] + 1
+        self._current_reference_token = ref_token
+        return ref_token
+
+    def _next_available_reference_token(self) -> int:
+        ref_token = self._next_reference_token(self._current_reference_token)
+        while (ref_token in self._ref_token_dict) and (ref_token != self._current_reference_token):
+            ref_token = self._next_reference_token(ref_token)
+        if ref_token == self._current_reference_token:
+            raise RuntimeError('Reached maximum number of active strong references: ' + str(GlobalIndexFifoManager.MAX_ACTIVE_REFERENCES) + '. You must release some references to continue.')
+        return ref_token
+
+    def _next_reference_token(self, ref_token: int) -> int:
+        if ref_token != GlobalIndexFifoManager.MAX_ACTIVE_REFERENCES:
+            return ref_token + 1
+        else:
+            return 0
+
+    def release_strong_reference(self, ref_token: int) -> None:
+        if ref_token in self._ref_token_dict:
+            physical_index = self._head + self._ref_token_dict.pop(ref_token) - self._start_index
+            self._refcounts[physical_index] = self._refcounts[physical_index] - 1
+
+    def _to_S(self) -> None:
+        self._index = None
+        self._is_at_end = False
+
+    def _to_I(self) -> None:
+        self._is_at_end = False
+
+    def _to_E(self) -> None:
+        self._index = None
+        self._is_at_end = True
+
+
 del U
 del T
 
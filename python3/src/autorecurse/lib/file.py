@@ -1,9 +1,15 @@
 from abc import ABCMeta, abstractmethod
 from io import IOBase
-from typing import cast, Dict
+from typing import cast, Dict, List, Tuple
+import json
 import os
 import tempfile
 
+try:
+    import fcntl
+except ImportError: # Not available on Windows
+    fcntl = None # type: ignore
+
 
 class FileCreator(metaclass=ABCMeta):
     """
@@ -141,3 +147,138 @@ class FileLifetimeManager:
         return False
 
 
+class SingleFlightLock:
+    """
+    Serializes the processes that regenerate the same file, through an
+    exclusive advisory lock (fcntl.flock) on a lock file next to it.
+
+    The first process to enter gets the lock at once, and regenerates
+    the file. The others wait for the lock. A process that had to wait
+    and finds that the file was replaced or modified meanwhile sees
+    is_updated_by_other_process set, and can reuse the file instead of
+    regenerating it again.
+
+    The file is only reused if the process that updated it started from
+    the same versions of source_paths, the files it is generated from,
+    as the waiting process sees once it gets the lock. Each process that
+    gets the lock writes the versions it starts from to the lock file.
+
+    Without fcntl, no lock is taken and is_updated_by_other_process is
+    always False.
+    """
+
+    LOCK_FILE_SUFFIX = '.lock'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._file_path = None # type: str
+        self._source_paths = None # type: List[str]
+        self._lock_fd = None # type: int
+        self._is_updated_by_other_process = None # type: bool
+
+    @staticmethod
+    def make(file_path: str, source_paths: List[str] = None) -> 'SingleFlightLock':
+        instance = SingleFlightLock()
+        instance._file_path = file_path
+        instance._source_paths = [] if (source_paths is None) else list(source_paths)
+        instance._lock_fd = None
+        instance._is_updated_by_other_process = False
+        return instance
+
+    @property
+    def file_path(self) -> str:
+        return self._file_path
+
+    @property
+    def lock_file_path(self) -> str:
+        return self._file_path + SingleFlightLock.LOCK_FILE_SUFFIX
+
+    @property
+    def is_updated_by_other_process(self) -> bool:
+        return self._is_updated_by_other_process
+
+    def __enter__(self) -> 'SingleFlightLock':
+        if fcntl is None:
+            return self
+        version = self._file_version()
+        self._lock_fd = os.open(self.lock_file_path, os.O_RDWR | os.O_CREAT, 0o666)
+        try:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            is_waiting = False
+        except BlockingIOError:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            is_waiting = True
+        source_versions = json.dumps(self._source_versions())
+        if is_waiting and (self._file_version() != version) and (self._read_lock_file() == source_versions):
+            self._is_updated_by_other_process = True
+        else:
+            self._write_lock_file(source_versions)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        return False
+
+    def _file_version(self) -> Tuple:
+        return SingleFlightLock._version(self._file_path)
+
+    def _source_versions(self) -> List[Tuple]:
+        return [SingleFlightLock._version(path) for path in self._source_paths]
+
+    @staticmethod
+    def _version(path: str) -> Tuple:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+
+    def _read_lock_file(self) -> str:
+        os.lseek(self._lock_fd, 0, os.SEEK_SET)
+        pieces = []
+        while True:
+            piece = os.read(self._lock_fd, 4096)
+            if len(piece) == 0:
+                return b''.join(pieces).decode('utf-8')
+            pieces.append(piece)
+
+    def _write_lock_file(self, content: str) -> None:
+        os.lseek(self._lock_fd, 0, os.SEEK_SET)
+        os.ftruncate(self._lock_fd, 0)
+        os.write(self._lock_fd, content.encode('utf-8'))
+
+
+class FileReplacement:
+    """
+    Writes a new version of a file to a temporary file in the same
+    directory, and renames it over the file on a clean exit. Readers of
+    the file never see a partially written version.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._file_path = None # type: str
+        self._temp_path = None # type: str
+
+    @staticmethod
+    def make(file_path: str) -> 'FileReplacement':
+        instance = FileReplacement()
+        instance._file_path = file_path
+        instance._temp_path = ''.join([file_path, '.', str(os.getpid()), '.tmp'])
+        return instance
+
+    def open_file(self, *args, **kwargs) -> IOBase:
+        return cast(IOBase, open(self._temp_path, *args, **kwargs))
+
+    def __enter__(self) -> 'FileReplacement':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        if exc_type is None:
+            os.replace(self._temp_path, self._file_path)
+        elif os.path.exists(self._temp_path):
+            os.remove(self._temp_path)
+        return False
@@ -0,0 +1,216 @@
+from typing import Callable, Dict, List, Tuple
+import array
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import traceback
+
+
+_LENGTH_FORMAT = '!i'
+
+_LENGTH_SIZE = struct.calcsize(_LENGTH_FORMAT)
+
+_STREAM_COUNT = 3
+
+
+class ForkServer:
+    """
+    Serves requests on a Unix socket, from a process forked from the
+    current one on __enter__ and terminated on __exit__. The server
+    process keeps everything that the current process has imported and
+    configured, and forks a child for each request, so that requests do
+    not pay interpreter start-up.
+
+    Each request is passed to handler, in a child forked from the server
+    process, as the list of arguments of the client. The value returned
+    by handler, or the code of a SystemExit it raises, is the exit
+    status of the client.
+
+    The socket listens before the server process is forked, so clients
+    can connect as soon as __enter__ returns.
+
+    ## Protocol
+
+    A request is a 4-byte length, followed by a JSON object holding the
+    arguments, working directory and environment of the client. The
+    standard input, output and error of the client are attached to the
+    first message (SCM_RIGHTS). The child serves the request with these
+    streams and replies with a 4-byte exit status.
+    """
+
+    ENVIRONMENT_VARIABLE = 'AUTORECURSE_FORK_SERVER'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._socket_path = None # type: str
+        self._handler = None # type: Callable[[List[str]], int]
+        self._server_pid = None # type: int
+
+    @staticmethod
+    def make(socket_path: str, handler: Callable[[List[str]], int]) -> 'ForkServer':
+        instance = ForkServer()
+        instance._socket_path = socket_path
+        instance._handler = handler
+        instance._server_pid = None
+        return instance
+
+    @staticmethod
+    def is_supported() -> bool:
+        return hasattr(os, 'fork') and hasattr(socket, 'AF_UNIX') and hasattr(socket.socket, 'sendmsg')
+
+    @property
+    def socket_path(self) -> str:
+        return self._socket_path
+
+    def __enter__(self) -> 'ForkServer':
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            listener.bind(self._socket_path)
+            listener.listen(socket.SOMAXCONN)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            self._server_pid = os.fork()
+            if self._server_pid == 0:
+                status = 1
+                try:
+                    self._serve(listener)
+                    status = 0
+                finally:
+                    os._exit(status)
+        finally:
+            listener.close()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        if self._server_pid is not None:
+            try:
+                os.kill(self._server_pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+            os.waitpid(self._server_pid, 0)
+            self._server_pid = None
+        if os.path.exists(self._socket_path):
+            os.remove(self._socket_path)
+        return False
+
+    def _serve(self, listener: socket.socket) -> None:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGCHLD, ForkServer._reap_children)
+        while True:
+            connection = listener.accept()[0]
+            try:
+                sys.stdout.flush()
+                sys.stderr.flush()
+                if os.fork() == 0:
+                    status = 1
+                    try:
+                        listener.close()
+                        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+                        signal.signal(signal.SIGINT, signal.SIG_DFL)
+                        status = self._serve_request(connection)
+                    finally:
+                        os._exit(status)
+            finally:
+                connection.close()
+
+    @staticmethod
+    def _reap_children(signum, frame) -> None:
+        try:
+            while os.waitpid(-1, os.WNOHANG)[0] != 0:
+                pass
+        except ChildProcessError:
+            pass
+
+    def _serve_request(self, connection: socket.socket) -> int:
+        request, fds = _receive_request(connection)
+        for stream_fd, fd in enumerate(fds):
+            os.dup2(fd, stream_fd)
+            os.close(fd)
+        os.chdir(request['cwd'])
+        os.environ.clear()
+        os.environ.update(request['env'])
+        status = self._run_handler(request['args'])
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+        finally:
+            connection.sendall(struct.pack(_LENGTH_FORMAT, status))
+        return status
+
+    def _run_handler(self, args: List[str]) -> int:
+        try:
+            status = self._handler(args)
+        except SystemExit as exit:
+            status = exit.code
+        except BaseException:
+            traceback.print_exc()
+            return 1
+        if status is None:
+            return 0
+        if isinstance(status, int):
+            return status
+        sys.stderr.write(str(status))
+        sys.stderr.write('\n')
+        return 1
+
+
+class ForkServerClient:
+    """
+    Sends a request to a ForkServer, and waits for its exit status.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._socket_path = None # type: str
+
+    @staticmethod
+    def make(socket_path: str) -> 'ForkServerClient':
+        instance = ForkServerClient()
+        instance._socket_path = socket_path
+        return instance
+
+    def request(self, args: List[str], cwd: str, env: Dict[str, str], fds: List[int]) -> int:
+        """
+        fds are the standard input, output and error of the request.
+        Raises FileNotFoundError or ConnectionRefusedError if there is
+        no server, in which case the request was not sent. Raises
+        ConnectionError if the connection is closed before the exit
+        status is received.
+        """
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(self._socket_path)
+            data = json.dumps({'args': args, 'cwd': cwd, 'env': env}).encode()
+            ancillary_data = [(socket.SOL_SOCKET, socket.SCM_RIGHTS, array.array('i', fds))]
+            connection.sendmsg([struct.pack(_LENGTH_FORMAT, len(data))], ancillary_data)
+            connection.sendall(data)
+            reply = _receive_exactly(connection, _LENGTH_SIZE)
+            return struct.unpack(_LENGTH_FORMAT, reply)[0]
+
+
+def _receive_request(connection: socket.socket) -> Tuple[Dict, List[int]]:
+    fds = array.array('i')
+    message, ancillary_data, flags, address = connection.recvmsg(_LENGTH_SIZE, socket.CMSG_LEN(_STREAM_COUNT * fds.itemsize))
+    for level, type, data in ancillary_data:
+        if (level == socket.SOL_SOCKET) and (type == socket.SCM_RIGHTS):
+            fds.frombytes(data[:len(data) - (len(data) % fds.itemsize)])
+    message = message + _receive_exactly(connection, _LENGTH_SIZE - len(message))
+    length = struct.unpack(_LENGTH_FORMAT, message)[0]
+    request = json.loads(_receive_exactly(connection, length).decode())
+    return request, list(fds)
+
+
+def _receive_exactly(connection: socket.socket, size: int) -> bytes:
+    chunks = []
+    while size != 0:
+        chunk = connection.recv(size)
+        if len(chunk) == 0:
+            raise ConnectionError('Fork server connection closed early.')
+        chunks.append(chunk)
+        size = size - len(chunk)
+    return b''.join(chunks)
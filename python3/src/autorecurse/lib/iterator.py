@@ -267,6 +267,73 @@ class PythonIteratorWrapper(typing.Iterator[T_co]):
             raise StopIteration()
 
 
+class GeneratorIterator(Iterator[T_co]):
+    """
+    Adapts a Python iterator, such as a generator, to the Iterator
+    protocol. The Python iterator is advanced once per move_to_next.
+    """
+
+    _END = object()
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._source = None # type: typing.Iterator[T_co]
+        self._item = None # type: T_co
+        self._is_at_start = None # type: bool
+        self._is_at_end = None # type: bool
+
+    @staticmethod
+    def make(iterable: Iterable[T_co]) -> 'GeneratorIterator[T_co]':
+        instance = GeneratorIterator() # type: GeneratorIterator[T_co]
+        instance._source = iter(iterable)
+        instance._item = None
+        instance._is_at_start = True
+        instance._is_at_end = False
+        return instance
+
+    @property
+    def current_item(self) -> T_co:
+        return self._item
+
+    @property
+    def has_current_item(self) -> bool:
+        return not (self._is_at_start or self._is_at_end)
+
+    @property
+    def is_at_start(self) -> bool:
+        return self._is_at_start
+
+    @property
+    def is_at_end(self) -> bool:
+        return self._is_at_end
+
+    def move_to_next(self) -> None:
+        # State S or I
+        self._is_at_start = False
+        item = next(self._source, GeneratorIterator._END)
+        if item is not GeneratorIterator._END:
+            # S -> I
+            # I -> I
+            self._item = item
+        else:
+            # S -> E
+            # I -> E
+            self._item = None
+            self._is_at_end = True
+
+
+def generate_items(iterator: Iterator[T_co]) -> typing.Iterator[T_co]:
+    """
+    Yields the remaining items of an Iterator, starting with its current
+    item if it has one. The Iterator is advanced as items are taken.
+    """
+    if iterator.is_at_start:
+        iterator.move_to_next()
+    while iterator.has_current_item:
+        yield iterator.current_item
+        iterator.move_to_next()
+
+
 del T_co
 del T
 
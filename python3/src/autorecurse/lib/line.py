@@ -1,7 +1,9 @@
 from autorecurse.lib.iterator import Iterator
 from autorecurse.lib.stream import Condition
-from io import TextIOBase
-from typing import cast
+from io import BufferedIOBase, TextIOBase
+from typing import cast, AnyStr, Dict, Iterable, List, Pattern, Tuple
+import re
+import typing
 
 
 class LineBreakError(Exception):
@@ -48,6 +50,20 @@ class Line:
         Line._setup(instance, content)
         instance._line_number = line_number
 
+    @staticmethod
+    def make_stripped_with_line_number(content: str, line_number: int) -> 'Line':
+        """
+        Skips the line break validation done by make_with_line_number.
+
+        ## Specification Domain
+
+        - content contains no line breaks
+        """
+        instance = Line()
+        instance._content = content
+        instance._line_number = line_number
+        return instance
+
     @property
     def content(self) -> str:
         return self._content
@@ -153,6 +169,275 @@ class FileLineIterator(Iterator[Line]):
         self._is_at_end = True
 
 
+class BlockFileLineIterator(Iterator[Line]):
+    """
+    Reads lines from a file in blocks of BLOCK_SIZE characters.
+
+    Each block is split into lines once, and searched once for the
+    line breaks that FileLineIterator would reject, so lines do not need
+    to be validated one at a time. Yields the same Line items as
+    FileLineIterator: line terminators are stripped and lines are
+    numbered from 1.
+
+    The pieces of a line that spans blocks are kept in a list, and
+    joined once the line is complete, so long lines take linear time.
+
+    ## Notes
+
+    - Recognizes '\\n' and '\\r\\n' line terminators only. Raises
+      LineBreakError on any other line break that str.splitlines
+      recognizes.
+    """
+
+    BLOCK_SIZE = 65536
+
+    _NEWLINE = '\n'
+    _CARRIAGE_RETURN = '\r'
+    _EMPTY = ''
+
+    # Line breaks of str.splitlines other than '\n' and '\r\n'. A '\r'
+    # at the end of the file is a line terminator.
+    _OTHER_LINE_BREAKS = ['\x0b', '\x0c', '\x1c', '\x1d', '\x1e', '\x85', '\u2028', '\u2029']
+
+    _LINE_BREAK_PATTERN = re.compile('|'.join([re.escape(line_break) for line_break in _OTHER_LINE_BREAKS] + ['\r(?!\n|\Z)']))
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._line = None # type: Line
+        self._is_at_end = None # type: bool
+        self._file = None # type: TextIOBase
+        self._lines = None # type: List[AnyStr]
+        self._line_index = None # type: int
+        self._pieces = None # type: List[AnyStr]
+        self._line_number = None # type: int
+        self._line_break_pattern = None # type: Pattern
+
+    @staticmethod
+    def make(fp: TextIOBase) -> 'BlockFileLineIterator':
+        instance = BlockFileLineIterator()
+        BlockFileLineIterator._setup(instance, fp)
+        return instance
+
+    @staticmethod
+    def _setup(instance: 'BlockFileLineIterator', fp: TextIOBase) -> None:
+        instance._file = fp
+        instance._lines = []
+        instance._line_index = 0
+        instance._pieces = []
+        instance._line_number = 0
+        instance._line_break_pattern = BlockFileLineIterator._LINE_BREAK_PATTERN
+        instance._to_S()
+
+    @property
+    def current_item(self) -> Line:
+        return self._line
+
+    @property
+    def has_current_item(self) -> bool:
+        return self._line is not None
+
+    @property
+    def is_at_start(self) -> bool:
+        return not (self.has_current_item or self.is_at_end)
+
+    @property
+    def is_at_end(self) -> bool:
+        return self._is_at_end
+
+    def move_to_next(self) -> None:
+        # State S or I
+        if self._line_index == len(self._lines):
+            self._read_lines()
+        if self._line_index != len(self._lines):
+            # S -> I
+            # I -> I
+            self._line_number = self._line_number + 1
+            self._line = self._make_line(self._lines[self._line_index], self._line_number)
+            self._line_index = self._line_index + 1
+            self._to_I()
+        else: # End of file
+            # S -> E
+            # I -> E
+            self._to_E()
+
+    def move_to_next_line_in(self, contents: Tuple[str, ...]) -> None:
+        """
+        Moves to the next line whose content is in contents, skipping
+        the lines in between. Moves to end if there is no such line.
+        """
+        # State S or I
+        contents = self._encode_contents(contents)
+        while True:
+            if self._line_index == len(self._lines):
+                self._read_lines()
+                if len(self._lines) == 0: # End of file
+                    # S -> E
+                    # I -> E
+                    self._to_E()
+                    return
+            found_index = len(self._lines)
+            for content in contents:
+                try:
+                    found_index = self._lines.index(content, self._line_index, found_index)
+                except ValueError:
+                    pass
+            self._line_number = self._line_number + (found_index - self._line_index)
+            self._line_index = found_index
+            if found_index != len(self._lines):
+                # S -> I
+                # I -> I
+                self.move_to_next()
+                return
+
+    def _read_lines(self) -> None:
+        """
+        Replaces self._lines with the complete lines of the next block.
+        Leaves self._lines empty at end of file.
+        """
+        self._line_index = 0
+        while True:
+            block = self._file.read(BlockFileLineIterator.BLOCK_SIZE)
+            if len(block) == 0:
+                if len(self._pieces) != 0:
+                    text = self._EMPTY.join(self._pieces)
+                    self._pieces = []
+                    if self._CARRIAGE_RETURN in text:
+                        text = self._translate_carriage_returns(text)
+                    self._check_line_breaks(text)
+                    self._lines = self._strip_carriage_returns(text.split(self._NEWLINE))
+                else:
+                    self._lines = []
+                return
+            end = block.rfind(self._NEWLINE)
+            if end == -1:
+                self._pieces.append(block)
+                continue
+            if len(self._pieces) != 0:
+                self._pieces.append(block[:end])
+                text = self._EMPTY.join(self._pieces)
+            else:
+                text = block[:end]
+            self._pieces = [] if (end + 1 == len(block)) else [block[end + 1:]]
+            is_carriage_return_found = self._CARRIAGE_RETURN in text
+            if is_carriage_return_found:
+                text = self._translate_carriage_returns(text)
+            self._check_line_breaks(text)
+            lines = text.split(self._NEWLINE)
+            if is_carriage_return_found:
+                lines = self._strip_carriage_returns(lines)
+            self._lines = lines
+            return
+
+    def _translate_carriage_returns(self, text: AnyStr) -> AnyStr:
+        """
+        text holds the next complete lines, without the terminator of
+        the last one.
+        """
+        return text
+
+    def _check_line_breaks(self, text: AnyStr) -> None:
+        """
+        text holds the next complete lines, without the terminator of
+        the last one.
+        """
+        match = self._line_break_pattern.search(text)
+        if match is not None:
+            line_number = self._line_number + text.count(self._NEWLINE, 0, match.start()) + 1
+            raise LineBreakError('Line {0} has a line break other than LF or CR LF.'.format(line_number))
+
+    def _strip_carriage_returns(self, lines: List[AnyStr]) -> List[AnyStr]:
+        return [line[:-1] if line.endswith(self._CARRIAGE_RETURN) else line for line in lines]
+
+    def _make_line(self, content: AnyStr, line_number: int) -> Line:
+        return Line.make_stripped_with_line_number(content, line_number)
+
+    def _encode_contents(self, contents: Tuple[str, ...]) -> Tuple[AnyStr, ...]:
+        return contents
+
+    def _to_S(self) -> None:
+        self._line = None
+        self._is_at_end = False
+
+    def _to_I(self) -> None:
+        self._is_at_end = False
+
+    def _to_E(self) -> None:
+        self._line = None
+        self._lines = []
+        self._line_index = 0
+        self._is_at_end = True
+
+
+class BinaryBlockFileLineIterator(BlockFileLineIterator):
+    """
+    A BlockFileLineIterator over a binary file.
+
+    Blocks are split into lines, and searched by move_to_next_line_in,
+    as raw bytes. Only the lines that become current_item are decoded,
+    so skipped lines are never decoded.
+
+    ## Specification Domain
+
+    - encoding encodes '\\n' and '\\r' as single bytes that occur in no
+      other encoded character (e.g. UTF-8 or ASCII).
+
+    ## Notes
+
+    - Unlike BlockFileLineIterator, also recognizes a lone '\\r' as a
+      line terminator, like a text file in universal newlines mode.
+    """
+
+    _NEWLINE = b'\n'
+    _CARRIAGE_RETURN = b'\r'
+    _EMPTY = b''
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._encoding = None # type: str
+        self._encoded_contents = None # type: Dict[Tuple[str, ...], Tuple[bytes, ...]]
+
+    @staticmethod
+    def make(fp: BufferedIOBase, encoding: str = 'utf-8') -> 'BinaryBlockFileLineIterator':
+        instance = BinaryBlockFileLineIterator()
+        BinaryBlockFileLineIterator._setup(instance, fp, encoding)
+        return instance
+
+    @staticmethod
+    def _setup(instance: 'BinaryBlockFileLineIterator', fp: BufferedIOBase, encoding: str) -> None:
+        BlockFileLineIterator._setup(instance, cast(TextIOBase, fp))
+        instance._encoding = encoding
+        instance._encoded_contents = {}
+        instance._line_break_pattern = BinaryBlockFileLineIterator._make_line_break_pattern(encoding)
+
+    @staticmethod
+    def _make_line_break_pattern(encoding: str) -> Pattern:
+        expressions = []
+        for line_break in BlockFileLineIterator._OTHER_LINE_BREAKS:
+            try:
+                expressions.append(re.escape(line_break.encode(encoding)))
+            except UnicodeEncodeError:
+                pass
+        return re.compile(b'|'.join(expressions))
+
+    def _translate_carriage_returns(self, text: bytes) -> bytes:
+        # Splits lines on a lone '\r' too, as the universal newlines mode
+        # of a text file would. A '\r' at the end of text is either
+        # followed by '\n' or at the end of the file.
+        if text.endswith(self._CARRIAGE_RETURN):
+            text = text[:-1]
+        return text.replace(b'\r\n', self._NEWLINE).replace(self._CARRIAGE_RETURN, self._NEWLINE)
+
+    def _make_line(self, content: bytes, line_number: int) -> Line:
+        return Line.make_stripped_with_line_number(content.decode(self._encoding), line_number)
+
+    def _encode_contents(self, contents: Tuple[str, ...]) -> Tuple[bytes, ...]:
+        encoded = self._encoded_contents.get(contents)
+        if encoded is None:
+            encoded = tuple(content.encode(self._encoding) for content in contents)
+            self._encoded_contents[contents] = encoded
+        return encoded
+
+
 class LineToCharIterator(Iterator[str]):
 
     EOL_LF = '\n'
@@ -289,3 +574,9 @@ class EmptyLineFilter(Condition[Line]):
 del EmptyLineFilter._set_current_item
 
 
+def generate_line_texts(lines: Iterable[Line]) -> typing.Iterator[str]:
+    """
+    Yields the content of each Line followed by a line feed.
+    """
+    for line in lines:
+        yield line.content + LineToCharIterator.EOL_LF
@@ -0,0 +1,188 @@
+from typing import Dict, List
+import json
+import os
+import time
+
+
+class TraceSpan:
+    """
+    Records the time between __enter__ and __exit__ as a complete event
+    of its tracer.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._tracer = None # type: Tracer
+        self._name = None # type: str
+        self._args = None # type: Dict[str, object]
+        self._start = None # type: int
+
+    @staticmethod
+    def make(tracer: 'Tracer', name: str, args: Dict[str, object]) -> 'TraceSpan':
+        instance = TraceSpan()
+        instance._tracer = tracer
+        instance._name = name
+        instance._args = args
+        instance._start = None
+        return instance
+
+    def __enter__(self) -> 'TraceSpan':
+        self._start = Tracer.timestamp()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        self._tracer.add_complete_event(self._name, self._start, Tracer.timestamp() - self._start, self._args)
+        return False
+
+
+class NullTraceSpan:
+
+    _INSTANCE = None
+
+    @staticmethod
+    def make() -> 'NullTraceSpan':
+        if NullTraceSpan._INSTANCE is None:
+            NullTraceSpan._INSTANCE = NullTraceSpan()
+        return NullTraceSpan._INSTANCE
+
+    def __enter__(self) -> 'NullTraceSpan':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> bool:
+        return False
+
+
+class Tracer:
+    """
+    Records spans in the Chrome trace event format (JSON array format),
+    so that a run can be viewed as a timeline in chrome://tracing or
+    Perfetto.
+
+    The process started with `--trace` is the root. It creates the trace
+    file, and passes it to the `autorecurse` commands run by make
+    through the AUTORECURSE_TRACE environment variable, which holds the
+    root process ID and the path of the trace file. Every process
+    appends its events to the trace file when it closes its tracer.
+    Events of all processes have the process ID of the root, and their
+    own process ID as thread ID, so each command gets its own track on
+    a shared timeline. Each process also records a span covering its
+    whole command. The root closes the JSON array when it closes its
+    tracer.
+
+    A disabled tracer records nothing, and its spans do nothing.
+    """
+
+    ENVIRONMENT_VARIABLE = 'AUTORECURSE_TRACE'
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._file_path = None # type: str
+        self._pid = None # type: int
+        self._tid = None # type: int
+        self._is_root = None # type: bool
+        self._name = None # type: str
+        self._start = None # type: int
+        self._events = None # type: List[Dict[str, object]]
+
+    @staticmethod
+    def make_disabled() -> 'Tracer':
+        instance = Tracer()
+        instance._file_path = None
+        return instance
+
+    @staticmethod
+    def make_root(file_path: str, name: str) -> 'Tracer':
+        """
+        Creates the trace file at file_path, replacing any existing one.
+        """
+        instance = Tracer()
+        Tracer._setup(instance, file_path, os.getpid(), True, name)
+        metadata = {'name': 'process_name', 'ph': 'M', 'pid': instance._pid, 'tid': instance._tid, 'args': {'name': 'autorecurse'}}
+        with open(file_path, mode='w', encoding='utf-8') as file:
+            file.write('[\n')
+            file.write(json.dumps(metadata))
+        return instance
+
+    @staticmethod
+    def make_from_environment(value: str, name: str) -> 'Tracer':
+        """
+        value is the value of the environment variable set by the root
+        tracer.
+        """
+        pid, file_path = value.split(':', 1)
+        instance = Tracer()
+        Tracer._setup(instance, file_path, int(pid), False, name)
+        return instance
+
+    @staticmethod
+    def _setup(instance: 'Tracer', file_path: str, pid: int, is_root: bool, name: str) -> None:
+        instance._file_path = file_path
+        instance._pid = pid
+        instance._tid = os.getpid()
+        instance._is_root = is_root
+        instance._name = name
+        instance._start = Tracer.timestamp()
+        instance._events = []
+        instance._events.append({'name': 'thread_name', 'ph': 'M', 'pid': instance._pid, 'tid': instance._tid, 'args': {'name': name}})
+
+    @staticmethod
+    def timestamp() -> int:
+        """
+        Microseconds since the epoch, so that the timestamps of all
+        processes line up.
+        """
+        return int(time.time() * 1000000)
+
+    @property
+    def is_enabled(self) -> bool:
+        return self._file_path is not None
+
+    @property
+    def environment_value(self) -> str:
+        return ':'.join([str(self._pid), self._file_path])
+
+    def span(self, name: str, args: Dict[str, object] = None):
+        if self._file_path is None:
+            return NullTraceSpan.make()
+        return TraceSpan.make(self, name, args)
+
+    def add_complete_event(self, name: str, start: int, duration: int, args: Dict[str, object]) -> None:
+        event = {'name': name, 'ph': 'X', 'ts': start, 'dur': duration, 'pid': self._pid, 'tid': self._tid}
+        if args is not None:
+            event['args'] = args
+        self._events.append(event)
+
+    def close(self) -> None:
+        """
+        Appends the recorded events to the trace file. Each process
+        writes its events with a single append, so the events of
+        concurrent processes do not interleave.
+        """
+        if self._file_path is None:
+            return
+        self.add_complete_event(self._name, self._start, Tracer.timestamp() - self._start, None)
+        chunks = [''.join([',\n', json.dumps(event)]) for event in self._events]
+        if self._is_root:
+            chunks.append('\n]\n')
+        self._events = []
+        fd = os.open(self._file_path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, ''.join(chunks).encode('utf-8'))
+        finally:
+            os.close(fd)
+        self._file_path = None
+
+
+class DefaultTracer:
+
+    _INSTANCE = None
+
+    @staticmethod
+    def make() -> Tracer:
+        if DefaultTracer._INSTANCE is None:
+            DefaultTracer._INSTANCE = Tracer.make_disabled()
+        return DefaultTracer._INSTANCE
+
+    @staticmethod
+    def set(tracer: Tracer) -> None:
+        DefaultTracer._INSTANCE = tracer
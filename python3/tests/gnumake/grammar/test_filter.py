@@ -1,4 +1,9 @@
 from autorecurse.gnumake.grammar.filter import *
+from autorecurse.lib.iterator import PythonIteratorWrapper
+from autorecurse.lib.line import FileLineIterator
+from autorecurse.lib.stream import CompositeCondition, ConditionFilter
+from io import StringIO, TextIOBase
+from typing import cast
 import unittest
 
 
@@ -32,3 +37,47 @@ class TestFileSectionFilter(unittest.TestCase):
         self.assertIs(obj.condition, False)
 
 
+class TestTargetDefinitionFilter(unittest.TestCase):
+
+    DATABASE_PATH = 'tests/data/gnumake/database/project.txt'
+
+    def test_content(self):
+        obj = TargetDefinitionFilter.make()
+        lines = ['Hello', '# Files', 'Hello', '# Pattern-specific Variable Values', 'Hello', '# Files', '', 'Hello',
+                '#  informational', '# Files', '# files hash-table stats:', 'Hello', '# Files', 'Hello']
+        expected = [False, False, False, False, False, False, True, True, False, True, False, False, False, False]
+        actual = []
+        for line in lines:
+            obj.current_item = Line.make(line)
+            actual.append(obj.condition)
+        self.assertEqual(actual, expected)
+
+    def test_skip_lines(self):
+        obj = TargetDefinitionFilter.make()
+        self.assertEqual(obj.skip_lines, ('# Pattern-specific Variable Values',))
+        obj.current_item = Line.make('# Pattern-specific Variable Values')
+        self.assertEqual(obj.skip_lines, ('# Files',))
+        obj.current_item = Line.make('# Files')
+        self.assertIsNone(obj.skip_lines)
+        obj.current_item = Line.make('# files hash-table stats:')
+        self.assertEqual(obj.skip_lines, ('# Files',))
+
+    def test_matches_composite_condition(self):
+        with open(TestTargetDefinitionFilter.DATABASE_PATH, 'r', encoding='utf-8') as file:
+            expected_lines = ConditionFilter.make(
+                    FileLineIterator.make(file),
+                    CompositeCondition.make([DatabaseSectionFilter.make(), FileSectionFilter.make(), InformationalCommentFilter.make()]))
+            expected = [line for line in PythonIteratorWrapper.make(expected_lines)]
+        with open(TestTargetDefinitionFilter.DATABASE_PATH, 'r', encoding='utf-8') as file:
+            actual_lines = TargetDefinitionLineIterator.make(BlockFileLineIterator.make(file))
+            actual = [line for line in PythonIteratorWrapper.make(actual_lines)]
+        self.assertNotEqual(len(expected), 0)
+        self.assertEqual(actual, expected)
+
+    def test_stops_reading_when_finished(self):
+        file = StringIO('# Pattern-specific Variable Values\n# Files\n\na: b\n# files hash-table stats:\nrest\n')
+        source = BlockFileLineIterator.make(cast(TextIOBase, file))
+        actual = [line.content for line in PythonIteratorWrapper.make(TargetDefinitionLineIterator.make(source))]
+        self.assertEqual(actual, ['', 'a: b'])
+        self.assertIs(source.has_current_item, True)
+        self.assertEqual(source.current_item.content, '# files hash-table stats:')
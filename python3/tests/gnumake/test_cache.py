@@ -0,0 +1,64 @@
+from autorecurse.common.storage import DictionaryDirectoryMapping
+from autorecurse.gnumake.storage import DirectoryEnum, FileStorageEngine
+from autorecurse.gnumake.cache import *
+from autorecurse.gnumake.implementation import GnuMake
+from autorecurse.gnumake.policy import DumpFlagsPolicy
+import os
+import tempfile
+import unittest
+
+
+class TestRelocatableTargetCache(unittest.TestCase):
+
+    FILES = [
+        ('.git/HEAD', ''),
+        ('sub/Makefile', 'include common.mk\nprog: main.o $(CURDIR)/gen.h /usr/include/stdio.h\n\ttouch $@\n'),
+        ('sub/common.mk', 'main.o: ;\n'),
+    ]
+
+    def test_round_trip(self):
+        gnu = GnuMake.make()
+        storage_engine = gnu._storage_engine
+        with tempfile.TemporaryDirectory() as directory:
+            directory = os.path.realpath(directory)
+            mapping = {}
+            mapping[DirectoryEnum.TARGET_LISTING] = os.path.join(directory, 'cache')
+            mapping[DirectoryEnum.SHARED_CACHE] = os.path.join(directory, 'shared')
+            gnu.storage_engine = FileStorageEngine.make(DictionaryDirectoryMapping.make(mapping))
+            try:
+                makefiles = []
+                for checkout in ['a', 'b']:
+                    for path, content in TestRelocatableTargetCache.FILES:
+                        path = os.path.join(directory, checkout, path)
+                        os.makedirs(os.path.dirname(path), exist_ok=True)
+                        with open(path, mode='w') as file:
+                            file.write(content)
+                    makefiles.append(Makefile.make(os.path.join(directory, checkout, 'sub', 'Makefile')))
+                cache = RelocatableTargetCache.make(gnu.storage_engine, gnu.executable_name)
+                policy = DumpFlagsPolicy.make([], False, [])
+                self.assertIsNone(cache.lookup(makefiles[0], policy))
+                gnu.update_target_listing_file(makefiles[0])
+                with gnu._nested_rule_target_reader().target_iterator(makefiles[0]) as targets:
+                    paths = [target.path for target in targets]
+                self.assertIn('prog', paths)
+                self.assertNotIn(RelocatableTargetCache.MAKEFILE_LIST_TARGET, paths)
+                targets = cache.lookup(makefiles[1], policy)
+                self.assertIsNotNone(targets)
+                prog = [target for target in targets if target.path == 'prog'][0]
+                prerequisites = list(prog.prerequisites)
+                self.assertEqual(prerequisites, ['main.o', os.path.join(directory, 'b', 'sub', 'gen.h'), '/usr/include/stdio.h'])
+                self.assertIs(prog.file, makefiles[1])
+                # The same makefile in another directory of a checkout
+                # may read different targets, through $(CURDIR) here.
+                for path, content in TestRelocatableTargetCache.FILES[1:]:
+                    path = os.path.join(directory, 'b', 'other', os.path.basename(path))
+                    os.makedirs(os.path.dirname(path), exist_ok=True)
+                    with open(path, mode='w') as file:
+                        file.write(content)
+                self.assertIsNone(cache.lookup(Makefile.make(os.path.join(directory, 'b', 'other', 'Makefile')), policy))
+                with open(os.path.join(directory, 'b', 'sub', 'common.mk'), mode='a') as file:
+                    file.write('other: ;\n')
+                self.assertIsNone(cache.lookup(makefiles[1], policy))
+                self.assertIsNotNone(cache.lookup(makefiles[0], policy))
+            finally:
+                gnu.storage_engine = storage_engine
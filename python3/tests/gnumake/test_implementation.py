@@ -1,9 +1,15 @@
 from argparse import ArgumentError
 from autorecurse.common.storage import DefaultDirectoryMapping, DictionaryDirectoryMapping
-from autorecurse.gnumake.storage import DirectoryEnum
+from autorecurse.gnumake.storage import DirectoryEnum, FileStorageEngine
 from autorecurse.gnumake.implementation import *
+from typing import List
+import io
 import unittest
+import unittest.mock
 import os
+import signal
+import subprocess
+import tempfile
 
 
 class TestGnuMake(unittest.TestCase):
@@ -51,6 +57,79 @@ class TestGnuMake(unittest.TestCase):
         with self.assertRaises(ArgumentError):
             self.assertEqual(gnu.execution_directory('-f Makefile -np -C'.split()), '/etc/usr')
 
+    def test_goals(self):
+        gnu = GnuMake.make()
+        self.assertEqual(gnu.goals('-C sub -f Makefile -j 4 -k all CFLAGS=-O2 install'.split()), ['all', 'install'])
+        self.assertEqual(gnu.goals('-j all --eval x:=1 -- -weird'.split()), ['all', '-weird'])
+        self.assertEqual(gnu.goals('-np'.split()), [])
+
+    def test_goal_rule_file(self):
+        gnu = GnuMake.make()
+        storage_engine = gnu.storage_engine
+        with tempfile.TemporaryDirectory() as directory:
+            directory = os.path.realpath(directory)
+            mapping = DictionaryDirectoryMapping.make({DirectoryEnum.TARGET_LISTING: os.path.join(directory, 'cache')})
+            gnu.storage_engine = FileStorageEngine.make(mapping)
+            try:
+                tree = os.path.join(directory, 'tree')
+                for path, content in [('Makefile', 'all: ;\n'), ('a/Makefile', 'lib.a: ../b/libb.a /usr/include/stdio.h\n\ttouch $@\n'), ('b/Makefile', 'libb.a: ;\n'), ('c/Makefile', 'libc.a: ;\n')]:
+                    os.makedirs(os.path.dirname(os.path.join(tree, path)), exist_ok=True)
+                    with open(os.path.join(tree, path), mode='w') as file:
+                        file.write(content)
+                file = io.StringIO()
+                self.assertIs(gnu.update_goal_rule_file(file, tree, ['a/lib.a']), True)
+                self.assertIn('a/lib.a: b/libb.a ', file.getvalue())
+                self.assertIn('b/libb.a:', file.getvalue())
+                self.assertNotIn('libc.a', file.getvalue())
+                self.assertEqual(len([name for name in os.listdir(os.path.join(directory, 'cache')) if name.endswith('.makefile')]), 2)
+                self.assertIs(gnu.update_goal_rule_file(io.StringIO(), tree, ['all']), False)
+            finally:
+                gnu.storage_engine = storage_engine
+
+    def test_persistent_nested_update_file(self):
+        gnu = GnuMake.make()
+        storage_engine = gnu.storage_engine
+        with tempfile.TemporaryDirectory() as directory:
+            directory = os.path.realpath(directory)
+            mapping = {}
+            mapping[DirectoryEnum.NESTED_RULE] = os.path.join(directory, 'cache')
+            mapping[DirectoryEnum.TARGET_LISTING] = os.path.join(directory, 'cache')
+            gnu.storage_engine = FileStorageEngine.make(DictionaryDirectoryMapping.make(mapping))
+            try:
+                tree = os.path.join(directory, 'tree')
+                for path in ['Makefile', 'a/Makefile']:
+                    os.makedirs(os.path.dirname(os.path.join(tree, path)), exist_ok=True)
+                    with open(os.path.join(tree, path), mode='w') as file:
+                        file.write('all: ;\n')
+                path = gnu.nested_update_file_path(tree)
+                gnu.update_persistent_nested_update_file(tree)
+                with open(path) as file:
+                    content = file.read()
+                self.assertIn('autorecurse targetlisting a Makefile', content)
+                stat = os.stat(path)
+                gnu.update_persistent_nested_update_file(tree)
+                self.assertEqual(os.stat(path).st_ino, stat.st_ino)
+                self.assertEqual(os.stat(path).st_mtime_ns, stat.st_mtime_ns)
+                os.makedirs(os.path.join(tree, 'b'))
+                with open(os.path.join(tree, 'b', 'Makefile'), mode='w') as file:
+                    file.write('all: ;\n')
+                gnu.update_persistent_nested_update_file(tree)
+                with open(path) as file:
+                    self.assertIn('autorecurse targetlisting b Makefile', file.read())
+                walk = os.walk
+                def sorted_walk(top, reverse):
+                    for dirpath, dirnames, filenames in walk(top):
+                        dirnames.sort(reverse=reverse)
+                        yield dirpath, dirnames, filenames
+                with unittest.mock.patch('os.walk', lambda top: sorted_walk(top, False)):
+                    gnu.update_persistent_nested_update_file(tree)
+                stat = os.stat(path)
+                with unittest.mock.patch('os.walk', lambda top: sorted_walk(top, True)):
+                    gnu.update_persistent_nested_update_file(tree)
+                self.assertEqual(os.stat(path).st_ino, stat.st_ino)
+            finally:
+                gnu.storage_engine = storage_engine
+
     @unittest.skip('Writes files to user\'s home directory')
     def test_target_listing_file(self):
         makefile_path = os.path.join(TestGnuMake.CWD, 'tests/data/gnumake/project/Makefile')
@@ -73,9 +152,66 @@ class TestGnuMake(unittest.TestCase):
         execution_directory = os.path.join(TestGnuMake.CWD, 'tests/data/gnumake/nested-projects')
         gnu.update_nested_rule_file(execution_directory)
 
+    def test_print_nested_rules(self):
+        gnu = GnuMake.make()
+        makefile = Makefile.make_with_exec_path('/work/sub', 'Makefile')
+        targets = []
+        for path, prerequisites in [('a.o', ['a.c']), ('b.o', ['b.c']), ('c.o', ['a.c']), ('../d', [])]:
+            target = Target.make(prerequisites, [], ['touch $@'])
+            target.path = path
+            target.file = makefile
+            targets.append(target)
+        file = io.StringIO()
+        gnu.print_nested_rules(makefile, ListIterator.make(targets), '/work', 'recipe', file)
+        self.assertEqual(file.getvalue(), (
+            'd:\n\t@$(MAKE) --no-print-directory -C sub -f Makefile ../d\n\n'
+            'recipe = --no-print-directory -C sub -f Makefile $(@:sub/%=%)\n\n'
+            'sub/a.o sub/c.o: sub/a.c\n\t@$(MAKE) $(recipe)\n\n'
+            'sub/b.o: sub/b.c\n\t@$(MAKE) $(recipe)\n\n'
+            ))
+
+    def test_nested_rules_same_as_literal_targets(self):
+        gnu = GnuMake.make()
+        with tempfile.TemporaryDirectory() as directory:
+            os.mkdir(os.path.join(directory, 'sub'))
+            with open(os.path.join(directory, 'sub', 'Makefile'), mode='w') as file:
+                file.write('a.o b.o:\n\t@echo $@\n')
+            makefile = Makefile.make_with_exec_path(os.path.join(directory, 'sub'), 'Makefile')
+            targets = []
+            for path in ['a.o', 'b.o']:
+                target = Target.make([], [], [])
+                target.path = path
+                target.file = makefile
+                targets.append(target)
+            with open(os.path.join(directory, 'literal.mk'), mode='w') as file:
+                for target in targets:
+                    DefaultTargetFormatter.make().print(gnu.target_to_literal_target(target, directory), file)
+            with open(os.path.join(directory, 'compact.mk'), mode='w') as file:
+                gnu.print_nested_rules(makefile, ListIterator.make(targets), directory, 'recipe', file)
+            for path in ['sub/a.o', 'sub/b.o']:
+                literal = subprocess.run(['make', '-f', 'literal.mk', path], cwd=directory, stdout=subprocess.PIPE, check=True)
+                compact = subprocess.run(['make', '-f', 'compact.mk', path], cwd=directory, stdout=subprocess.PIPE, check=True)
+                self.assertEqual(compact.stdout, literal.stdout)
+                self.assertEqual(compact.stdout.decode().strip(), os.path.basename(path))
+
 
 class TestTargetListingTargetReader(unittest.TestCase):
 
+    def test_stops_make_early(self):
+        target_reader = TargetListingTargetReader.make('make')
+        with tempfile.TemporaryDirectory() as directory:
+            # The vpath search paths are printed after the target
+            # definitions, and fill more than a pipe buffer.
+            with open(os.path.join(directory, 'Makefile'), mode='w') as file:
+                file.write('all: ;\n')
+                for index in range(3000):
+                    file.write('vpath %.x{0} /some/long/directory/name/number/{0}\n'.format(index))
+            context = target_reader.target_iterator(Makefile.make(os.path.join(directory, 'Makefile')))
+            with context as targets:
+                paths = [target.path for target in PythonIteratorWrapper.make(targets)]
+            self.assertEqual(paths, ['all'])
+            self.assertEqual(context._process.returncode, -signal.SIGPIPE)
+
     def test_target_iterator(self):
         target_reader = TargetListingTargetReader.make('make')
         makefile = Makefile.make('tests/data/gnumake/project/Makefile')
@@ -182,6 +318,53 @@ class TestTargetListingTargetReader(unittest.TestCase):
             self.assertIs(target_iterator.is_at_end, True)
 
 
+class TestCheckedTargetReader(unittest.TestCase):
+
+    CWD = os.path.realpath(os.getcwd())
+
+    def test_flags_kept_when_targets_match(self):
+        makefile = Makefile.make_with_exec_path(os.path.join(TestCheckedTargetReader.CWD, 'tests/data/gnumake/project'), 'Makefile')
+        self.assertEqual(self._read_target_paths(makefile), ['all', 'objdir', 'objdir/bar.o', 'objdir/baz.o', 'objdir/foo.o'])
+
+    def test_flags_dropped_when_targets_differ(self):
+        makefile = Makefile.make_with_exec_path(os.path.join(TestCheckedTargetReader.CWD, 'tests/data/gnumake/builtin-rules'), 'Makefile')
+        stderr = sys.stderr
+        sys.stderr = io.StringIO()
+        try:
+            self.assertEqual(self._read_target_paths(makefile), ['main.o', 'program'])
+            self.assertIn(makefile.path, sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
+    def test_unchecked_flags(self):
+        makefile = Makefile.make_with_exec_path(os.path.join(TestCheckedTargetReader.CWD, 'tests/data/gnumake/builtin-rules'), 'Makefile')
+        self.assertEqual(self._read_target_paths(makefile, False), ['program'])
+
+    def test_cached_verdict(self):
+        makefile = Makefile.make_with_exec_path(os.path.join(TestCheckedTargetReader.CWD, 'tests/data/gnumake/builtin-rules'), 'Makefile')
+        with tempfile.TemporaryDirectory() as directory:
+            mapping = DictionaryDirectoryMapping.make({DirectoryEnum.TARGET_LISTING: directory})
+            cache = DumpFlagsCheckCache.make(FileStorageEngine.make(mapping), 'make')
+            stderr = sys.stderr
+            sys.stderr = io.StringIO()
+            try:
+                self.assertEqual(self._read_target_paths(makefile, True, cache), ['main.o', 'program'])
+                self.assertIs(cache.lookup(makefile, ['-r']), False)
+                self.assertIs(cache.lookup(makefile, ['-R']), None)
+                sys.stderr = io.StringIO()
+                self.assertEqual(self._read_target_paths(makefile, True, cache), ['main.o', 'program'])
+                self.assertNotIn(makefile.path, sys.stderr.getvalue())
+            finally:
+                sys.stderr = stderr
+
+    def _read_target_paths(self, makefile: Makefile, check: bool = True, cache: DumpFlagsCheckCache = None) -> List[str]:
+        target_reader = TargetListingTargetReader.make('make')
+        target_reader.dump_flags_policy = DumpFlagsPolicy.make(['-r'], check, [])
+        target_reader.dump_flags_check_cache = cache
+        with target_reader.target_iterator(makefile) as targets:
+            return sorted(target.path for target in PythonIteratorWrapper.make(targets))
+
+
 class TestNestedMakefileLocator(unittest.TestCase):
 
     CWD = os.path.realpath(os.getcwd())
@@ -213,4 +396,25 @@ class TestNestedMakefileLocator(unittest.TestCase):
             it.move_to_next()
             self.assertIs(it.is_at_end, True)
 
+    def test_prune_policy(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for path in ['a', 'a/b', 'a/b/c', 'a/node_modules', 'a/build', 'a/keep', 'd', 'd/vendor', 'd/vendor/x']:
+                os.makedirs(os.path.join(directory, path))
+                with open(os.path.join(directory, path, 'Makefile'), mode='w') as file:
+                    pass
+            with open(os.path.join(directory, 'Makefile'), mode='w') as file:
+                pass
+            with open(os.path.join(directory, 'a', '.gitignore'), mode='w') as file:
+                file.write('# comment\n/b/c\nbuild/\nkee*\n!keep\n')
+            locator = NestedMakefileLocator.make()
+            locator.set_filename_priorities(['Makefile'])
+            locator.prune_policy = NestedMakefilePrunePolicy.make(['node_modules', 'd/vendor'], None, ['.gitignore'])
+            self.assertEqual(self._relative_paths(locator, directory), ['a', 'a/b', 'a/keep', 'd'])
+            locator.prune_policy = NestedMakefilePrunePolicy.make([], 2, [])
+            self.assertEqual(self._relative_paths(locator, directory), ['a', 'a/b', 'a/build', 'a/keep', 'a/node_modules', 'd', 'd/vendor'])
+
+    def _relative_paths(self, locator: NestedMakefileLocator, directory: str) -> List[str]:
+        with locator.makefile_iterator(directory) as makefiles:
+            return sorted(os.path.relpath(makefile.exec_path, os.path.realpath(directory)) for makefile in makefiles)
+
 
@@ -1,8 +1,18 @@
 from autorecurse.gnumake.parse import *
 from antlr4.InputStream import InputStream
 from antlr4 import CommonTokenStream
+from antlr4.dfa.DFA import DFA
+from antlr4.ParserRuleContext import ParserRuleContext
+from autorecurse.common.storage import DictionaryDirectoryMapping
+from autorecurse.gnumake.storage import DirectoryEnum, FileStorageEngine
+from autorecurse.lib.antlr4.stream import IteratorToTokenStreamAdapter, TokenSourceToIteratorAdapter
+from autorecurse.lib.iterator import PythonIteratorWrapper
+from io import BytesIO
+from typing import List
 import unittest
 import os
+import subprocess
+import tempfile
 
 
 class TestParseContextTargetBuilder(unittest.TestCase):
@@ -129,3 +139,194 @@ a b c: d | e"""
         self.assertIs(it.is_at_end, True)
 
 
+
+class TestTreelessMakefileRuleParserToIteratorAdapter(unittest.TestCase):
+
+    RULES = """a b c: d | e
+\tfirst line
+\tsecond line
+
+x:
+
+y: z
+"""
+
+    def test_same_targets_as_parse_tree(self):
+        expected = [self._to_tuple(target) for target in self._make_targets(MakefileRuleParserToIteratorAdapter)]
+        actual = [self._to_tuple(target) for target in self._make_targets(TreelessMakefileRuleParserToIteratorAdapter)]
+        self.assertEqual(actual, expected)
+        self.assertEqual([item[0] for item in actual], ['a', 'b', 'c', 'x', 'y'])
+        self.assertEqual(actual[0][3], ['first line', 'second line'])
+
+    def test_rule_lists_are_shared(self):
+        targets = self._make_targets(TreelessMakefileRuleParserToIteratorAdapter)
+        self.assertIs(targets[0]._prerequisites, targets[2]._prerequisites)
+        self.assertIs(targets[0]._recipe_lines, targets[1]._recipe_lines)
+        self.assertIsNot(targets[0]._prerequisites, targets[3]._prerequisites)
+
+    def test_no_parse_tree(self):
+        lexer = MakefileRuleLexer(InputStream(TestTreelessMakefileRuleParserToIteratorAdapter.RULES))
+        parser = MakefileRuleParser(CommonTokenStream(lexer))
+        declaration_parser = DeclarationParser.make(parser)
+        self.assertEqual(parser.getParseListeners(), [])
+        nodes = []
+        original_add_token_node = ParserRuleContext.addTokenNode
+        try:
+            ParserRuleContext.addTokenNode = lambda context, token: nodes.append(token)
+            self.assertIs(declaration_parser.parse_next(), True)
+        finally:
+            ParserRuleContext.addTokenNode = original_add_token_node
+        self.assertEqual(nodes, [])
+        self.assertEqual(declaration_parser.builder.target_count, 3)
+
+    def test_stops_at_invalid_declaration(self):
+        lexer = MakefileRuleLexer(InputStream('a: b\nc d\ne: f\n'))
+        token_stream = IteratorToTokenStreamAdapter.make(TokenSourceToIteratorAdapter.make(lexer))
+        parser = MakefileRuleParser(token_stream)
+        parser.removeErrorListeners()
+        adapter = TreelessMakefileRuleParserToIteratorAdapter.make(parser)
+        self.assertEqual([target.path for target in PythonIteratorWrapper.make(adapter)], ['a'])
+
+    def _make_targets(self, adapter_class) -> List[Target]:
+        lexer = MakefileRuleLexer(InputStream(TestTreelessMakefileRuleParserToIteratorAdapter.RULES))
+        parser = MakefileRuleParser(CommonTokenStream(lexer))
+        adapter = adapter_class.make(parser)
+        return list(PythonIteratorWrapper.make(adapter))
+
+    def _to_tuple(self, target: Target):
+        return (target.path, list(target.prerequisites), list(target.order_only_prerequisites), list(target.recipe_lines))
+
+
+class TestParsePipelineFactory(unittest.TestCase):
+
+    DATABASE_PATH = 'tests/data/gnumake/database/project.txt'
+
+    EXPECTED_TARGETS = [
+            ('objdir/bar.o', ['src/bar.c'], ['objdir'], ['touch $@']),
+            ('objdir/foo.o', ['src/foo.c'], ['objdir'], ['touch $@']),
+            ('all', ['objdir/foo.o', 'objdir/bar.o', 'objdir/baz.o'], [], []),
+            ('objdir/baz.o', ['src/baz.c'], ['objdir'], ['touch $@']),
+            ('objdir', [], [], ['mkdir $(OBJDIR)'])
+            ]
+
+    def test_buffered(self):
+        self._assert_pipeline_targets(BufferedParsePipelineFactory.make())
+
+    def test_balanced(self):
+        self._assert_pipeline_targets(BalancedParsePipelineFactory.make())
+
+    def test_streaming(self):
+        self._assert_pipeline_targets(StreamingParsePipelineFactory.make())
+
+    def test_generator(self):
+        self._assert_pipeline_targets(GeneratorParsePipelineFactory.make())
+
+    def test_binary(self):
+        makefile = Makefile.make('Makefile')
+        with open(TestParsePipelineFactory.DATABASE_PATH, 'rb') as file:
+            targets = BalancedParsePipelineFactory.make().build_binary_parse_pipeline(file, makefile, 'utf-8')
+            self._assert_targets(targets, makefile)
+
+    def test_spooled(self):
+        makefile = Makefile.make('Makefile')
+        with tempfile.TemporaryDirectory() as directory:
+            mapping = DictionaryDirectoryMapping.make({DirectoryEnum.TMP: os.path.join(directory, 'tmp')})
+            factory = SpooledParsePipelineFactory.make(FileStorageEngine.make(mapping))
+            with open(TestParsePipelineFactory.DATABASE_PATH, 'rb') as file:
+                self._assert_targets(factory.build_binary_parse_pipeline(file, makefile, 'utf-8'), makefile)
+            self._assert_pipeline_targets(factory)
+            self.assertEqual(os.listdir(os.path.join(directory, 'tmp')), [])
+            targets = factory.build_parse_pipeline(cast(TextIOBase, StringIO('')), makefile)
+            self.assertEqual(list(PythonIteratorWrapper.make(targets)), [])
+
+    def test_spooled_close(self):
+        makefile = Makefile.make('Makefile')
+        with tempfile.TemporaryDirectory() as directory:
+            mapping = DictionaryDirectoryMapping.make({DirectoryEnum.TMP: os.path.join(directory, 'tmp')})
+            factory = SpooledParsePipelineFactory.make(FileStorageEngine.make(mapping))
+            with open(TestParsePipelineFactory.DATABASE_PATH, 'rb') as file:
+                targets = factory.build_binary_parse_pipeline(file, makefile, 'utf-8')
+                self.assertEqual(len(os.listdir(os.path.join(directory, 'tmp'))), 1)
+                targets.move_to_next()
+                factory.close_parse_pipeline(targets)
+                self.assertEqual(os.listdir(os.path.join(directory, 'tmp')), [])
+                factory.close_parse_pipeline(targets)
+
+    def test_spooled_stops_copying(self):
+        makefile = Makefile.make('Makefile')
+        with tempfile.TemporaryDirectory() as directory:
+            mapping = DictionaryDirectoryMapping.make({DirectoryEnum.TMP: os.path.join(directory, 'tmp')})
+            factory = SpooledParsePipelineFactory.make(FileStorageEngine.make(mapping))
+            with open(TestParsePipelineFactory.DATABASE_PATH, encoding='utf-8') as file:
+                database = file.read()
+            rest = '\n' * (3 * SpooledParsePipelineFactory.SPOOL_BLOCK_SIZE)
+            source = StringIO(database + rest)
+            self._assert_targets(factory.build_parse_pipeline(cast(TextIOBase, source), makefile), makefile)
+            self.assertLess(source.tell(), len(database) + 2 * SpooledParsePipelineFactory.SPOOL_BLOCK_SIZE)
+
+    def test_spooled_end_marker_in_variable(self):
+        makefile = Makefile.make('Makefile')
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'Makefile'), mode='w') as file:
+                file.write('define X\nfirst\n# files hash-table stats:\nendef\nall: foo\nfoo:\n')
+            database = subprocess.run(['make', '-np', '-f', 'Makefile'], cwd=directory, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL).stdout
+            mapping = DictionaryDirectoryMapping.make({DirectoryEnum.TMP: os.path.join(directory, 'tmp')})
+            spooled = SpooledParsePipelineFactory.make(FileStorageEngine.make(mapping))
+            for factory in [BufferedParsePipelineFactory.make(), spooled]:
+                targets = factory.build_binary_parse_pipeline(BytesIO(database), makefile, 'utf-8')
+                self.assertEqual([target.path for target in PythonIteratorWrapper.make(targets)], ['all', 'foo'])
+
+    def _assert_pipeline_targets(self, factory: ParsePipelineFactory) -> None:
+        makefile = Makefile.make('Makefile')
+        with open(TestParsePipelineFactory.DATABASE_PATH, encoding='utf-8') as file:
+            self._assert_targets(factory.build_parse_pipeline(file, makefile), makefile)
+
+    def _assert_targets(self, targets: Iterator[Target], makefile: Makefile) -> None:
+        actual = []
+        for target in targets:
+            self.assertIs(target.file, makefile)
+            actual.append((target.path, list(target.prerequisites), list(target.order_only_prerequisites), list(target.recipe_lines)))
+        self.assertEqual(actual, TestParsePipelineFactory.EXPECTED_TARGETS)
+
+
+class TestGrammarDfaCache(unittest.TestCase):
+
+    RECOGNIZER_CLASSES = [TargetParagraphLexer, MakefileRuleLexer, MakefileRuleParser]
+
+    def setUp(self):
+        self._saved_dfas = [list(item.decisionsToDFA) for item in TestGrammarDfaCache.RECOGNIZER_CLASSES]
+        for item in TestGrammarDfaCache.RECOGNIZER_CLASSES:
+            item.decisionsToDFA[:] = [DFA(state, index) for index, state in enumerate(item.atn.decisionToState)]
+
+    def tearDown(self):
+        for item, dfas in zip(TestGrammarDfaCache.RECOGNIZER_CLASSES, self._saved_dfas):
+            item.decisionsToDFA[:] = dfas
+
+    def test_save_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            mapping = DictionaryDirectoryMapping.make({DirectoryEnum.DFA_CACHE: os.path.join(directory, 'cache')})
+            storage_engine = FileStorageEngine.make(mapping)
+            cache = GrammarDfaCache.make(storage_engine)
+            cache.load()
+            with open(TestParsePipelineFactory.DATABASE_PATH, encoding='utf-8') as file:
+                for target in BalancedParsePipelineFactory.make().build_parse_pipeline(file, Makefile.make('Makefile')):
+                    pass
+            cache.save()
+            cache.save()
+            self.assertEqual(len(os.listdir(os.path.join(directory, 'cache'))), 1)
+            cache = GrammarDfaCache.make(storage_engine)
+            cache.load()
+            self.assertEqual(cache._loaded_state_count, cache._snapshot.state_count)
+            self.assertNotEqual(cache._loaded_state_count, 0)
+
+    def test_unreadable_cache_file(self):
+        with tempfile.TemporaryDirectory() as directory:
+            mapping = DictionaryDirectoryMapping.make({DirectoryEnum.DFA_CACHE: directory})
+            storage_engine = FileStorageEngine.make(mapping)
+            cache = GrammarDfaCache.make(storage_engine)
+            with open(storage_engine.dfa_cache_file_path(cache._snapshot.cache_key), mode='wb') as file:
+                file.write(b'not a snapshot')
+            state_count = cache._snapshot.state_count
+            cache.load()
+            self.assertEqual(cache._snapshot.state_count, state_count)
+
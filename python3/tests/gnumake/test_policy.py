@@ -0,0 +1,25 @@
+from autorecurse.gnumake.data import Makefile
+from autorecurse.gnumake.policy import *
+import unittest
+
+
+class TestDumpFlagsPolicy(unittest.TestCase):
+
+    def test_flags_for(self):
+        policy = DumpFlagsPolicy.make(['-r', '-R'], False, ['*/legacy/Makefile'])
+        self.assertEqual(policy.flags_for(Makefile.make_with_exec_path('/src/app', 'Makefile')), ['-r', '-R'])
+        self.assertEqual(policy.flags_for(Makefile.make_with_exec_path('/src/legacy', 'Makefile')), [])
+
+
+class TestNestedMakefilePrunePolicy(unittest.TestCase):
+
+    def test_prune_policy_patterns(self):
+        policy = NestedMakefilePrunePolicy.make(['*.egg-info', 'out?', 'third_party/**/gen', '[!a]x'], None, [])
+        self.assertIs(policy.is_excluded('foo.egg-info', 'src/foo.egg-info'), True)
+        self.assertIs(policy.is_excluded('out1', 'out1'), True)
+        self.assertIs(policy.is_excluded('out12', 'out12'), False)
+        self.assertIs(policy.is_excluded('gen', 'third_party/gen'), True)
+        self.assertIs(policy.is_excluded('gen', 'third_party/a/b/gen'), True)
+        self.assertIs(policy.is_excluded('gen', 'src/gen'), False)
+        self.assertIs(policy.is_excluded('bx', 'bx'), True)
+        self.assertIs(policy.is_excluded('ax', 'ax'), False)
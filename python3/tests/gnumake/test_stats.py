@@ -0,0 +1,82 @@
+from autorecurse.gnumake.stats import *
+import io
+import json
+import unittest
+
+
+class TestDatabaseStatisticsReader(unittest.TestCase):
+
+    DATABASE = b''.join([
+        b'make: Nothing to be done.\n',
+        b'# Make data base, printed on Mon Jan  1 00:00:00 2024\n',
+        b'# Pattern-specific Variable Values\n',
+        b'\n',
+        b'# Files\n',
+        b'\n',
+        b'# Not a target:\n',
+        b'all: prog\n',
+        b'#  Implicit rule search has not been done.\n',
+        b'\n',
+        b'prog: main.o\n',
+        b'\ttouch $@\n',
+        b'\n',
+        b'# files hash-table stats:\n',
+        b'# finished Make data base',
+    ])
+
+    def test_counts(self):
+        statistics = MakefileStatistics.make('Makefile', 'target listing')
+        reader = DatabaseStatisticsReader.make(io.BytesIO(TestDatabaseStatisticsReader.DATABASE), statistics)
+        self.assertEqual(reader.read(20), TestDatabaseStatisticsReader.DATABASE[:20])
+        reader.drain()
+        self.assertEqual(statistics.output_bytes, len(TestDatabaseStatisticsReader.DATABASE))
+        self.assertEqual(statistics.output_lines, 15)
+        dropped = sum(statistics.dropped_lines.values())
+        self.assertGreater(statistics.dropped_lines['DatabaseSectionFilter'], 0)
+        self.assertGreater(statistics.kept_lines, 0)
+        self.assertEqual(dropped + statistics.kept_lines, statistics.output_lines)
+        self.assertGreater(reader.counting_time, 0.0)
+
+
+class TestMakefileStatistics(unittest.TestCase):
+
+    def test_dict_round_trip(self):
+        statistics = MakefileStatistics.make('Makefile', 'nested rules')
+        statistics.make_time = 1.5
+        statistics.output_lines = 7
+        statistics.add_dropped_lines('FileSectionFilter', 3)
+        statistics.cache_misses = 1
+        value = statistics.to_dict()
+        statistics.add_dropped_lines('FileSectionFilter', 1)
+        self.assertEqual(value['dropped_lines']['FileSectionFilter'], 3)
+        copy = MakefileStatistics.make_from_dict(json.loads(json.dumps(value)))
+        self.assertEqual(copy.to_dict(), value)
+        self.assertEqual(copy.makefile, 'Makefile')
+        self.assertEqual(copy.phase, 'nested rules')
+
+
+class TestStatisticsReport(unittest.TestCase):
+
+    def test_aggregation(self):
+        statistics = []
+        for makefile, phase, make_time in [('a', 'target listing', 1.0), ('b', 'target listing', 3.0), ('a', 'nested rules', 2.5)]:
+            item = MakefileStatistics.make(makefile, phase)
+            item.make_time = make_time
+            item.targets = 2
+            statistics.append(item)
+        recorder = StatisticsRecorder.make()
+        for item in statistics:
+            recorder.record(item)
+        recorder.record_cache_lookup('b', True)
+        report = StatisticsReport.make(recorder.statistics)
+        self.assertEqual([item.makefile for item in report.makefiles], ['a', 'b'])
+        self.assertEqual(report.makefiles[0].make_time, 3.5)
+        self.assertEqual(report.makefiles[1].cache_hits, 1)
+        output = io.StringIO()
+        report.print(StatisticsReportFormatEnum.JSON, output)
+        value = json.loads(output.getvalue())
+        self.assertEqual(value['total']['targets'], 6)
+        self.assertEqual(value['total']['cache_hits'], 1)
+        output = io.StringIO()
+        report.print(StatisticsReportFormatEnum.TABLE, output)
+        self.assertEqual(len(output.getvalue().splitlines()), 4)
@@ -0,0 +1,66 @@
+from autorecurse.lib.antlr4.cache import *
+from autorecurse.gnumake.grammar import MakefileRuleLexer, TargetParagraphLexer
+from antlr4 import InputStream
+from antlr4.dfa.DFA import DFA
+from io import BytesIO
+import os
+import pickle
+import unittest
+
+
+class TestDfaSnapshot(unittest.TestCase):
+
+    RULES = 'a b: c | d\n\trecipe\\\n\tcontinued\nx: ; y\n'
+
+    def setUp(self):
+        self._saved_dfas = list(MakefileRuleLexer.decisionsToDFA)
+
+    def tearDown(self):
+        MakefileRuleLexer.decisionsToDFA[:] = self._saved_dfas
+
+    def test_round_trip(self):
+        expected = self._lex()
+        snapshot = DfaSnapshot.make([MakefileRuleLexer])
+        state_count = snapshot.state_count
+        self.assertNotEqual(state_count, 0)
+        file = BytesIO()
+        snapshot.save(file)
+        self._clear_dfas()
+        self.assertEqual(snapshot.state_count, 0)
+        file.seek(0)
+        snapshot.load(file)
+        self.assertEqual(snapshot.state_count, state_count)
+        for dfa in MakefileRuleLexer.decisionsToDFA:
+            self.assertIs(dfa.atnStartState, MakefileRuleLexer.atn.decisionToState[dfa.decision])
+        self.assertEqual(self._lex(), expected)
+        self.assertEqual(snapshot.state_count, state_count)
+
+    def test_mismatched_snapshot(self):
+        self._lex()
+        file = BytesIO()
+        DfaSnapshot.make([MakefileRuleLexer]).save(file)
+        file.seek(0)
+        with self.assertRaises(Exception):
+            DfaSnapshot.make([MakefileRuleLexer, TargetParagraphLexer]).load(file)
+        self.assertIs(MakefileRuleLexer.decisionsToDFA[0], self._saved_dfas[0])
+
+    def test_disallowed_class(self):
+        file = BytesIO()
+        pickle.dump([[os.system]], file)
+        file.seek(0)
+        with self.assertRaises(pickle.UnpicklingError):
+            DfaSnapshot.make([MakefileRuleLexer]).load(file)
+        self.assertIs(MakefileRuleLexer.decisionsToDFA[0], self._saved_dfas[0])
+
+    def test_cache_key(self):
+        key = DfaSnapshot.make([MakefileRuleLexer]).cache_key
+        self.assertEqual(DfaSnapshot.make([MakefileRuleLexer]).cache_key, key)
+        self.assertNotEqual(DfaSnapshot.make([TargetParagraphLexer]).cache_key, key)
+
+    def _lex(self):
+        lexer = MakefileRuleLexer(InputStream(TestDfaSnapshot.RULES))
+        return [(token.type, token.text) for token in lexer.getAllTokens()]
+
+    def _clear_dfas(self):
+        atn = MakefileRuleLexer.atn
+        MakefileRuleLexer.decisionsToDFA[:] = [DFA(state, index) for index, state in enumerate(atn.decisionToState)]
@@ -0,0 +1,12 @@
+from autorecurse.lib.antlr4.custom import *
+import unittest
+
+
+class TestSlottedToken(unittest.TestCase):
+
+    def test_no_instance_dictionary(self):
+        token = CustomTokenFactory.make().createThin(1, 'text')
+        self.assertFalse(hasattr(token, '__dict__'))
+        self.assertEqual(token.text, 'text')
+        clone = token.clone()
+        self.assertEqual((clone.type, clone.text, clone.tokenIndex), (1, 'text', -1))
@@ -0,0 +1,159 @@
+from autorecurse.lib.antlr4.stream import *
+from antlr4.Token import CommonToken
+from autorecurse.lib.iterator import ListIterator
+from autorecurse.lib.buffer import StringBuffer
+from autorecurse.lib.line import Line
+from typing import List
+import unittest
+
+
+class TestIteratorToCharStreamAdapter(unittest.TestCase):
+
+    def test_lookahead(self):
+        stream = IteratorToCharStreamAdapter.make(StringBuffer.make('abc'))
+        self.assertEqual(stream.index, 0)
+        self.assertEqual(stream.size, 1)
+        self.assertEqual(stream.LA(1), ord('a'))
+        self.assertEqual(stream.LA(3), ord('c'))
+        self.assertEqual(stream.LA(4), IntStream.EOF)
+        self.assertEqual(stream.index, 0)
+        self.assertEqual(stream.size, 3)
+        self.assertEqual(stream._buffer._ref_token_dict, {})
+        stream.consume()
+        self.assertEqual(stream.LA(-1), ord('a'))
+        self.assertEqual(stream.LA(2), ord('c'))
+        stream.consume()
+        stream.consume()
+        self.assertEqual(stream.LA(1), IntStream.EOF)
+        self.assertEqual(stream.LA(-1), ord('c'))
+
+    def test_released_index(self):
+        stream = IteratorToCharStreamAdapter.make(StringBuffer.make('abc'))
+        stream.consume()
+        stream.consume()
+        with self.assertRaises(Exception):
+            stream.LA(-2)
+
+    def test_get_text(self):
+        stream = IteratorToCharStreamAdapter.make(StringBuffer.make('abcd'))
+        marker = stream.mark()
+        stream.consume()
+        self.assertEqual(stream.getText(0, 2), 'abc')
+        self.assertEqual(stream.getText(1, 0), '')
+        self.assertEqual(stream.index, 1)
+        with self.assertRaises(Exception):
+            stream.getText(2, 4)
+        stream.release(marker)
+
+    def test_empty(self):
+        stream = IteratorToCharStreamAdapter.make(StringBuffer.make(''))
+        self.assertEqual(stream.LA(1), IntStream.EOF)
+        self.assertEqual(stream.index, 0)
+        self.assertEqual(stream.getText(0, -1), '')
+
+
+class TestTokenToCharStreamAdapter(unittest.TestCase):
+
+    @staticmethod
+    def make_stream(texts: List[str]) -> TokenToCharStreamAdapter:
+        tokens = [CommonToken(type=1) for text in texts]
+        for token, text in zip(tokens, texts):
+            token.text = text
+        tokens.append(CommonToken(type=Token.EOF))
+        return TokenToCharStreamAdapter.make(ListIterator.make(tokens))
+
+    def test_lookahead_across_segments(self):
+        stream = TestTokenToCharStreamAdapter.make_stream(['ab', '', 'c', 'de'])
+        self.assertEqual(stream.size, 0)
+        self.assertEqual(stream.LA(1), ord('a'))
+        self.assertEqual(stream.LA(3), ord('c'))
+        self.assertEqual(stream.LA(5), ord('e'))
+        self.assertEqual(stream.LA(6), IntStream.EOF)
+        self.assertEqual(stream.size, 5)
+        stream.consume()
+        stream.consume()
+        self.assertEqual(stream.LA(1), ord('c'))
+        self.assertEqual(stream.LA(-1), ord('b'))
+        stream.consume()
+        stream.consume()
+        stream.consume()
+        self.assertEqual(stream.index, 5)
+        self.assertEqual(stream.LA(1), IntStream.EOF)
+        with self.assertRaises(Exception):
+            stream.consume()
+
+    def test_releases_consumed_segments(self):
+        stream = TestTokenToCharStreamAdapter.make_stream(['ab', 'cd', 'ef'])
+        for index in range(4):
+            stream.consume()
+        self.assertEqual(stream.LA(-1), ord('d'))
+        self.assertEqual(stream.LA(-2), ord('c'))
+        with self.assertRaises(Exception):
+            stream.LA(-3)
+        with self.assertRaises(Exception):
+            stream.seek(1)
+
+    def test_mark_retains_segments(self):
+        stream = TestTokenToCharStreamAdapter.make_stream(['ab', 'cd', 'ef'])
+        stream.consume()
+        marker = stream.mark()
+        for index in range(4):
+            stream.consume()
+        self.assertEqual(stream.getText(1, 4), 'bcde')
+        self.assertEqual(stream.getText(3, 2), '')
+        stream.seek(2)
+        self.assertEqual(stream.LA(1), ord('c'))
+        stream.seek(4)
+        stream.release(marker)
+        with self.assertRaises(Exception):
+            stream.getText(1, 2)
+        with self.assertRaises(Exception):
+            stream.getText(2, 6)
+        stream.seek(10)
+        self.assertEqual(stream.index, 6)
+        self.assertEqual(stream.LA(1), IntStream.EOF)
+
+    def test_empty(self):
+        stream = TestTokenToCharStreamAdapter.make_stream([])
+        self.assertEqual(stream.LA(1), IntStream.EOF)
+        self.assertEqual(stream.index, 0)
+        self.assertEqual(stream.getText(0, -1), '')
+
+
+class TestLineToCharStreamAdapter(unittest.TestCase):
+
+    def test_lines(self):
+        lines = ListIterator.make([Line.make('ab'), Line.make(''), Line.make('c')])
+        stream = LineToCharStreamAdapter.make(lines)
+        actual = []
+        while stream.LA(1) != IntStream.EOF:
+            actual.append(chr(stream.LA(1)))
+            stream.consume()
+        self.assertEqual(''.join(actual), 'ab\n\nc\n')
+        self.assertEqual(stream.getText(4, 5), 'c\n')
+
+    def test_empty(self):
+        stream = LineToCharStreamAdapter.make(ListIterator.make([]))
+        self.assertEqual(stream.LA(1), IntStream.EOF)
+
+
+class TestGeneratorCharStream(unittest.TestCase):
+
+    def test_segments(self):
+        stream = GeneratorCharStream.make(segment for segment in ['ab', '', 'c\n'])
+        actual = []
+        while stream.LA(1) != IntStream.EOF:
+            actual.append(chr(stream.LA(1)))
+            stream.consume()
+        self.assertEqual(''.join(actual), 'abc\n')
+        self.assertEqual(stream.getText(2, 3), 'c\n')
+
+    def test_empty(self):
+        stream = GeneratorCharStream.make(segment for segment in [])
+        self.assertEqual(stream.LA(1), IntStream.EOF)
+
+    def test_token_texts(self):
+        tokens = [CommonToken(type=1), CommonToken(type=1), CommonToken(type=Token.EOF), CommonToken(type=1)]
+        for token, text in zip(tokens, ['ab', '', '<EOF>', 'c']):
+            token.text = text
+        self.assertEqual(list(generate_token_texts(tokens)), ['ab'])
@@ -0,0 +1,88 @@
+from tests.lib.test_iterator import IteratorTests, IteratorTestWrapper
+from autorecurse.lib.fifo import *
+from typing import List
+import unittest
+
+
+class TestGlobalIndexFifoManager(unittest.TestCase):
+
+    @staticmethod
+    def make_iterator_wrapper_content() -> IteratorTestWrapper[str]:
+        expected = ['a', 'b', 'c']
+        actual = GlobalIndexFifoManager.make() # type: GlobalIndexFifoManager[str]
+        for item in expected:
+            actual.push(item)
+        return IteratorTestWrapper.make(actual, expected)
+
+    @staticmethod
+    def make_iterator_wrapper_empty() -> IteratorTestWrapper[str]:
+        expected = [] # type: List[str]
+        actual = GlobalIndexFifoManager.make() # type: GlobalIndexFifoManager[str]
+        return IteratorTestWrapper.make(actual, expected)
+
+    def test_iterator_tests(self):
+        IteratorTests.run_all(TestGlobalIndexFifoManager.make_iterator_wrapper_content)
+        IteratorTests.run_all(TestGlobalIndexFifoManager.make_iterator_wrapper_empty)
+
+    def test_collects_items_before_current_item(self):
+        fifo = GlobalIndexFifoManager.make() # type: GlobalIndexFifoManager[str]
+        fifo.push('a')
+        fifo.move_to_next()
+        fifo.push('b')
+        fifo.move_to_next()
+        self.assertEqual(fifo.count, 2)
+        fifo.push('c')
+        self.assertEqual(fifo.count, 2)
+        self.assertEqual(fifo.current_item, 'b')
+        self.assertEqual(fifo.current_index, 0)
+        self.assertEqual(fifo.current_global_index, 1)
+        self.assertEqual(fifo.lowest_global_index, 1)
+        self.assertEqual(fifo.global_count, 3)
+
+    def test_strong_reference_prevents_collection(self):
+        fifo = GlobalIndexFifoManager.make() # type: GlobalIndexFifoManager[str]
+        fifo.push('a')
+        fifo.move_to_next()
+        ref_token = fifo.new_strong_reference()
+        fifo.push('b')
+        fifo.move_to_next()
+        fifo.push('c')
+        fifo.move_to_next()
+        fifo.push('d')
+        self.assertEqual(fifo.lowest_global_index, 0)
+        self.assertEqual(fifo.item_at_global_index(0), 'a')
+        self.assertEqual(fifo.item_at_global_index(3), 'd')
+        self.assertEqual(fifo.current_global_index, 2)
+        fifo.release_strong_reference(ref_token)
+        fifo.release_strong_reference(ref_token) # Tolerated
+        fifo.collect_garbage()
+        self.assertEqual(fifo.lowest_global_index, 2)
+        self.assertEqual(fifo.count, 2)
+        fifo.move_to_global_index(3)
+        self.assertEqual(fifo.current_item, 'd')
+        self.assertEqual(fifo.current_index, 1)
+
+    def test_collects_all_items_at_end(self):
+        fifo = GlobalIndexFifoManager.make() # type: GlobalIndexFifoManager[str]
+        fifo.push('a')
+        fifo.push('b')
+        fifo.move_to_end()
+        fifo.collect_garbage()
+        self.assertIs(fifo.is_empty, True)
+        self.assertIs(fifo.is_at_end, True)
+        self.assertEqual(fifo.global_count, 2)
+        self.assertEqual(fifo.lowest_global_index, 2)
+
+    def test_compaction_preserves_items(self):
+        fifo = GlobalIndexFifoManager.make() # type: GlobalIndexFifoManager[int]
+        fifo.push(0)
+        fifo.move_to_next()
+        count = 3 * GlobalIndexFifoManager.COMPACTION_THRESHOLD
+        for item in range(1, count):
+            fifo.push(item)
+            fifo.move_to_next()
+            self.assertEqual(fifo.current_item, item)
+            self.assertEqual(fifo.current_global_index, item)
+        self.assertEqual(fifo.count, 2)
+        self.assertEqual(fifo.item_at_global_index(count - 2), count - 2)
+        self.assertEqual(fifo.item_at_global_index(count - 1), count - 1)
@@ -1,6 +1,8 @@
 from autorecurse.lib.file import *
 import os
 import shutil
+import tempfile
+import threading
 import unittest
 
 
@@ -84,3 +86,67 @@ class TestFileLifetimeManager(unittest.TestCase):
         return file_creator
 
 
+class TestSingleFlightLock(unittest.TestCase):
+
+    def test_waiting_process_reuses_update(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'entry')
+            first = SingleFlightLock.make(path)
+            results = []
+            with first:
+                self.assertIs(first.is_updated_by_other_process, False)
+                waiter = threading.Thread(target=self._enter, args=(path, results))
+                waiter.start()
+                waiter.join(0.2)
+                self.assertEqual(results, [])
+                with FileReplacement.make(path) as replacement:
+                    with replacement.open_file(mode='w') as file:
+                        file.write('entry\n')
+            waiter.join()
+            self.assertEqual(results, [True])
+            self._enter(path, results)
+            self.assertEqual(results, [True, False])
+
+    def test_waiting_process_ignores_update_from_old_source(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'entry')
+            source_path = os.path.join(directory, 'source')
+            with open(source_path, mode='w') as file:
+                file.write('v1\n')
+            results = []
+            with SingleFlightLock.make(path, [source_path]):
+                with open(source_path, mode='w') as file:
+                    file.write('v2 edited\n')
+                waiter = threading.Thread(target=self._enter, args=(path, results, [source_path]))
+                waiter.start()
+                waiter.join(0.2)
+                with FileReplacement.make(path) as replacement:
+                    with replacement.open_file(mode='w') as file:
+                        file.write('entry from v1\n')
+            waiter.join()
+            self.assertEqual(results, [False])
+            # The waiter that regenerated the entry recorded v2, which a
+            # later waiter can reuse.
+            with SingleFlightLock.make(path, [source_path]):
+                waiter = threading.Thread(target=self._enter, args=(path, results, [source_path]))
+                waiter.start()
+                waiter.join(0.2)
+                with FileReplacement.make(path) as replacement:
+                    with replacement.open_file(mode='w') as file:
+                        file.write('entry from v2\n')
+            waiter.join()
+            self.assertEqual(results, [False, True])
+
+    def test_file_replacement(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'entry')
+            with self.assertRaises(ValueError):
+                with FileReplacement.make(path) as replacement:
+                    with replacement.open_file(mode='w') as file:
+                        file.write('partial')
+                    raise ValueError()
+            self.assertEqual(os.listdir(directory), [])
+
+    def _enter(self, path, results, source_paths=None):
+        with SingleFlightLock.make(path, source_paths) as lock:
+            results.append(lock.is_updated_by_other_process)
@@ -0,0 +1,36 @@
+from autorecurse.lib.forkserver import *
+import os
+import sys
+import tempfile
+import unittest
+
+
+@unittest.skipUnless(ForkServer.is_supported(), 'Needs fork and Unix sockets')
+class TestForkServer(unittest.TestCase):
+
+    def test_request(self):
+        with tempfile.TemporaryDirectory() as directory:
+            directory = os.path.realpath(directory)
+            socket_path = os.path.join(directory, 'server.socket')
+            with ForkServer.make(socket_path, TestForkServer._handle) as server:
+                client = ForkServerClient.make(server.socket_path)
+                with tempfile.TemporaryFile() as output:
+                    status = client.request(['a', 'b'], directory, {'VALUE': 'x'}, [0, output.fileno(), 2])
+                    output.seek(0)
+                    self.assertEqual(output.read(), ' '.join(['a b', directory, 'x']).encode())
+                self.assertEqual(status, 3)
+                self.assertEqual(client.request(['exit'], directory, {}, [0, 1, 2]), 4)
+                with self.assertRaises(ConnectionError):
+                    client.request(['die'], directory, {}, [0, 1, 2])
+            self.assertFalse(os.path.exists(socket_path))
+            with self.assertRaises(FileNotFoundError):
+                client.request([], directory, {}, [0, 1, 2])
+
+    @staticmethod
+    def _handle(args):
+        if args == ['exit']:
+            sys.exit(4)
+        if args == ['die']:
+            os._exit(5)
+        sys.stdout.write(' '.join([' '.join(args), os.getcwd(), os.environ['VALUE']]))
+        return 3
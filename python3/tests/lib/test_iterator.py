@@ -144,6 +144,34 @@ class TestListIterator(unittest.TestCase):
         IteratorTests.run_all(TestListIterator.make_iterator_wrapper_empty)
 
 
+class TestGeneratorIterator(unittest.TestCase):
+
+    @staticmethod
+    def make_iterator_wrapper_content() -> IteratorTestWrapper[object]:
+        expected = [None, 'Hello', 3, None] # type: List[object]
+        actual = GeneratorIterator.make(item for item in expected)
+        return IteratorTestWrapper.make(actual, expected)
+
+    @staticmethod
+    def make_iterator_wrapper_empty() -> IteratorTestWrapper[object]:
+        expected = [] # type: List[object]
+        actual = GeneratorIterator.make(item for item in expected)
+        return IteratorTestWrapper.make(actual, expected)
+
+    def test_iterator_tests(self):
+        IteratorTests.run_all(TestGeneratorIterator.make_iterator_wrapper_content)
+        IteratorTests.run_all(TestGeneratorIterator.make_iterator_wrapper_empty)
+
+    def test_generate_items(self):
+        iterator = ListIterator.make([1, 2, 3])
+        self.assertEqual(list(generate_items(iterator)), [1, 2, 3])
+        iterator = ListIterator.make([1, 2, 3])
+        iterator.move_to_next()
+        iterator.move_to_next()
+        self.assertEqual(list(generate_items(iterator)), [2, 3])
+        self.assertIs(iterator.is_at_end, True)
+
+
 del T
 
 
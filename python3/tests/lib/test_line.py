@@ -1,5 +1,7 @@
 from tests.lib.test_iterator import IteratorTests, IteratorTestWrapper
 from autorecurse.lib.line import *
+from autorecurse.lib.iterator import PythonIteratorWrapper
+from io import BufferedIOBase, BytesIO, StringIO
 from typing import cast, List
 import unittest
 
@@ -109,6 +111,105 @@ class TestFileLineIterator(unittest.TestCase):
         IteratorTests.run_all(TestFileLineIterator.make_iterator_wrapper_empty)
 
 
+class TestBlockFileLineIterator(unittest.TestCase):
+
+    @staticmethod
+    def make_iterator_wrapper_content() -> IteratorTestWrapper[Line]:
+        actual = BlockFileLineIterator.make(cast(TextIOBase, StringIO('Hello\r\nGoodbye\r\n\r\n')))
+        expected = [Line.make_with_line_number('Hello', 1), Line.make_with_line_number('Goodbye', 2), Line.make_with_line_number('', 3)]
+        return IteratorTestWrapper.make(actual, expected)
+
+    @staticmethod
+    def make_iterator_wrapper_empty() -> IteratorTestWrapper[Line]:
+        actual = BlockFileLineIterator.make(cast(TextIOBase, StringIO('')))
+        expected = [] # type: List[Line]
+        return IteratorTestWrapper.make(actual, expected)
+
+    def test_iterator_tests(self):
+        IteratorTests.run_all(TestBlockFileLineIterator.make_iterator_wrapper_content)
+        IteratorTests.run_all(TestBlockFileLineIterator.make_iterator_wrapper_empty)
+
+    def test_lines_across_blocks(self):
+        block_size = BlockFileLineIterator.BLOCK_SIZE
+        BlockFileLineIterator.BLOCK_SIZE = 3
+        try:
+            content = 'a\nbcdefg\n\nhi\r\njk'
+            actual = [line for line in PythonIteratorWrapper.make(BlockFileLineIterator.make(cast(TextIOBase, StringIO(content))))]
+        finally:
+            BlockFileLineIterator.BLOCK_SIZE = block_size
+        expected = [Line.make_with_line_number(content, number + 1) for number, content in enumerate(['a', 'bcdefg', '', 'hi', 'jk'])]
+        self.assertEqual(actual, expected)
+
+    def test_line_breaks(self):
+        block_size = BlockFileLineIterator.BLOCK_SIZE
+        BlockFileLineIterator.BLOCK_SIZE = 3
+        try:
+            for content in ['a\nb\x0cc\n', 'a\nbc\rd\n', 'ab\u2028']:
+                iterator = BlockFileLineIterator.make(cast(TextIOBase, StringIO(content)))
+                with self.assertRaises(LineBreakError):
+                    for line in PythonIteratorWrapper.make(iterator):
+                        pass
+            content = 'a\r\nb\r'
+            actual = [line.content for line in PythonIteratorWrapper.make(BlockFileLineIterator.make(cast(TextIOBase, StringIO(content))))]
+            self.assertEqual(actual, ['a', 'b'])
+        finally:
+            BlockFileLineIterator.BLOCK_SIZE = block_size
+
+    def test_move_to_next_line_in(self):
+        block_size = BlockFileLineIterator.BLOCK_SIZE
+        BlockFileLineIterator.BLOCK_SIZE = 4
+        try:
+            actual = BlockFileLineIterator.make(cast(TextIOBase, StringIO('a\nb\nc\nd\ne\nc\nf\n')))
+            actual.move_to_next_line_in(('d', 'c'))
+            self.assertEqual(actual.current_item, Line.make_with_line_number('c', 3))
+            actual.move_to_next_line_in(('e',))
+            self.assertEqual(actual.current_item, Line.make_with_line_number('e', 5))
+            actual.move_to_next()
+            self.assertEqual(actual.current_item, Line.make_with_line_number('c', 6))
+            actual.move_to_next_line_in(('a',))
+            self.assertIs(actual.is_at_end, True)
+        finally:
+            BlockFileLineIterator.BLOCK_SIZE = block_size
+
+
+class TestBinaryBlockFileLineIterator(unittest.TestCase):
+
+    def test_decodes_lines(self):
+        block_size = BlockFileLineIterator.BLOCK_SIZE
+        BlockFileLineIterator.BLOCK_SIZE = 3
+        try:
+            content = 'a\r\nb\u00e9c\n\u00e9\nd'.encode('utf-8')
+            actual = [line for line in PythonIteratorWrapper.make(BinaryBlockFileLineIterator.make(cast(BufferedIOBase, BytesIO(content))))]
+        finally:
+            BlockFileLineIterator.BLOCK_SIZE = block_size
+        expected = [Line.make_with_line_number(content, number + 1) for number, content in enumerate(['a', 'b\u00e9c', '\u00e9', 'd'])]
+        self.assertEqual(actual, expected)
+
+    def test_line_breaks(self):
+        for content in ['a\nb\x0cc\n', 'a\u0085b']:
+            iterator = BinaryBlockFileLineIterator.make(cast(BufferedIOBase, BytesIO(content.encode('utf-8'))))
+            with self.assertRaises(LineBreakError):
+                for line in PythonIteratorWrapper.make(iterator):
+                    pass
+
+    def test_lone_carriage_returns(self):
+        block_size = BlockFileLineIterator.BLOCK_SIZE
+        BlockFileLineIterator.BLOCK_SIZE = 3
+        try:
+            for content, expected in [(b'a\nb\rc\r\nd\n', ['a', 'b', 'c', 'd']), (b'a\r\rb\r', ['a', '', 'b']), (b'\tx\ry\n', ['\tx', 'y'])]:
+                actual = [line for line in PythonIteratorWrapper.make(BinaryBlockFileLineIterator.make(cast(BufferedIOBase, BytesIO(content))))]
+                self.assertEqual(actual, [Line.make_with_line_number(line, number + 1) for number, line in enumerate(expected)])
+        finally:
+            BlockFileLineIterator.BLOCK_SIZE = block_size
+
+    def test_move_to_next_line_in(self):
+        actual = BinaryBlockFileLineIterator.make(cast(BufferedIOBase, BytesIO('a\n\u00e9\nb\n'.encode('utf-8'))))
+        actual.move_to_next_line_in(('\u00e9',))
+        self.assertEqual(actual.current_item, Line.make_with_line_number('\u00e9', 2))
+        actual.move_to_next_line_in(('a',))
+        self.assertIs(actual.is_at_end, True)
+
+
 class TestEmptyLineFilter(unittest.TestCase):
 
     def test_non_empty_line(self):
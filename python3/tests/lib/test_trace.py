@@ -0,0 +1,35 @@
+from autorecurse.lib.trace import *
+import json
+import os
+import tempfile
+import unittest
+
+
+class TestTracer(unittest.TestCase):
+
+    def test_disabled(self):
+        tracer = Tracer.make_disabled()
+        self.assertFalse(tracer.is_enabled)
+        with tracer.span('phase') as span:
+            pass
+        self.assertIs(span, NullTraceSpan.make())
+        tracer.close()
+
+    def test_nested_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'trace.json')
+            root = Tracer.make_root(path, 'root')
+            with root.span('outer', {'makefile': 'Makefile'}):
+                child = Tracer.make_from_environment(root.environment_value, 'child')
+                with child.span('inner'):
+                    pass
+                child.close()
+            root.close()
+            with open(path) as file:
+                events = json.load(file)
+        spans = {event['name']: event for event in events if event['ph'] == 'X'}
+        self.assertEqual(set(spans), {'root', 'outer', 'child', 'inner'})
+        self.assertEqual(spans['outer']['args'], {'makefile': 'Makefile'})
+        self.assertEqual({event['pid'] for event in events}, {os.getpid()})
+        self.assertLessEqual(spans['outer']['ts'], spans['inner']['ts'])
+        self.assertLessEqual(spans['inner']['ts'] + spans['inner']['dur'], spans['outer']['ts'] + spans['outer']['dur'])
@@ -0,0 +1,132 @@
+from autorecurse.lib.forkserver import ForkServer
+from typing import List
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+
+class TestCli(unittest.TestCase):
+
+    MAIN_PATH = os.path.realpath('main.py')
+
+    def setUp(self):
+        self._directory = tempfile.TemporaryDirectory()
+        self.directory = os.path.realpath(self._directory.name)
+        bin_directory = os.path.join(self.directory, 'bin')
+        os.makedirs(bin_directory)
+        script_path = os.path.join(bin_directory, 'autorecurse')
+        with open(script_path, mode='w') as file:
+            file.write('#!/bin/sh\nexec {0} {1} "$@"\n'.format(sys.executable, TestCli.MAIN_PATH))
+        os.chmod(script_path, 0o755)
+        self.environment = dict(os.environ)
+        self.environment['PATH'] = os.pathsep.join([bin_directory, os.environ.get('PATH', '')])
+        for name in ['AUTORECURSE_OPTIONS', 'AUTORECURSE_TRACE', 'AUTORECURSE_STATS', ForkServer.ENVIRONMENT_VARIABLE]:
+            self.environment.pop(name, None)
+        self.tree = os.path.join(self.directory, 'tree')
+        self.cache = os.path.join(self.directory, 'cache')
+
+    def tearDown(self):
+        self._directory.cleanup()
+
+    def write_files(self, files: List) -> None:
+        for path, content in files:
+            path = os.path.join(self.directory, path)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, mode='w') as file:
+                file.write(content)
+
+    def write_config_file(self, lines: List[str]) -> None:
+        content = ['[gnumake]', 'cache_dir = {0}'.format(self.cache), 'temp_dir = {0}'.format(os.path.join(self.directory, 'tmp'))]
+        self.write_files([('config.txt', '\n'.join(content + lines) + '\n')])
+
+    def run_autorecurse(self, args: List[str]) -> subprocess.CompletedProcess:
+        return subprocess.run(['autorecurse'] + args, cwd=self.tree, env=self.environment, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+
+    def nested_rule_file_content(self) -> str:
+        contents = []
+        for name in os.listdir(self.cache):
+            if name.startswith('nested-rule.') and name.endswith('.makefile'):
+                with open(os.path.join(self.cache, name)) as file:
+                    contents.append(file.read())
+        self.assertEqual(len(contents), 1)
+        return contents[0]
+
+    def test_nested_commands_use_configuration(self):
+        self.write_files([
+            ('tree/Makefile', 'all: a/liba\n'),
+            ('tree/a/Makefile', 'liba:\n\ttouch $@\n'),
+            ('tree/vendor/Makefile', 'libv:\n\ttouch $@\n'),
+        ])
+        self.write_config_file(['nested_exclude = vendor'])
+        options = [[]]
+        if ForkServer.is_supported():
+            options.append(['--fork-server'])
+        for extra_options in options:
+            with self.subTest(options=extra_options):
+                result = self.run_autorecurse(['--config-file', '../config.txt'] + extra_options + ['gnumake', 'all'])
+                self.assertEqual(result.returncode, 0, result.stderr)
+                content = self.nested_rule_file_content()
+                self.assertIn('a/liba', content)
+                self.assertNotIn('vendor', content)
+                self.assertNotIn('No rule to make target', result.stderr)
+                shutil.rmtree(self.cache)
+                os.remove(os.path.join(self.tree, 'a', 'liba'))
+
+    def test_nested_commands_use_dump_flags(self):
+        self.write_files([
+            ('tree/Makefile', 'all: a/liba\n'),
+            ('tree/a/Makefile', 'liba:\n\ttouch $@\n'),
+        ])
+        self.write_config_file([])
+        result = self.run_autorecurse(['--config-file', '../config.txt', '--dump-flags=-r -R', '--check-dump-flags', 'gnumake', 'all'])
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(len([name for name in os.listdir(self.cache) if name.startswith('dump-flags-check.') and name.endswith('.json')]), 1)
+
+    def test_nested_commands_load_dfa_cache(self):
+        self.write_files([
+            ('tree/Makefile', 'all: a/liba\n'),
+            ('tree/a/Makefile', 'liba:\n\ttouch $@\n'),
+        ])
+        self.write_config_file([])
+        args = ['--config-file', '../config.txt', '--dfa-cache', 'gnumake', 'all']
+        result = self.run_autorecurse(args)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        dfa_cache_paths = [os.path.join(self.cache, name) for name in os.listdir(self.cache) if name.startswith('dfa-cache.') and name.endswith('.pickle')]
+        self.assertEqual(len(dfa_cache_paths), 1)
+        dfa_cache_stat = os.stat(dfa_cache_paths[0])
+        target_listing_paths = [os.path.join(self.cache, name) for name in os.listdir(self.cache) if name.startswith('target-listing.') and name.endswith('.makefile')]
+        target_listing_stat = os.stat(target_listing_paths[0])
+        # Makes the nested targetlisting run again. With the DFAs that
+        # it loads, it has nothing new to save.
+        makefile_path = os.path.join(self.tree, 'a', 'Makefile')
+        os.utime(makefile_path, (target_listing_stat.st_mtime + 10, target_listing_stat.st_mtime + 10))
+        result = self.run_autorecurse(args)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertNotEqual(os.stat(target_listing_paths[0]).st_mtime_ns, target_listing_stat.st_mtime_ns)
+        self.assertEqual(os.stat(dfa_cache_paths[0]).st_ino, dfa_cache_stat.st_ino)
+
+    def test_nested_commands_use_shared_cache(self):
+        for checkout in ['checkout', 'other']:
+            self.write_files([
+                (os.path.join(checkout, '.git', 'HEAD'), ''),
+                (os.path.join(checkout, 'Makefile'), 'all: a/liba\n'),
+                (os.path.join(checkout, 'a', 'Makefile'), 'liba:\n\ttouch $@\n'),
+            ])
+        shared_cache = os.path.join(self.directory, 'shared')
+        self.write_config_file(['shared_cache_dir = {0}'.format(shared_cache)])
+        self.tree = os.path.join(self.directory, 'checkout')
+        result = self.run_autorecurse(['--config-file', '../config.txt', 'gnumake', 'all'])
+        self.assertEqual(result.returncode, 0, result.stderr)
+        entry_paths = [os.path.join(shared_cache, name) for name in os.listdir(shared_cache) if name.startswith('targets.') and name.endswith('.json')]
+        self.assertEqual(len(entry_paths), 1)
+        entry_stat = os.stat(entry_paths[0])
+        # The other checkout finds the entry instead of storing it again.
+        self.tree = os.path.join(self.directory, 'other')
+        result = self.run_autorecurse(['--config-file', '../config.txt', 'gnumake', 'all'])
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(os.listdir(shared_cache), [os.path.basename(entry_paths[0])])
+        self.assertEqual(os.stat(entry_paths[0]).st_ino, entry_stat.st_ino)
+        self.assertTrue(os.path.isfile(os.path.join(self.tree, 'a', 'liba')))
@@ -0,0 +1,28 @@
+from autorecurse.client import *
+from autorecurse.lib.forkserver import ForkServer
+from io import StringIO
+import os
+import tempfile
+import unittest
+import unittest.mock
+
+
+@unittest.skipUnless(ForkServer.is_supported(), 'Needs fork and Unix sockets')
+class TestClient(unittest.TestCase):
+
+    def test_run_with_fork_server(self):
+        with tempfile.TemporaryDirectory() as directory:
+            socket_path = os.path.join(os.path.realpath(directory), 'server.socket')
+            with unittest.mock.patch.dict(os.environ, {ForkServer.ENVIRONMENT_VARIABLE: socket_path}):
+                self.assertIsNone(run_with_fork_server(['exit']))
+                with ForkServer.make(socket_path, TestClient._handle):
+                    self.assertEqual(run_with_fork_server(['exit']), 4)
+                    with unittest.mock.patch('sys.stderr', new_callable=StringIO) as stderr:
+                        self.assertEqual(run_with_fork_server(['die']), 1)
+                    self.assertIn('fork server request failed', stderr.getvalue())
+
+    @staticmethod
+    def _handle(args):
+        if args == ['die']:
+            os._exit(5)
+        return 4